@@ -0,0 +1,57 @@
+"""
+Gunicorn configuration, loaded automatically from the project root:
+
+    gunicorn memorialbridge.wsgi
+
+The app is imported and warmed up once in the master process, then forked
+into workers, so new workers start with compiled templates and a built URL
+resolver. Workers are recycled after a jittered number of requests to keep
+slow memory growth in check without restarting them all at once.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+preload_app = True
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+# Worker heartbeats go to a tmpfs where available, so a slow disk cannot stall them
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Metrics files from a previous run would otherwise be added to this one
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'memorialbridge.settings')
+    from main_app.metrics import reset_store
+    reset_store()
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any worker is forked
+    if server.cfg.preload_app:
+        from main_app.warmup import warm_up
+        summary = warm_up()
+        server.log.info('Warmed up %(templates)d templates and %(urls)d URLs in %(seconds).2fs', summary)
+
+
+def post_fork(server, worker):
+    # Never share database connections opened in the master with a worker
+    from django.db import connections
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # Without preloading each worker imports the app itself, so it warms itself up
+    if not worker.cfg.preload_app:
+        from main_app.warmup import warm_up
+        warm_up()
@@ -0,0 +1,136 @@
+"""
+Site-wide feed of recent tributes: memories shared and contributions made
+on public memorials.
+
+Each event is copied into a compact Activity row when it is written, with
+the names it displays and a ``public`` flag kept in step with the
+memorial's visibility, so reading the feed needs no join to Memorial or
+Memory. A page is a range scan on a partial index over public rows,
+newest id first, and later pages continue below the last id seen (keyset
+pagination) instead of using OFFSET. The newest ACTIVITY_HEAD_SIZE rows
+are cached, which serves the first page and usually a few more.
+
+Deleting a memory or memorial deletes its rows through the foreign keys.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.text import Truncator
+
+from .models import Activity, Memorial, Memory
+from .signals import memorials_changed
+
+VERSION_KEY = 'activity:version'
+RELEVANT_FIELDS = {'name', 'slug', 'visibility'}
+FEED_FIELDS = ('id', 'kind', 'memorial_name', 'memorial_slug', 'actor_name', 'summary', 'created_at')
+
+
+def invalidate_feed():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 2, None)
+
+
+def _summary(text):
+    return Truncator(text).chars(Activity._meta.get_field('summary').max_length)
+
+
+def add_memories(memories):
+    """
+    Create the feed entries for memories that do not have one yet
+    """
+    memories = list(memories)
+    if not memories:
+        return 0
+    recorded = set(
+        Activity.objects.filter(memory__in=memories).values_list('memory_id', flat=True)
+    )
+    rows = [
+        Activity(
+            kind='memory', memorial_id=memory.memorial_id, memory=memory, actor_id=memory.author_id,
+            memorial_name=memory.memorial.name, memorial_slug=memory.memorial.slug,
+            actor_name=memory.author.username, summary=_summary(memory.content),
+            public=memory.memorial.visibility == 'public', created_at=memory.created_at,
+        )
+        for memory in sorted(memories, key=lambda memory: (memory.created_at, memory.pk))
+        if memory.pk not in recorded
+    ]
+    Activity.objects.bulk_create(rows)
+    if rows:
+        invalidate_feed()
+    return len(rows)
+
+
+def record_contribution(memorial, user, kind):
+    """
+    Add a donation or tree planted by ``user`` to the feed
+    """
+    Activity.objects.create(
+        kind=kind, memorial=memorial, actor=user,
+        memorial_name=memorial.name, memorial_slug=memorial.slug, actor_name=user.username,
+        public=memorial.visibility == 'public',
+    )
+    invalidate_feed()
+
+
+@receiver(post_save, sender=Memory)
+def memory_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        add_memories([instance])
+
+
+@receiver(post_delete, sender=Memory)
+def memory_deleted(sender, **kwargs):
+    # The feed entry went with the memory
+    invalidate_feed()
+
+
+@receiver(memorials_changed)
+def sync_memorials(sender, pks, fields=None, **kwargs):
+    """
+    Copy new names and visibility into the feed entries of changed memorials
+    """
+    if fields is not None and not fields & RELEVANT_FIELDS:
+        return
+    memorial = Memorial.objects.filter(pk=OuterRef('memorial_id'))
+    # Deleted memorials have no entries left, so the subqueries always find a row
+    updated = Activity.objects.filter(memorial_id__in=pks).update(
+        memorial_name=Subquery(memorial.values('name')[:1]),
+        memorial_slug=Subquery(memorial.values('slug')[:1]),
+        public=Exists(memorial.filter(visibility='public')),
+    )
+    if updated or fields is None:
+        invalidate_feed()
+
+
+def feed_head():
+    """
+    The newest ACTIVITY_HEAD_SIZE public feed entries, cached
+    """
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f'activity:{version}:head'
+    head = cache.get(key)
+    if head is None:
+        head = list(Activity.objects.filter(public=True).values(*FEED_FIELDS)[:settings.ACTIVITY_HEAD_SIZE])
+        cache.set(key, head, settings.ACTIVITY_HEAD_TIMEOUT)
+    return head
+
+
+def feed(before=None, limit=None):
+    """
+    Up to ``limit`` public feed entries, newest first, with ids below ``before``
+    """
+    limit = min(limit or settings.ACTIVITY_PAGE_SIZE, settings.ACTIVITY_MAX_PAGE_SIZE)
+    head = feed_head()
+    entries = [entry for entry in head if before is None or entry['id'] < before][:limit]
+    if len(entries) < limit and len(head) == settings.ACTIVITY_HEAD_SIZE:
+        # Past the cached head; a short head means there is nothing more
+        last = entries[-1]['id'] if entries else before
+        older = Activity.objects.filter(public=True)
+        if last is not None:
+            older = older.filter(pk__lt=last)
+        entries += older.values(*FEED_FIELDS)[:limit - len(entries)]
+    return entries
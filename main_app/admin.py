@@ -1,25 +1,129 @@
 from django.contrib import admin
-from .models import UserProfile, Memorial, Memory
+from django.utils import timezone
+from django.utils.html import format_html, format_html_join
+from .models import UserProfile, Memorial, Memory, Job, ProfileRecord
+from .paginator import EstimatedCountPaginator
+from .search import normalize_name, prefix_q
+from .signals import send_memorials_changed
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """
+    Changelist defaults for tables with millions of rows
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(UserProfile)
-class UserProfileAdmin(admin.ModelAdmin):
+class UserProfileAdmin(ScalableAdmin):
     list_display = ['user', 'verified']
     list_filter = ['verified']
-    search_fields = ['user__username', 'user__email']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Username prefix, answered by the unique index on username
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        return queryset.filter(prefix_q('user__username', search_term)), False
 
 
 @admin.register(Memorial)
-class MemorialAdmin(admin.ModelAdmin):
+class MemorialAdmin(ScalableAdmin):
     list_display = ['name', 'owner', 'visibility', 'donations_count', 'trees_planted_count', 'created_at']
     list_filter = ['visibility', 'created_at']
-    search_fields = ['name', 'bio']
+    list_select_related = ['owner__user']
+    search_fields = ['name']
+    search_help_text = "Search by the start of a name, or by exact slug."
+    autocomplete_fields = ['owner']
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['created_at', 'updated_at']
+    actions = ['make_public', 'make_private']
+
+    def get_search_results(self, request, queryset, search_term):
+        # Name prefix on the indexed search_name column, or an exact slug
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        lookup = prefix_q('search_name', normalize_name(search_term))
+        return queryset.filter(lookup) | queryset.filter(slug=search_term), False
+
+    def _set_visibility(self, request, queryset, visibility):
+        pks = list(queryset.values_list('pk', flat=True))
+        updated = Memorial.objects.filter(pk__in=pks).update(visibility=visibility, updated_at=timezone.now())
+        send_memorials_changed(pks, {'visibility', 'updated_at'})
+        self.message_user(request, f"{updated} memorial(s) marked {visibility}.")
+
+    @admin.action(description="Make selected memorials public")
+    def make_public(self, request, queryset):
+        self._set_visibility(request, queryset, 'public')
+
+    @admin.action(description="Make selected memorials private")
+    def make_private(self, request, queryset):
+        self._set_visibility(request, queryset, 'private')
 
 
 @admin.register(Memory)
-class MemoryAdmin(admin.ModelAdmin):
+class MemoryAdmin(ScalableAdmin):
     list_display = ['memorial', 'author', 'type', 'created_at']
     list_filter = ['type', 'created_at']
-    search_fields = ['memorial__name', 'author__username', 'content']
+    list_select_related = ['memorial', 'author']
+    search_fields = ['memorial__name']
+    search_help_text = "Search by the start of a memorial name, or by exact author username."
+    autocomplete_fields = ['memorial', 'author']
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        lookup = prefix_q('memorial__search_name', normalize_name(search_term))
+        return queryset.filter(lookup) | queryset.filter(author__username=search_term), False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['task', 'status', 'attempts', 'max_attempts', 'run_at', 'finished_at']
+    list_filter = ['status', 'task']
+    readonly_fields = ['created_at', 'locked_at', 'finished_at', 'last_error']
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected jobs now")
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status=Job.STATUS_RUNNING).update(
+            status=Job.STATUS_QUEUED, attempts=0, run_at=timezone.now(), last_error=''
+        )
+        self.message_user(request, f"{updated} job(s) queued for retry.")
+
+
+@admin.register(ProfileRecord)
+class ProfileRecordAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'method', 'path', 'view_name', 'status_code', 'duration_ms', 'sql_count',
+                    'sql_time_ms', 'user']
+    list_filter = ['view_name', 'method', 'status_code']
+    list_select_related = ['user']
+    search_fields = ['path']
+    date_hierarchy = 'created_at'
+    fields = ['path', 'method', 'view_name', 'status_code', 'user', 'duration_ms', 'sql_count', 'sql_time_ms',
+              'created_at', 'slowest_queries', 'profile']
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.display(description="Slowest queries")
+    def slowest_queries(self, obj):
+        rows = sorted(obj.queries, key=lambda query: query['ms'], reverse=True)[:25]
+        return format_html(
+            '<table><tr><th>ms</th><th>SQL</th></tr>{}</table>',
+            format_html_join('', '<tr><td>{}</td><td><code>{}</code></td></tr>',
+                             ((query['ms'], query['sql']) for query in rows)),
+        )
+
+    @admin.display(description="cProfile")
+    def profile(self, obj):
+        return format_html('<pre style="white-space: pre; overflow-x: auto;">{}</pre>', obj.stats)
@@ -0,0 +1,102 @@
+"""
+"On this day": public memorials whose birth or passing anniversary is today.
+
+Month and day are stored as MMDD numbers (``dob_md`` and ``dod_md``) with
+partial indexes over public memorials, so the lookup is two index probes
+instead of extracting the month and day of every row. The matching ids are
+cached until midnight in TIME_ZONE, and dropped earlier when a memorial's
+dates or visibility change. Card data is loaded fresh, by primary key,
+and checked again against visibility and dates with matching(), since
+with a per-process cache other workers keep their ids until midnight.
+"""
+import calendar
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Memorial, month_day
+from .signals import memorials_changed
+
+VERSION_KEY = 'anniversaries:version'
+RELEVANT_FIELDS = {'dob', 'dod', 'visibility'}
+
+
+@receiver(memorials_changed)
+def invalidate_anniversaries(sender, pks, fields=None, **kwargs):
+    if fields is None or fields & RELEVANT_FIELDS:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 2, None)
+
+
+def month_days(day):
+    """
+    MMDD values celebrated on ``day``; 29 February is remembered on
+    28 February in common years
+    """
+    days = [month_day(day)]
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        days.append(229)
+    return days
+
+
+def anniversary_ids(day):
+    """
+    Ids of public memorials with a birth or passing anniversary on ``day``
+    """
+    days = month_days(day)
+    public = Memorial.objects.filter(visibility='public').order_by()
+    # A UNION lets each half probe its own index, where an OR may scan one
+    births = public.filter(dob_md__in=days).values_list('pk', 'donations_count')
+    passings = public.filter(dod_md__in=days).values_list('pk', 'donations_count')
+    rows = births.union(passings).order_by('-donations_count', 'pk')[:settings.ANNIVERSARIES_LIMIT]
+    return [pk for pk, _donations in rows]
+
+
+def seconds_until_midnight(now=None):
+    now = timezone.localtime(now)
+    midnight = datetime.combine(now.date() + timedelta(days=1), time.min, tzinfo=now.tzinfo)
+    # Subtracting in UTC accounts for days that are not 24 hours long
+    return max(int((midnight.astimezone(dt_timezone.utc) - now.astimezone(dt_timezone.utc)).total_seconds()), 1)
+
+
+def todays_anniversary_ids():
+    """
+    anniversary_ids() for today in TIME_ZONE, cached until midnight
+    """
+    today = timezone.localdate()
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f'anniversaries:{version}:{today.isoformat()}'
+    ids = cache.get(key)
+    if ids is None:
+        ids = anniversary_ids(today)
+        cache.set(key, ids, seconds_until_midnight())
+    return ids
+
+
+def matching(queryset, day):
+    """
+    The public memorials in ``queryset`` with an anniversary on ``day``
+    """
+    days = month_days(day)
+    return queryset.filter(Q(dob_md__in=days) | Q(dod_md__in=days), visibility='public')
+
+
+def describe(memorial, day):
+    """
+    Set ``anniversary`` on a memorial to ('birth' or 'passing', years ago)
+    and return it, or return None when neither date falls on ``day``
+    """
+    wanted = month_days(day)
+    if memorial.dod and month_day(memorial.dod) in wanted:
+        memorial.anniversary = ('passing', day.year - memorial.dod.year)
+    elif memorial.dob and month_day(memorial.dob) in wanted:
+        memorial.anniversary = ('birth', day.year - memorial.dob.year)
+    else:
+        return None
+    return memorial
@@ -7,3 +7,13 @@ class MainAppConfig(AppConfig):
     
     def ready(self):
         import main_app.signals
+        import main_app.activity
+        import main_app.anniversaries
+        import main_app.conditional
+        import main_app.fuzzy
+        import main_app.metrics
+        import main_app.share_cards
+        import main_app.sitemaps
+        import main_app.slugs
+        import main_app.storage
+        import main_app.typeahead
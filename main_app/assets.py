@@ -0,0 +1,264 @@
+"""
+Static asset bundling, run as part of collectstatic.
+
+``css/main.css`` pulls in the rest of the stylesheets with ``@import``,
+which browsers fetch one after another. During collectstatic the imports
+are inlined into the collected ``main.css`` (with relative ``url()``s
+rebased), and CSS bundles and JavaScript are minified. WhiteNoise's
+manifest storage then fingerprints the results and writes gzip and, when
+the Brotli package is installed, brotli copies. Templates keep using
+``{% static 'css/main.css' %}`` and get the hashed bundle.
+
+The minifiers only strip comments and whitespace; they never rename or
+reorder anything.
+"""
+import functools
+import os
+import posixpath
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+_CSS_IMPORT = re.compile(
+    r'@import\s+(?:url\(\s*)?([\'"]?)(?P<path>[^\'")\s;]+)\1\s*\)?\s*(?P<media>[^;]*);'
+)
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)(?P<url>[^\'")]+)\1\s*\)')
+_EXTERNAL = re.compile(r'^(?:[a-z][a-z0-9+.-]*:|//|/|#)', re.IGNORECASE)
+
+
+def _is_local(path):
+    return not _EXTERNAL.match(path)
+
+
+def flatten_css(read, path, seen=None):
+    """
+    Return the stylesheet at ``path`` with its local @imports inlined
+
+    ``read(path)`` returns a file's text. Imports with media queries or
+    remote URLs are left as they are.
+    """
+    seen = set() if seen is None else seen
+    if path in seen:
+        return ''
+    seen.add(path)
+    directory = posixpath.dirname(path)
+
+    def inline(match):
+        target = match.group('path')
+        if match.group('media').strip() or not _is_local(target):
+            return match.group(0)
+        imported = posixpath.normpath(posixpath.join(directory, target))
+        return _rebase_urls(flatten_css(read, imported, seen), posixpath.dirname(imported), directory)
+
+    return _CSS_IMPORT.sub(inline, read(path))
+
+
+def _rebase_urls(css, source_directory, target_directory):
+    """
+    Make relative url()s in CSS moved from ``source_directory`` work from ``target_directory``
+    """
+    if source_directory == target_directory:
+        return css
+
+    def rebase(match):
+        url = match.group('url')
+        if not _is_local(url):
+            return match.group(0)
+        absolute = posixpath.normpath(posixpath.join(source_directory, url))
+        return f'url("{posixpath.relpath(absolute, target_directory or ".")}")'
+
+    return _CSS_URL.sub(rebase, css)
+
+
+# Strings and comments, matched in the order they appear so that a quote in
+# a comment does not start a string and '/*' in a string does not start a
+# comment. An unterminated string runs to the end, as browsers read it.
+_CSS_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"?|\'(?:\\.|[^\'\\])*\'?|/\*.*?\*/', re.DOTALL)
+_CSS_SPACE_AROUND = re.compile(r'\s*([{};,>])\s*')
+
+
+def _minify_css_code(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = _CSS_SPACE_AROUND.sub(r'\1', text)
+    return text.replace(';}', '}')
+
+
+def minify_css(css):
+    """
+    Remove comments (except /*! ... */) and needless whitespace from CSS
+    """
+    pieces = []
+    code = []
+    position = 0
+    for match in _CSS_STRING_OR_COMMENT.finditer(css):
+        code.append(css[position:match.start()])
+        position = match.end()
+        token = match.group()
+        if token.startswith('/*') and not token.startswith('/*!'):
+            # Dropped, so the code on both sides is minified as one piece
+            continue
+        pieces.append(_minify_css_code(''.join(code)))
+        pieces.append(token)
+        code = []
+    code.append(css[position:])
+    pieces.append(_minify_css_code(''.join(code)))
+    return ''.join(pieces).strip() + '\n'
+
+
+# Characters that can end an expression; a '/' after one of them divides,
+# anywhere else it starts a regular expression literal
+_JS_OPERAND_END = re.compile(r'[\w$)\]\'"`]')
+_JS_REGEX_KEYWORDS = ('return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw',
+                      'case', 'do', 'else', 'yield', 'await')
+# Whitespace next to these can always be dropped
+_JS_TIGHT = set('{}()[];,:=?<>&|!*%^~')
+
+
+def _js_tokens(source):
+    """
+    Yield (kind, text) for JavaScript source, where kind is 'code', 'literal',
+    'space' or 'newline'; comments are dropped
+    """
+    index = 0
+    length = len(source)
+    last_code = ''
+    while index < length:
+        char = source[index]
+        if char in ' \t\r\n':
+            end = index
+            while end < length and source[end] in ' \t\r\n':
+                end += 1
+            yield ('newline' if '\n' in source[index:end] else 'space'), ''
+            index = end
+        elif source.startswith('//', index):
+            end = source.find('\n', index)
+            index = length if end == -1 else end
+        elif source.startswith('/*', index):
+            end = source.find('*/', index + 2)
+            index = length if end == -1 else end + 2
+            yield 'space', ''
+        elif char in '\'"`' or (char == '/' and not _starts_division(last_code)):
+            end = index + 1
+            in_class = False
+            while end < length:
+                current = source[end]
+                if current == '\\':
+                    end += 2
+                    continue
+                if char == '/':
+                    if current == '[':
+                        in_class = True
+                    elif current == ']':
+                        in_class = False
+                    elif current == '/' and not in_class:
+                        break
+                    elif current == '\n':
+                        break
+                elif current == char:
+                    break
+                end += 1
+            end += 1
+            if char == '/':
+                while end < length and (source[end].isalnum() or source[end] == '_'):
+                    end += 1  # Flags
+            yield 'literal', source[index:end]
+            last_code = source[index:end]
+            index = end
+        else:
+            end = index + 1
+            if char.isalnum() or char in '_$':
+                while end < length and (source[end].isalnum() or source[end] in '_$'):
+                    end += 1
+            yield 'code', source[index:end]
+            last_code = source[index:end]
+            index = end
+
+
+def _starts_division(previous):
+    if not previous:
+        return False
+    if previous in _JS_REGEX_KEYWORDS:
+        return False
+    return bool(_JS_OPERAND_END.match(previous[-1]))
+
+
+def minify_js(source):
+    """
+    Remove comments and needless whitespace from JavaScript
+
+    Line breaks are kept wherever automatic semicolon insertion could
+    depend on them. Template literals are copied unchanged, as long as
+    their ``${}`` expressions contain no backticks.
+    """
+    output = []
+    pending = None
+    for kind, text in _js_tokens(source):
+        if kind in ('space', 'newline'):
+            if pending != 'newline':
+                pending = kind
+            continue
+        if pending and output:
+            previous = output[-1][-1]
+            following = text[0]
+            if pending == 'newline' and previous not in '{;,(' and following not in '})]':
+                output.append('\n')
+            elif previous not in _JS_TIGHT and following not in _JS_TIGHT:
+                output.append(' ')
+        pending = None
+        output.append(text)
+    return ''.join(output) + '\n'
+
+
+class BundledStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    """
+    WhiteNoise manifest storage that builds the CSS bundles and minifies
+    JavaScript before the files are hashed and compressed
+    """
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            self.bundle(paths)
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+
+    @staticmethod
+    def _read_source(paths, path):
+        # Read what the finders found, not the collected copy, which may be
+        # a bundle from an earlier run
+        storage, source = paths[path]
+        with storage.open(source) as handle:
+            return handle.read().decode('utf-8')
+
+    def _replace(self, path, text):
+        self.delete(path)
+        self._save(path, ContentFile(text.encode('utf-8')))
+
+    def bundle(self, paths):
+        """
+        Rewrite the collected bundles and scripts, and point ``paths`` at
+        them so they are what gets hashed
+        """
+        for path in settings.STATIC_CSS_BUNDLES:
+            if path in paths:
+                read = functools.partial(self._read_source, paths)
+                self._replace(path, minify_css(flatten_css(read, path)))
+                paths[path] = (self, path)
+        # Only the project's own scripts; apps ship theirs, usually minified already
+        project_dirs = {
+            os.path.abspath(entry[1] if isinstance(entry, (list, tuple)) else entry)
+            for entry in settings.STATICFILES_DIRS
+        }
+        for path, (storage, _source) in list(paths.items()):
+            location = getattr(storage, 'location', None)
+            if (path.endswith('.js') and not path.endswith('.min.js')
+                    and location is not None and os.path.abspath(location) in project_dirs):
+                self._replace(path, minify_js(self._read_source(paths, path)))
+                paths[path] = (self, path)
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            # collectstatic has not run (tests, a fresh checkout), so there
+            # is no manifest: serve the files under their own names
+            return name
+        return super().stored_name(name)
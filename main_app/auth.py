@@ -0,0 +1,76 @@
+"""
+Request-scoped loading of the signed-in user's profile.
+
+ProfileBackend loads the session's user with their UserProfile joined in,
+so ``request.user.userprofile`` costs no query of its own, and
+RequestProfileMiddleware exposes that profile as ``request.profile``.
+Ownership checks compare a memorial's ``owner_id`` with the profile's id
+through owns(), which needs neither the memorial's owner nor its user.
+"""
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+UserModel = get_user_model()
+
+BACKEND_PATH = 'main_app.auth.ProfileBackend'
+# Sessions started before ProfileBackend was configured name this backend
+LEGACY_BACKEND_PATH = 'django.contrib.auth.backends.ModelBackend'
+
+
+class ProfileBackend(ModelBackend):
+    """
+    ModelBackend that loads the user and their profile in one query
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('userprofile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+def get_profile(user):
+    """
+    The user's profile, created if missing, or None for anonymous users
+    """
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.userprofile
+    except UserProfile.DoesNotExist:
+        profile, _created = UserProfile.objects.get_or_create(user=user)
+        user.userprofile = profile
+        return profile
+
+
+class RequestProfileMiddleware:
+    """
+    Set ``request.profile`` to the signed-in user's profile, loaded with
+    the user on first use; it is falsy for anonymous visitors
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        session = getattr(request, 'session', None)
+        if session is not None and session.get(BACKEND_SESSION_KEY) == LEGACY_BACKEND_PATH:
+            # Still valid for ProfileBackend, which only changes how the user is loaded
+            session[BACKEND_SESSION_KEY] = BACKEND_PATH
+        request.profile = SimpleLazyObject(lambda: get_profile(request.user))
+        return self.get_response(request)
+
+
+def owns(request, owner_id):
+    """
+    Whether the signed-in user's profile has the id ``owner_id``
+    """
+    if not request.user.is_authenticated:
+        return False
+    # Requests that did not pass through the middleware, such as in tests
+    profile = getattr(request, 'profile', None) or get_profile(request.user)
+    return profile.pk == owner_id
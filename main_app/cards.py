@@ -0,0 +1,58 @@
+"""
+Cached rendering of memorial cards.
+
+The explore page, the dashboard and the home page carousel all render the
+cards in ``main_app/includes/memorial_card.html``, and a card looks the
+same to every visitor until its memorial changes. Pages rendered with
+Jinja2 use its port of the card, so cards are rendered and cached per
+template engine. Each rendered card is cached under the engine and the
+memorial's id plus a version stamp built from what the
+listing query loads anyway: ``updated_at``, which moves on every edit and
+contribution, and the annotated memory count, which moves when memories
+are added or deleted. A changed memorial is looked up under a new key, so
+nothing has to be deleted and old cards simply expire. A page's cards are
+read with one get_many() and the misses written with one set_many().
+
+Commands that update rows without save() (for example the backfills) leave
+``updated_at`` alone, so their changes show once the cached cards expire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from .conditional import template_state
+
+CARD_TEMPLATE = 'main_app/includes/memorial_card.html'
+
+
+def card_key(memorial, layout='grid', eager=False, using='django'):
+    version = f'{memorial.updated_at.timestamp():.6f}:{getattr(memorial, "memory_count", "")}'
+    # The template fingerprint retires every card when the templates change
+    return f"card:{using}:{template_state()[0]}:{layout}{':eager' if eager else ''}:{memorial.pk}:{version}"
+
+
+def render_cards(memorials, layout='grid', eager_first=False, using='django'):
+    """
+    Rendered card HTML for each memorial, in order, from the card template
+    of the ``using`` engine
+
+    With ``eager_first`` the first card loads its image immediately and
+    the others lazily, as the home page carousel needs.
+    """
+    memorials = list(memorials)
+    eager = [eager_first and index == 0 for index in range(len(memorials))]
+    keys = [card_key(memorial, layout, first, using) for memorial, first in zip(memorials, eager)]
+    cached = cache.get_many(keys)
+    rendered = {}
+    template = None
+    cards = []
+    for memorial, first, key in zip(memorials, eager, keys):
+        card = cached.get(key)
+        if card is None:
+            template = template or get_template(CARD_TEMPLATE, using=using)
+            card = rendered[key] = template.render({'memorial': memorial, 'layout': layout, 'eager': first})
+        cards.append(mark_safe(card))
+    if rendered:
+        cache.set_many(rendered, settings.CARD_CACHE_TIMEOUT)
+    return cards
@@ -0,0 +1,193 @@
+"""
+Conditional GET for memorial pages and listings.
+
+Validators are computed before the view runs, so a repeat visit is
+answered with 304 Not Modified without rendering the template or running
+the listing queries:
+
+* a memorial page is validated by the memorial's ``updated_at`` plus the
+  newest ``created_at`` and the number of its memories, read in one query,
+  and by when its share card was drawn, since the page links the card once
+  the background job has made it;
+* listings (home and explore) by a version stamp in the cache that moves
+  on whenever a memorial or memory changes, and by the date, since the
+  home page lists today's anniversaries.
+
+ETags also cover the viewer (user id and CSRF cookie) and a fingerprint
+of the templates, so logging in or deploying never returns an old page.
+Last-Modified cannot tell viewers apart, so it is only sent to anonymous
+visitors. Requests with flash messages waiting are always rendered.
+"""
+import hashlib
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.template import engines
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from . import share_cards
+from .auth import owns
+from .models import Memorial
+from .signals import memorials_changed
+
+LISTING_VERSION_KEY = 'listing:version'
+
+
+@lru_cache(maxsize=None)
+def template_state():
+    """
+    Content hash and newest modification time of the project templates
+    """
+    digest = hashlib.sha1()
+    newest = 0
+    for backend in engines.all():
+        for directory in backend.dirs:
+            for root, _dirs, files in sorted(os.walk(directory)):
+                for filename in sorted(files):
+                    if filename.startswith('.'):
+                        continue
+                    path = os.path.join(root, filename)
+                    digest.update(os.path.relpath(path, directory).encode())
+                    with open(path, 'rb') as handle:
+                        digest.update(handle.read())
+                    newest = max(newest, os.path.getmtime(path))
+    return digest.hexdigest()[:12], datetime.fromtimestamp(int(newest), dt_timezone.utc)
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+@receiver(memorials_changed)
+def bump_listing_version(sender, **kwargs):
+    cache.set(LISTING_VERSION_KEY, max(_now_us(), cache.get(LISTING_VERSION_KEY, 0) + 1),
+              settings.LISTING_VERSION_TIMEOUT)
+
+
+@receiver(post_save, sender='main_app.Memory')
+@receiver(post_delete, sender='main_app.Memory')
+def memory_changed(sender, **kwargs):
+    # Cards show memory counts
+    bump_listing_version(sender)
+
+
+def listing_version():
+    """
+    Version stamp of the listings, in microseconds since the epoch
+
+    A missing stamp starts at the current time, so a cache restart can
+    only cause extra 200s, never a stale 304.
+    """
+    version = cache.get(LISTING_VERSION_KEY)
+    if version is None:
+        cache.add(LISTING_VERSION_KEY, _now_us(), settings.LISTING_VERSION_TIMEOUT)
+        version = cache.get(LISTING_VERSION_KEY, _now_us())
+    return version
+
+
+def _viewer(request):
+    """
+    What else the page depends on, or None when it must be rendered anyway
+    """
+    if request.method not in ('GET', 'HEAD') or len(messages.get_messages(request)):
+        return None
+    return f'{request.user.pk}:{request.COOKIES.get(settings.CSRF_COOKIE_NAME, "")}'
+
+
+def _etag(request, *parts):
+    viewer = _viewer(request)
+    if viewer is None:
+        return None
+    fingerprint, _ = template_state()
+    return hashlib.md5(':'.join(map(str, (fingerprint, viewer, *parts))).encode()).hexdigest()
+
+
+def _last_modified(request, *times):
+    if _viewer(request) is None or request.user.is_authenticated:
+        return None
+    _, templates_modified = template_state()
+    return max(templates_modified, *(moment for moment in times if moment is not None))
+
+
+def listing_etag(request, *args, **kwargs):
+    # Listings also change at midnight, when the anniversaries move on
+    return _etag(request, 'listing', listing_version(), timezone.localdate())
+
+
+def listing_last_modified(request, *args, **kwargs):
+    midnight = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    return _last_modified(request, datetime.fromtimestamp(listing_version() / 1e6, dt_timezone.utc), midnight)
+
+
+def memorial_validators(request, slug):
+    """
+    Fields that decide a memorial page, fetched once per request,
+    or None when the page cannot be served from a validator
+    """
+    if request.method not in ('GET', 'HEAD'):
+        # Memory and contribution submissions never use a validator
+        return None
+    cached = getattr(request, '_memorial_validators', None)
+    if cached is not None and cached[0] == slug:
+        return cached[1]
+    row = Memorial.objects.filter(slug=slug).annotate(
+        latest_memory=Max('memories__created_at'), memory_count=Count('memories'),
+    ).values(
+        'updated_at', 'visibility', 'owner_id', 'latest_memory', 'memory_count', *share_cards.CARD_FIELDS,
+    ).first()
+    if row is not None and row['visibility'] == 'private' and not owns(request, row['owner_id']):
+        # Not shown to this viewer; the view redirects with a message
+        row = None
+    if row is not None:
+        row['share_card'] = share_cards.card_drawn_at(row)
+    request._memorial_validators = (slug, row)
+    return row
+
+
+def memorial_etag(request, slug):
+    row = memorial_validators(request, slug)
+    if row is None:
+        return None
+    return _etag(request, 'memorial', row['pk'], row['updated_at'].isoformat(), row['visibility'],
+                 row['latest_memory'].isoformat() if row['latest_memory'] else '', row['memory_count'],
+                 row['share_card'].isoformat() if row['share_card'] else '')
+
+
+def memorial_last_modified(request, slug):
+    row = memorial_validators(request, slug)
+    if row is None:
+        return None
+    return _last_modified(request, row['updated_at'], row['latest_memory'], row['share_card'])
+
+
+def _conditional_view(etag_func, last_modified_func):
+    """
+    Answer conditional GETs from the validators, and make browsers revalidate
+    """
+    def decorator(view):
+        conditional_view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            # Pages differ per viewer, and a heuristically fresh copy could hide
+            # a memory the visitor has just added
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+        return wrapper
+    return decorator
+
+
+conditional_listing = _conditional_view(listing_etag, listing_last_modified)
+conditional_memorial = _conditional_view(memorial_etag, memorial_last_modified)
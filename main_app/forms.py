@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
+from .images import BoundedImageField
 from .models import Memorial, Memory
 
 
@@ -23,6 +24,7 @@ class MemorialForm(forms.ModelForm):
     class Meta:
         model = Memorial
         fields = ['name', 'dob', 'dod', 'bio', 'cover_image', 'visibility']
+        field_classes = {'cover_image': BoundedImageField}
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control', 
@@ -64,6 +66,7 @@ class MemoryForm(forms.ModelForm):
     class Meta:
         model = Memory
         fields = ['type', 'content', 'image', 'video_url']
+        field_classes = {'image': BoundedImageField}
         widgets = {
             'type': forms.Select(attrs={'class': 'form-select', 'id': 'memory-type'}),
             'content': forms.Textarea(attrs={'class': 'form-control', 'rows': 4, 'placeholder': 'Share a memory...'}),
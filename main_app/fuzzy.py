@@ -0,0 +1,128 @@
+"""
+Transliteration-tolerant memorial name search backed by a trigram index.
+
+Every memorial's phonetic name key (see ``search.phonetic_key``) is split
+into trigrams stored in MemorialTrigram. A query is scored by how many of
+its trigrams a name contains. Candidates are found with the index, and only
+those candidates are scored in Python:
+
+* Prefix filtering: a name that shares at least ``threshold`` of the
+  query's trigrams must contain at least one of the query's rarest
+  ``n - ceil(threshold * n) + 1`` trigrams. Only those rare trigrams are
+  looked up, so very common ones like '  m' never scan huge posting lists.
+* The best-matching candidates by shared trigram count are loaded and
+  ranked by similarity, with popularity as the tie-breaker.
+
+The index is kept current through ``memorials_changed``; deleted memorials
+lose their trigrams through the foreign key cascade.
+"""
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.dispatch import receiver
+
+from .models import Memorial, MemorialTrigram
+from .search import phonetic_key, trigrams
+from .signals import memorials_changed
+
+
+def memorial_trigrams(name):
+    return trigrams(phonetic_key(name))
+
+
+def index_memorials(memorials):
+    """
+    Replace the stored trigrams for the given memorials
+    """
+    memorials = list(memorials)
+    rows = [
+        MemorialTrigram(memorial_id=memorial.pk, trigram=gram)
+        for memorial in memorials
+        for gram in memorial_trigrams(memorial.name)
+    ]
+    with transaction.atomic():
+        MemorialTrigram.objects.filter(memorial__in=[memorial.pk for memorial in memorials]).delete()
+        MemorialTrigram.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+@receiver(memorials_changed)
+def reindex_changed(sender, pks, fields=None, **kwargs):
+    if fields is None or 'name' in fields:
+        index_memorials(Memorial.objects.filter(pk__in=pks).only('pk', 'name'))
+
+
+def _frequency_key(gram):
+    # Trigrams are padded with spaces, which memcached does not allow in keys
+    return 'trigram:freq:' + gram.replace(' ', '_')
+
+
+def trigram_frequencies(grams):
+    """
+    Number of memorials containing each trigram, cached because it drifts slowly
+    """
+    keys = {_frequency_key(gram): gram for gram in grams}
+    cached = cache.get_many(keys)
+    frequencies = {keys[key]: count for key, count in cached.items()}
+    missing = [gram for gram in grams if gram not in frequencies]
+    if missing:
+        counted = dict(
+            MemorialTrigram.objects.filter(trigram__in=missing)
+            .values('trigram').annotate(count=Count('id')).values_list('trigram', 'count')
+        )
+        fresh = {gram: counted.get(gram, 0) for gram in missing}
+        cache.set_many({_frequency_key(gram): count for gram, count in fresh.items()},
+                       settings.FUZZY_SEARCH_FREQUENCY_TIMEOUT)
+        frequencies.update(fresh)
+    return frequencies
+
+
+def similarity(query_grams, name):
+    """
+    Share of the query's trigrams found in the name, so a surname alone
+    still matches a long full name
+    """
+    if not query_grams:
+        return 0.0
+    return len(query_grams & memorial_trigrams(name)) / len(query_grams)
+
+
+def fuzzy_search(query, limit=None, threshold=None):
+    """
+    Return ids of public memorials matching ``query``, best match first
+    """
+    limit = limit or settings.FUZZY_SEARCH_LIMIT
+    threshold = threshold if threshold is not None else settings.FUZZY_SEARCH_THRESHOLD
+    query_grams = memorial_trigrams(query)
+    if not query_grams:
+        return []
+
+    # Prefix filtering: only the rarest trigrams are needed to find every match
+    frequencies = trigram_frequencies(query_grams)
+    required_overlap = max(math.ceil(threshold * len(query_grams)), 1)
+    rare = sorted(query_grams, key=lambda gram: (frequencies[gram], gram))
+    rare = [gram for gram in rare[:len(query_grams) - required_overlap + 1] if frequencies[gram]]
+    if not rare:
+        return []
+
+    # Private memorials are left out before the cut, so they cannot crowd out public matches
+    candidate_ids = list(
+        MemorialTrigram.objects.filter(trigram__in=rare, memorial__visibility='public')
+        .values('memorial_id').annotate(hits=Count('id'))
+        .order_by('-hits').values_list('memorial_id', flat=True)[:settings.FUZZY_SEARCH_CANDIDATES]
+    )
+    candidates = (
+        Memorial.objects.filter(pk__in=candidate_ids, visibility='public')
+        .annotate(popularity=F('donations_count') + F('trees_planted_count'))
+        .values_list('pk', 'name', 'popularity')
+    )
+    scored = []
+    for pk, name, popularity in candidates:
+        score = similarity(query_grams, name)
+        if score >= threshold:
+            scored.append((-score, -popularity, pk))
+    scored.sort()
+    return [pk for _, _, pk in scored[:limit]]
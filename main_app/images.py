@@ -0,0 +1,108 @@
+"""
+Bounded-memory processing for uploaded images.
+
+Uploads are streamed to a temporary file (see FILE_UPLOAD_HANDLERS), so
+only the image header is read before the declared size is checked. JPEGs
+may declare up to IMAGE_MAX_PIXELS since draft mode decodes them at 1/2,
+1/4 or 1/8 scale; other formats are always decoded in full, so they are
+held to the lower IMAGE_MAX_FULL_DECODE_PIXELS. Images that pass are turned
+upright, stripped of EXIF and other metadata, and re-encoded to fit within
+IMAGE_MAX_DIMENSION. The stored file is never larger than that, whatever
+was uploaded.
+"""
+import io
+import os
+import warnings
+
+from django import forms
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def process_image(upload):
+    """
+    Validate an uploaded image and return a re-encoded, bounded copy
+
+    Raises ValidationError before decoding anything when the file is too
+    large or its header declares too many pixels.
+    """
+    if upload.size is not None and upload.size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        raise ValidationError(
+            f'Images must be smaller than {settings.IMAGE_UPLOAD_MAX_SIZE // (1024 * 1024)} MB.',
+            code='file_too_large',
+        )
+
+    max_dimension = settings.IMAGE_MAX_DIMENSION
+    upload.seek(0)
+    try:
+        with warnings.catch_warnings():
+            # Pillow only warns below its own hard limit, our cap is checked next
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            image = Image.open(upload)
+    except Image.DecompressionBombError:
+        raise ValidationError('This image has too many pixels.', code='too_many_pixels')
+    except (UnidentifiedImageError, OSError):
+        raise ValidationError('Upload a valid image.', code='invalid_image')
+
+    with image:
+        width, height = image.size
+        if image.format not in ALLOWED_FORMATS:
+            raise ValidationError('Upload a JPEG, PNG, GIF or WebP image.', code='invalid_image')
+        limit = settings.IMAGE_MAX_PIXELS if image.format == 'JPEG' else settings.IMAGE_MAX_FULL_DECODE_PIXELS
+        if width * height > limit:
+            raise ValidationError('This image has too many pixels.', code='too_many_pixels')
+
+        scale = min(max_dimension / max(width, height), 1)
+        target = (max(int(width * scale), 1), max(int(height * scale), 1))
+        try:
+            # Only JPEG supports draft mode: it decodes at the smallest DCT
+            # scale that still covers the target size
+            image.draft('RGB', target)
+            # Other formats are decoded in full and shrunk with reduce() first
+            image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            ImageOps.exif_transpose(image, in_place=True)
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+            raise ValidationError('Upload a valid image.', code='invalid_image')
+
+        if _has_alpha(image):
+            if image.mode != 'RGBA':
+                image = image.convert('RGBA')
+            image_format, extension, options = 'PNG', 'png', {'optimize': True}
+        else:
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            image_format, extension, options = 'JPEG', 'jpg', {
+                'quality': settings.IMAGE_JPEG_QUALITY, 'optimize': True, 'progressive': True,
+            }
+
+        # Saving without exif= or pnginfo= drops all metadata, including GPS tags
+        output = io.BytesIO()
+        image.save(output, image_format, **options)
+
+    name = f'{os.path.splitext(os.path.basename(upload.name))[0]}.{extension}'
+    processed = SimpleUploadedFile(name, output.getvalue(), content_type=Image.MIME[image_format])
+    processed.image = image
+    return processed
+
+
+class BoundedImageField(forms.ImageField):
+    """
+    ImageField that replaces the upload with a bounded, metadata-free copy
+
+    Django's ImageField opens and verifies the whole file; this one checks
+    the header first and hands the model the re-encoded image instead.
+    """
+
+    def to_python(self, data):
+        upload = forms.FileField.to_python(self, data)
+        if upload is None:
+            return None
+        return process_image(upload)
@@ -0,0 +1,169 @@
+"""
+Lightweight background job queue stored in the project database.
+
+Functions decorated with ``@background`` gain a ``delay()`` method that stores
+a Job row instead of running the function inline. The ``run_worker``
+management command claims due jobs and executes them, retrying failures with
+exponential backoff.
+"""
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def background(func=None, *, max_attempts=None):
+    """
+    Register a function as a background task and add a ``delay()`` method to it
+
+    Arguments passed to ``delay()`` are stored as JSON, so they must be plain
+    values such as primary keys rather than model instances.
+    """
+    def decorator(func):
+        task = f'{func.__module__}.{func.__qualname__}'
+        _registry[task] = func
+
+        def delay(*args, **kwargs):
+            return enqueue(task, args, kwargs, max_attempts=max_attempts)
+
+        func.delay = delay
+        func.task_name = task
+        return func
+
+    if func is not None:
+        return decorator(func)
+    return decorator
+
+
+def enqueue(task, args=(), kwargs=None, max_attempts=None, run_at=None):
+    """
+    Store a job for the given task path and return it
+    """
+    if max_attempts is None:
+        max_attempts = settings.JOBS_MAX_ATTEMPTS
+    job = Job.objects.create(
+        task=task,
+        args=list(args),
+        kwargs=kwargs or {},
+        max_attempts=max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    if settings.JOBS_EAGER:
+        claimed = claim_jobs(job_ids=[job.pk])
+        for claimed_job in claimed:
+            run_job(claimed_job)
+        job.refresh_from_db()
+    return job
+
+
+def get_task(task):
+    """
+    Resolve a task path to its function, importing the module if needed
+    """
+    if task not in _registry:
+        func = import_string(task)
+        _registry.setdefault(task, func)
+    return _registry[task]
+
+
+def retry_delay(attempts):
+    """
+    Seconds to wait before the next attempt after ``attempts`` failures
+    """
+    delay = settings.JOBS_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+    return min(delay, settings.JOBS_MAX_BACKOFF)
+
+
+def requeue_stale():
+    """
+    Put back jobs whose worker died while running them
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.JOBS_LOCK_TIMEOUT)
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_at__lt=cutoff
+    ).update(status=Job.STATUS_QUEUED, locked_at=None)
+
+
+def claim_jobs(limit=None, job_ids=None):
+    """
+    Atomically mark due jobs as running and return them
+
+    Each job is claimed with a conditional UPDATE, so concurrent workers never
+    run the same job twice even on databases without SELECT ... FOR UPDATE.
+    """
+    now = timezone.now()
+    candidates = Job.objects.filter(status=Job.STATUS_QUEUED, run_at__lte=now)
+    if job_ids is not None:
+        candidates = candidates.filter(pk__in=job_ids)
+    candidates = candidates.order_by('run_at', 'pk').values_list('pk', flat=True)
+    if limit is not None:
+        candidates = candidates[:limit]
+
+    claimed = []
+    for pk in candidates:
+        updated = Job.objects.filter(pk=pk, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(pk)
+    return list(Job.objects.filter(pk__in=claimed).order_by('run_at', 'pk'))
+
+
+def run_job(job):
+    """
+    Execute a claimed job and record the outcome
+    """
+    try:
+        func = get_task(job.task)
+        func(*job.args, **job.kwargs)
+    except Exception as exc:
+        error = ''.join(traceback.format_exception(exc))
+        if job.attempts >= job.max_attempts:
+            logger.error("Job %s (%s) failed permanently: %s", job.pk, job.task, exc)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_FAILED,
+                locked_at=None,
+                finished_at=timezone.now(),
+                last_error=error,
+            )
+        else:
+            logger.warning("Job %s (%s) failed, retrying: %s", job.pk, job.task, exc)
+            Job.objects.filter(pk=job.pk).update(
+                status=Job.STATUS_QUEUED,
+                locked_at=None,
+                run_at=timezone.now() + timedelta(seconds=retry_delay(job.attempts)),
+                last_error=error,
+            )
+        return False
+
+    Job.objects.filter(pk=job.pk).update(
+        status=Job.STATUS_DONE,
+        locked_at=None,
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+def run_job_by_pk(pk):
+    """
+    Pool entry point: load and run a claimed job on this thread or process
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=pk)
+        return run_job(job)
+    finally:
+        close_old_connections()
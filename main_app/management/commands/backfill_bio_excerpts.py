@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from main_app.models import Memorial, make_bio_excerpt
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored bio excerpts shown on memorial cards'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of memorials to update per query'
+        )
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only fill memorials that have a bio but no excerpt'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        memorials = Memorial.objects.only('pk', 'bio', 'bio_excerpt').order_by('pk')
+        if options['missing']:
+            memorials = memorials.filter(bio_excerpt='').exclude(bio='')
+
+        checked = updated = 0
+        last_pk = 0
+        while True:
+            batch = list(memorials.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for memorial in batch:
+                excerpt = make_bio_excerpt(memorial.bio)
+                if excerpt != memorial.bio_excerpt:
+                    memorial.bio_excerpt = excerpt
+                    changed.append(memorial)
+            # bulk_update skips save(), so updated_at is left alone
+            Memorial.objects.bulk_update(changed, ['bio_excerpt'])
+            checked += len(batch)
+            updated += len(changed)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} of {checked} memorial excerpt(s)'))
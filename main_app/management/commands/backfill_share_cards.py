@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from main_app.models import Memorial
+from main_app.share_cards import render_share_cards
+
+
+class Command(BaseCommand):
+    help = 'Queue share cards for memorials that do not have an up-to-date one'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--now', action='store_true',
+            help='Draw the cards in this process instead of queueing jobs for run_worker'
+        )
+
+    def handle(self, *args, **options):
+        size = settings.SHARE_CARD_JOB_SIZE
+        memorial_ids = list(Memorial.objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(memorial_ids), size):
+            batch = memorial_ids[start:start + size]
+            if options['now']:
+                render_share_cards(batch)
+            else:
+                render_share_cards.delay(batch)
+        action = 'Drew missing share cards for' if options['now'] else 'Queued share cards for'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(memorial_ids)} memorials'))
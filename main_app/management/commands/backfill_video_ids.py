@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from main_app.models import Memory
+from main_app.video import parse_video_url
+
+
+class Command(BaseCommand):
+    help = 'Recompute the video provider and id stored for video memories'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of memories to update per query'
+        )
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only fill memories that have a video URL but no video id'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        memories = Memory.objects.exclude(video_url='').only('pk', 'video_url', 'video_provider', 'video_id').order_by('pk')
+        if options['missing']:
+            memories = memories.filter(video_id='')
+
+        checked = updated = 0
+        last_pk = 0
+        while True:
+            batch = list(memories.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            changed = []
+            for memory in batch:
+                parsed = parse_video_url(memory.video_url)
+                if parsed != (memory.video_provider, memory.video_id):
+                    memory.video_provider, memory.video_id = parsed
+                    changed.append(memory)
+            Memory.objects.bulk_update(changed, ['video_provider', 'video_id'])
+            checked += len(batch)
+            updated += len(changed)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} of {checked} video memories'))
@@ -0,0 +1,54 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from main_app.backup import MODELS, parse_since, write_manifest, write_model
+
+
+class Command(BaseCommand):
+    help = 'Stream users, profiles, memorials and memories to gzipped JSONL files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory to write the backup into; created if needed')
+        parser.add_argument(
+            '--since',
+            help='Only back up rows created or changed since this ISO date or datetime'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of rows to fetch from the database at a time'
+        )
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        try:
+            since = parse_since(options['since']) if options['since'] else None
+        except ValueError as exc:
+            raise CommandError(exc)
+        os.makedirs(directory, exist_ok=True)
+        if os.listdir(directory):
+            raise CommandError(f'{directory} is not empty')
+
+        # Taken before reading, so the next incremental backup from this
+        # time also covers rows changed while this one ran
+        started_at = timezone.now()
+        entries = []
+        total = 0
+        began = time.monotonic()
+        for label in MODELS:
+            start = time.monotonic()
+            entry = write_model(directory, label, since, options['chunk_size'])
+            elapsed = time.monotonic() - start
+            entries.append(entry)
+            total += entry['rows']
+            self.stdout.write(f"{label}: {entry['rows']} row(s) in {elapsed:.1f}s "
+                              f"({entry['rows'] / max(elapsed, 1e-6):.0f} rows/s)")
+        write_manifest(directory, entries, started_at, since)
+
+        elapsed = time.monotonic() - began
+        self.stdout.write(self.style.SUCCESS(
+            f'Backed up {total} row(s) in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.0f} rows/s) to {directory}'
+        ))
+        self.stdout.write(f'For the next incremental backup use --since {started_at.isoformat()}')
@@ -0,0 +1,108 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from main_app.fuzzy import fuzzy_search, memorial_trigrams
+from main_app.models import Memorial, MemorialTrigram, UserProfile
+from main_app.search import normalize_name
+
+# Names are assembled from syllables so the trigram distribution resembles a
+# real directory instead of a few dozen names repeated a million times
+ONSETS = ['', 'b', 'f', 'gh', 'h', 'j', 'k', 'kh', 'm', 'n', 'q', 'r', 's', 'sh', 't', 'z']
+NUCLEI = ['a', 'aa', 'ai', 'e', 'ee', 'i', 'o', 'oo', 'u']
+CODAS = ['', 'b', 'd', 'f', 'h', 'l', 'm', 'n', 'q', 'r', 's', 't', 'z']
+KNOWN_NAMES = [
+    'Nusrat Fateh Ali Khan', 'Noor Jehan', 'Muhammad Ali Jinnah', 'Abdul Sattar Edhi',
+    'Mohammed Rafiq Qureshi', 'Ayesha Siddiqui', 'Fatima Jinnah', 'Allama Muhammad Iqbal',
+]
+QUERIES = ['Nusret Fateh Ali', 'Nur Jahan', 'Mohammad Jinah', 'Rafeeq Qureshi', 'Aisha Sidiqi', 'Edhi']
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time fuzzy name search against a large synthetic set of memorials, then roll it back'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--memorials', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per query')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.populate(options['memorials'], options['batch_size'])
+                self.run_queries(options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Synthetic memorials rolled back')
+
+    def populate(self, count, batch_size):
+        user = User.objects.create(username=f'benchmark-{time.time_ns()}')
+        owner = UserProfile.objects.get(user=user)
+        rng = random.Random(0)
+        insert_trigrams = (
+            f'INSERT INTO {MemorialTrigram._meta.db_table} (memorial_id, trigram) VALUES (%s, %s)'
+        )
+        start = time.perf_counter()
+        for offset in range(0, count, batch_size):
+            memorials = []
+            for i in range(offset, min(offset + batch_size, count)):
+                name = self.random_name(rng) if i % 1000 else KNOWN_NAMES[i // 1000 % len(KNOWN_NAMES)]
+                memorials.append(Memorial(
+                    owner=owner, name=name, search_name=normalize_name(name),
+                    slug=f'benchmark-{user.pk}-{i}', visibility='public',
+                ))
+            # bulk_create skips save() and its signals, so index directly
+            memorials = Memorial.objects.bulk_create(memorials)
+            with connection.cursor() as cursor:
+                cursor.executemany(insert_trigrams, [
+                    (memorial.pk, gram)
+                    for memorial in memorials
+                    for gram in memorial_trigrams(memorial.name)
+                ])
+        self.stdout.write(f'Created {count} memorials in {time.perf_counter() - start:.1f}s')
+
+    @staticmethod
+    def random_name(rng):
+        words = []
+        for _ in range(rng.choice([2, 2, 3])):
+            word = ''.join(
+                rng.choice(ONSETS) + rng.choice(NUCLEI) + rng.choice(CODAS)
+                for _ in range(rng.choice([2, 2, 3]))
+            )
+            words.append(word.capitalize())
+        return ' '.join(words)
+
+    def run_queries(self, repeat):
+        self.stdout.write(
+            f"{'query':<20} {'fuzzy cold ms':>14} {'fuzzy warm ms':>14} {'icontains ms':>13} {'matches':>8}"
+        )
+        for query in QUERIES:
+            # The first run also counts trigram frequencies, later runs find them cached
+            cache.clear()
+            start = time.perf_counter()
+            matches = fuzzy_search(query)
+            cold = time.perf_counter() - start
+
+            warm_times, contains_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fuzzy_search(query)
+                warm_times.append(time.perf_counter() - start)
+
+                # What explore did before: every public memorial containing the query
+                start = time.perf_counter()
+                list(Memorial.objects.filter(name__icontains=query, visibility='public').values_list('pk', flat=True))
+                contains_times.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'{query:<20} {cold * 1000:>14.1f} {statistics.median(warm_times) * 1000:>14.1f} '
+                f'{statistics.median(contains_times) * 1000:>13.1f} {len(matches):>8}'
+            )
@@ -0,0 +1,85 @@
+import statistics
+import time
+from datetime import date
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from main_app.models import Memorial, UserProfile
+
+ENGINES = ['django', 'jinja2']
+
+
+class Command(BaseCommand):
+    help = 'Compare how long Django and Jinja2 take to render the explore page, with cards rendered or cached'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--cards', default='100,1000,10000',
+            help='Comma-separated numbers of cards to render'
+        )
+        parser.add_argument('--repeat', type=int, default=5, help='Renders per engine and size')
+
+    def handle(self, *args, **options):
+        available = [backend.name for backend in engines.all()]
+        missing = [name for name in ENGINES if name not in available]
+        if missing:
+            raise CommandError(f"Template engine(s) not configured: {', '.join(missing)}. Is Jinja2 installed?")
+        templates = {name: engines[name].get_template('main_app/explore.html') for name in ENGINES}
+        request = RequestFactory().get('/explore/')
+        request.user = AnonymousUser()
+
+        # Cards come from the card cache; a private one can be emptied freely
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'benchmark-templates',
+            'OPTIONS': {'MAX_ENTRIES': 1000000},
+        }}):
+            self.run(templates, request, options)
+
+    def run(self, templates, request, options):
+        self.stdout.write(
+            f"{'cards':>8} {'django cold ms':>15} {'jinja2 cold ms':>15} {'django warm ms':>15} {'jinja2 warm ms':>15}"
+        )
+        for count in [int(value) for value in options['cards'].split(',')]:
+            context = {'memorials': self.cards(count), 'search_query': ''}
+            medians = {}
+            for name, template in templates.items():
+                # The first render also warms lazy attributes such as reverse()'s resolver
+                template.render(context, request)
+                for state in ('cold', 'warm'):
+                    times = []
+                    for _ in range(options['repeat']):
+                        if state == 'cold':
+                            cache.clear()
+                        start = time.perf_counter()
+                        template.render(context, request)
+                        times.append(time.perf_counter() - start)
+                    medians[name, state] = statistics.median(times)
+            self.stdout.write(f'{count:>8} ' + ' '.join(
+                f'{medians[name, state] * 1000:>15.1f}' for state in ('cold', 'warm') for name in ENGINES
+            ))
+
+    @staticmethod
+    def cards(count):
+        """
+        Unsaved memorials carrying everything a card shows, so no database is needed
+        """
+        owner = UserProfile(user=User(username='benchmark'))
+        created_at = timezone.now()
+        memorials = []
+        for i in range(count):
+            memorial = Memorial(
+                owner=owner, name=f'Memorial {i}', slug=f'memorial-{i}',
+                dob=date(1930, 1, 1), dod=date(2000, 1, 1), visibility='public',
+                bio_excerpt='A life of music, family and friendship, remembered by everyone who knew them.',
+                donations_count=i % 50, trees_planted_count=i % 7, created_at=created_at, updated_at=created_at,
+            )
+            memorial.pk = i + 1
+            memorial.memory_count = i % 12
+            memorials.append(memorial)
+        return memorials
@@ -0,0 +1,335 @@
+import asyncio
+import random
+import secrets
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from main_app.models import Memorial
+
+DEFAULT_MIX = 'home=30,explore=25,detail=25,donate=5,plant_tree=5,memory=10'
+SEARCHES = ['Nusrat', 'Noor Jehan', 'Edhi', 'Iqbal', 'Jinnah', 'Khan', 'Fatima']
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+async def http_request(host, port, method, target, headers, body=b'', timeout=30):
+    """
+    Send one HTTP/1.1 request over a new connection and read the whole response
+    """
+    async def exchange():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            lines = [f'{method} {target} HTTP/1.1', f'Host: {host}:{port}', 'Connection: close',
+                     f'Content-Length: {len(body)}']
+            lines.extend(f'{name}: {value}' for name, value in headers.items())
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+        head, _, payload = raw.partition(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        parsed = [tuple(part.strip() for part in line.split(':', 1)) for line in header_lines if ':' in line]
+        return Response(int(status_line.split()[1]), parsed, payload)
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+class Session:
+    """
+    A browser-like visitor holding its own cookies
+    """
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        if parts.scheme != 'http':
+            raise CommandError('Only http:// servers can be load tested')
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def request(self, method, path, data=None):
+        headers = {'User-Agent': 'memorialbridge-loadtest'}
+        body = b''
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{name}={value}' for name, value in self.cookies.items())
+        if data is not None:
+            data = dict(data, csrfmiddlewaretoken=self.cookies.get('csrftoken', ''))
+            body = urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        response = await http_request(self.host, self.port, method, path, headers, body, self.timeout)
+        for name, value in response.headers:
+            if name.lower() == 'set-cookie':
+                cookie_name, _, cookie_value = value.split(';', 1)[0].partition('=')
+                self.cookies[cookie_name.strip()] = cookie_value.strip()
+        return response
+
+    async def login(self, username, password):
+        login_path = reverse('login')
+        await self.request('GET', login_path)
+        response = await self.request('POST', login_path, {'username': username, 'password': password})
+        if response.status != 302 or 'sessionid' not in self.cookies:
+            raise CommandError(f'Could not log in as {username} (HTTP {response.status})')
+
+
+class Stats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.failures = defaultdict(Counter)
+
+    def record(self, endpoint, seconds, status=None, failure=None):
+        self.latencies[endpoint].append(seconds)
+        if failure is not None:
+            self.failures[endpoint][failure] += 1
+        else:
+            self.statuses[endpoint][status] += 1
+
+    def errors(self, endpoint):
+        statuses = self.statuses[endpoint]
+        failed = sum(count for status, count in statuses.items() if status >= 400 and status != 429)
+        return failed + sum(self.failures[endpoint].values())
+
+    def throttled(self, endpoint):
+        return self.statuses[endpoint][429]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise CommandError(f"Unknown endpoint '{name}', choose from {', '.join(ENDPOINTS)}")
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise CommandError(f"Invalid weight for '{name}': {weight!r}")
+    return mix
+
+
+async def hit_home(session, slugs, rng):
+    return await session.request('GET', reverse('home'))
+
+
+async def hit_explore(session, slugs, rng):
+    return await session.request('GET', reverse('explore') + '?' + urlencode({'search': rng.choice(SEARCHES)}))
+
+
+async def hit_detail(session, slugs, rng):
+    return await session.request('GET', reverse('memorial_detail', kwargs={'slug': rng.choice(slugs)}))
+
+
+async def hit_donate(session, slugs, rng):
+    path = reverse('memorial_detail', kwargs={'slug': rng.choice(slugs)})
+    return await session.request('POST', path, {'donate': '1'})
+
+
+async def hit_plant_tree(session, slugs, rng):
+    path = reverse('memorial_detail', kwargs={'slug': rng.choice(slugs)})
+    return await session.request('POST', path, {'plant_tree': '1'})
+
+
+async def hit_memory(session, slugs, rng):
+    path = reverse('memorial_detail', kwargs={'slug': rng.choice(slugs)})
+    return await session.request('POST', path, {
+        'memory_submit': '1', 'type': 'text', 'content': f'Load test memory {rng.randrange(10 ** 6)}',
+    })
+
+
+ENDPOINTS = {
+    'home': hit_home,
+    'explore': hit_explore,
+    'detail': hit_detail,
+    'donate': hit_donate,
+    'plant_tree': hit_plant_tree,
+    'memory': hit_memory,
+}
+
+
+class Command(BaseCommand):
+    help = 'Drive a running MemorialBridge server with a realistic traffic mix and report latencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Server to load test')
+        parser.add_argument(
+            '--concurrency', default='1,5,10,25,50',
+            help='Comma-separated numbers of concurrent virtual users, run one level after another'
+        )
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run each concurrency level')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted endpoint mix (default: {DEFAULT_MIX})')
+        parser.add_argument('--users', type=int, default=10, help='Number of loadtest accounts to log in as')
+        parser.add_argument(
+            '--allow-persistent-accounts', action='store_true',
+            help='Run with DEBUG off; accounts left behind by an interrupted run stay in that database',
+        )
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds before a request counts as failed')
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--no-histogram', action='store_true', help='Only print the summary tables')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        try:
+            levels = [int(level) for level in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers')
+        if not settings.DEBUG and not options['allow_persistent_accounts']:
+            raise CommandError(
+                'loadtest creates user accounts in the configured database; run it with DEBUG on, '
+                'or pass --allow-persistent-accounts'
+            )
+        slugs = list(Memorial.objects.filter(visibility='public').values_list('slug', flat=True)[:1000])
+        if not slugs:
+            raise CommandError('No public memorials to request; run seed_data first')
+        accounts, password = self.create_accounts(options['users'])
+        try:
+            self.stdout.write(
+                f"Load testing {options['base_url']} for {options['duration']:g}s per level "
+                f"with {len(accounts)} accounts and {len(slugs)} memorials"
+            )
+            summary = []
+            for concurrency in levels:
+                stats, elapsed = asyncio.run(self.run_level(
+                    options['base_url'], concurrency, options['duration'], mix, slugs, accounts, password,
+                    options['timeout'], random.Random(options['seed']),
+                ))
+                summary.append((concurrency, *self.report(concurrency, stats, elapsed, not options['no_histogram'])))
+            self.report_saturation(summary)
+        finally:
+            # Also removes the memories the accounts posted
+            User.objects.filter(username__in=accounts).delete()
+
+    def create_accounts(self, count):
+        """
+        Fresh accounts for this run, with a password nobody else knows
+        """
+        run = secrets.token_hex(4)
+        password = secrets.token_urlsafe(24)
+        accounts = []
+        for number in range(count):
+            user = User.objects.create_user(username=f'loadtest-{run}-{number}', password=password)
+            accounts.append(user.username)
+        return accounts, password
+
+    async def run_level(self, base_url, concurrency, duration, mix, slugs, accounts, password, timeout, rng):
+        sessions = [Session(base_url, timeout) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*[
+                session.login(accounts[number % len(accounts)], password)
+                for number, session in enumerate(sessions)
+            ])
+        except OSError as error:
+            raise CommandError(f'Cannot reach {base_url}: {error}')
+
+        stats = Stats()
+        names, weights = list(mix), list(mix.values())
+        start = time.perf_counter()
+        deadline = start + duration
+
+        async def virtual_user(session, user_rng):
+            while time.perf_counter() < deadline:
+                endpoint = user_rng.choices(names, weights)[0]
+                sent = time.perf_counter()
+                try:
+                    response = await ENDPOINTS[endpoint](session, slugs, user_rng)
+                except asyncio.TimeoutError:
+                    stats.record(endpoint, time.perf_counter() - sent, failure='timeout')
+                except OSError as error:
+                    stats.record(endpoint, time.perf_counter() - sent, failure=type(error).__name__)
+                else:
+                    stats.record(endpoint, time.perf_counter() - sent, status=response.status)
+
+        await asyncio.gather(*[
+            virtual_user(session, random.Random(rng.random())) for session in sessions
+        ])
+        return stats, time.perf_counter() - start
+
+    def report(self, concurrency, stats, elapsed, histogram):
+        total = sum(len(values) for values in stats.latencies.values())
+        errors = sum(stats.errors(endpoint) for endpoint in stats.latencies)
+        throttled = sum(stats.throttled(endpoint) for endpoint in stats.latencies)
+        all_latencies = sorted(value for values in stats.latencies.values() for value in values)
+        throughput = total / elapsed if elapsed else 0
+        error_rate = errors / total if total else 0
+        p99 = percentile(all_latencies, 0.99)
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Concurrency {concurrency}: {total} requests in {elapsed:.1f}s, {throughput:.1f} req/s, '
+            f'{error_rate:.1%} errors, {throttled} throttled'
+        ))
+        if throttled:
+            self.stdout.write(self.style.WARNING(
+                '  Throttled requests hit the rate limiter; set RATELIMIT_ENABLE = False on the server under test'
+            ))
+        self.stdout.write(
+            f"  {'endpoint':<11} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50 ms':>8} {'p90 ms':>8} "
+            f"{'p99 ms':>8} {'max ms':>8}"
+        )
+        for endpoint in sorted(stats.latencies):
+            values = sorted(stats.latencies[endpoint])
+            self.stdout.write(
+                f'  {endpoint:<11} {len(values):>7} {len(values) / elapsed:>8.1f} '
+                f'{stats.errors(endpoint) / len(values):>6.1%} {percentile(values, 0.5) * 1000:>8.1f} '
+                f'{percentile(values, 0.9) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f} '
+                f'{values[-1] * 1000:>8.1f}'
+            )
+            problems = {**{f'HTTP {status}': count for status, count in stats.statuses[endpoint].items()
+                           if status >= 400}, **stats.failures[endpoint]}
+            if problems:
+                self.stdout.write('    ' + ', '.join(f'{name}: {count}' for name, count in sorted(problems.items())))
+            if histogram:
+                self.write_histogram(values)
+        return throughput, error_rate, p99
+
+    def write_histogram(self, values):
+        counts = Counter()
+        for value in values:
+            bucket = next((bound for bound in BUCKETS_MS if value * 1000 <= bound), None)
+            counts[bucket] += 1
+        widest = max(counts.values())
+        for bound in BUCKETS_MS + [None]:
+            if counts[bound]:
+                label = f'<= {bound} ms' if bound is not None else f'> {BUCKETS_MS[-1]} ms'
+                bar = '#' * max(1, round(40 * counts[bound] / widest))
+                self.stdout.write(f'    {label:>11} {counts[bound]:>7} {bar}')
+
+    def report_saturation(self, summary):
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS('Saturation'))
+        self.stdout.write(f"  {'users':>6} {'req/s':>8} {'p99 ms':>8} {'err%':>6}")
+        knee = None
+        previous = None
+        for concurrency, throughput, error_rate, p99 in summary:
+            self.stdout.write(f'  {concurrency:>6} {throughput:>8.1f} {p99 * 1000:>8.1f} {error_rate:>6.1%}')
+            # Saturated once more users stop buying throughput or start causing errors
+            if knee is None and previous is not None and (
+                throughput < previous * 1.1 or error_rate > 0.01
+            ):
+                knee = concurrency
+            previous = throughput
+        if knee is not None:
+            self.stdout.write(self.style.WARNING(
+                f'Throughput stopped scaling or errors appeared at {knee} concurrent users'
+            ))
+        else:
+            self.stdout.write('No saturation point reached; try higher --concurrency levels')
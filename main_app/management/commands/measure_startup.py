@@ -0,0 +1,87 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so every import and cache starts cold
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+timings = {}
+
+import django
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+timings['app'] = time.perf_counter() - start
+
+if sys.argv[1] == 'warm':
+    from main_app.warmup import warm_up
+    mark = time.perf_counter()
+    warm_up()
+    timings['warm_up'] = time.perf_counter() - mark
+
+def request(path):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SERVER_NAME': sys.argv[2],
+        'SERVER_PORT': '80', 'HTTP_HOST': sys.argv[2], 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': sys.stdin.buffer,
+        'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http', 'wsgi.multithread': False,
+        'wsgi.multiprocess': True, 'wsgi.run_once': False, 'wsgi.version': (1, 0),
+    }
+    status = []
+    mark = time.perf_counter()
+    body = application(environ, lambda s, h, exc_info=None: status.append(s))
+    for chunk in body:
+        pass
+    if hasattr(body, 'close'):
+        body.close()
+    return time.perf_counter() - mark, status[0]
+
+for path in sys.argv[3:]:
+    timings['first ' + path], status = request(path)
+    timings['second ' + path], _ = request(path)
+    timings['status ' + path] = status
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure how long a fresh worker takes to start and serve its first requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=['/', '/explore/'], help='Paths to request')
+        parser.add_argument('--runs', type=int, default=5, help='Fresh processes per mode')
+        parser.add_argument('--host', default=None, help='Host header (default: first ALLOWED_HOSTS entry)')
+
+    def handle(self, *args, **options):
+        host = options['host'] or next(
+            (host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost'
+        )
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING(
+                'DEBUG is on, so templates are not cached and warm-up cannot help requests'
+            ))
+
+        for mode in ('cold', 'warm'):
+            runs = [self.probe(mode, host, options['paths']) for _ in range(options['runs'])]
+            self.stdout.write(self.style.SUCCESS(f'{mode} start ({len(runs)} runs, median)'))
+            for key in runs[0]:
+                if key.startswith('status '):
+                    continue
+                median = statistics.median(run[key] for run in runs)
+                self.stdout.write(f'  {key:<32} {median * 1000:>9.1f} ms')
+            statuses = {run[key] for run in runs for key in run if key.startswith('status ')}
+            if any(not status.startswith(('2', '3')) for status in statuses):
+                self.stdout.write(self.style.WARNING(f"  responses: {', '.join(sorted(statuses))}"))
+
+    def probe(self, mode, host, paths):
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, mode, host, *paths],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f'Startup probe failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
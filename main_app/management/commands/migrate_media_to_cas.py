@@ -0,0 +1,72 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main_app.models import Memorial, Memory
+from main_app.storage import PREFIX, ContentAddressedStorage
+
+FIELDS = [
+    (Memorial, 'cover_image'),
+    (Memory, 'image'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Move uploads stored under their original names into content-addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of rows to load per query'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many files would be moved'
+        )
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Leave the original files in place after moving'
+        )
+
+    def handle(self, *args, **options):
+        for model, field_name in FIELDS:
+            field = model._meta.get_field(field_name)
+            storage = field.storage
+            if not isinstance(storage, ContentAddressedStorage):
+                self.stderr.write(f'{model.__name__}.{field_name} does not use ContentAddressedStorage, skipped')
+                continue
+
+            rows = model._base_manager.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True}) \
+                .exclude(**{f'{field_name}__startswith': PREFIX}).order_by('pk')
+            moved = missing = 0
+            originals = set()
+            last_pk = 0
+            while True:
+                batch = list(rows.filter(pk__gt=last_pk).values_list('pk', field_name)[:options['batch_size']])
+                if not batch:
+                    break
+                for pk, name in batch:
+                    if not storage.exists(name):
+                        self.stderr.write(f'Missing file for {model.__name__} {pk}: {name}')
+                        missing += 1
+                        continue
+                    if options['dry_run']:
+                        moved += 1
+                        continue
+                    with transaction.atomic():
+                        with storage.open(name) as original:
+                            new_name = storage.save(os.path.basename(name), original)
+                        # update() leaves updated_at alone and sends no save signals
+                        model._base_manager.filter(pk=pk).update(**{field_name: new_name})
+                    originals.add(name)
+                    moved += 1
+                last_pk = batch[-1][0]
+
+            if not options['keep_originals'] and not options['dry_run']:
+                for name in originals:
+                    storage.delete(name)
+            verb = 'Would move' if options['dry_run'] else 'Moved'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {moved} {model.__name__}.{field_name} file(s), {missing} missing'
+            ))
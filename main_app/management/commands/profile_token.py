@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from main_app.profiling import HEADER, QUERY_PARAM, make_token
+
+
+class Command(BaseCommand):
+    help = 'Issue a signed token that turns on profiling for the requests carrying it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Staff user the profiles are recorded for')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'], is_staff=True, is_active=True)
+        except User.DoesNotExist:
+            raise CommandError(f"No active staff user named '{options['username']}'")
+
+        token = make_token(user)
+        header = HEADER[len('HTTP_'):].replace('_', '-').title()
+        hours = settings.PROFILING_TOKEN_MAX_AGE / 3600
+        self.stdout.write(token)
+        self.stderr.write(
+            f'Valid for {hours:g} hours. Send it as the {header} header, or append '
+            f'?{QUERY_PARAM}=<token> to a URL. Results appear under Profile records in the admin.'
+        )
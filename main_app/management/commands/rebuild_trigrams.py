@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main_app.fuzzy import index_memorials
+from main_app.models import Memorial
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the trigram index used by fuzzy memorial name search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=2000,
+            help='Number of memorials to reindex per transaction'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        memorials = Memorial.objects.only('pk', 'name').order_by('pk')
+        indexed = trigrams = 0
+        last_pk = 0
+        while True:
+            batch = list(memorials.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            trigrams += index_memorials(batch)
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(f'Indexed {trigrams} trigram(s) for {indexed} memorial(s)'))
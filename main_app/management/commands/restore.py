@@ -0,0 +1,103 @@
+import time
+from itertools import islice
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+
+from main_app.activity import add_memories, invalidate_feed
+from main_app.backup import preserved_timestamps, read_instances, read_manifest, recount_blobs
+from main_app.models import Activity, Memorial, Memory
+from main_app.signals import batch_changes, send_memorials_changed
+
+
+class Command(BaseCommand):
+    help = 'Load a backup written by the backup command, overwriting rows that already exist'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory holding manifest.json and the .jsonl.gz files')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of rows per INSERT'
+        )
+        parser.add_argument(
+            '--transaction-size', type=int, default=20000,
+            help='Number of rows to commit at a time'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            manifest = read_manifest(options['directory'])
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read the backup manifest: {exc}')
+
+        models = [apps.get_model(entry['model']) for entry in manifest['models']]
+        # Backups from before the feed was backed up rebuild it from memories
+        self.rebuild_feed = Activity not in models
+        total = 0
+        began = time.monotonic()
+        # Like loaddata, check foreign keys once at the end instead of per row,
+        # so a chunk may refer to rows from a later one
+        with connection.constraint_checks_disabled():
+            for entry in manifest['models']:
+                start = time.monotonic()
+                count = self.restore_model(options['directory'], entry,
+                                           options['batch_size'], options['transaction_size'])
+                elapsed = time.monotonic() - start
+                total += count
+                self.stdout.write(f"{entry['model']}: {count} row(s) in {elapsed:.1f}s "
+                                  f"({count / max(elapsed, 1e-6):.0f} rows/s)")
+        try:
+            connection.check_constraints(table_names=[model._meta.db_table for model in models])
+        except IntegrityError as exc:
+            raise CommandError(f'The restored data has broken foreign keys: {exc}')
+
+        # Explicit ids leave PostgreSQL sequences behind the data
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        elapsed = time.monotonic() - began
+        self.stdout.write(self.style.SUCCESS(
+            f"Restored {total} row(s) in {elapsed:.1f}s ({total / max(elapsed, 1e-6):.0f} rows/s) "
+            f"from {options['directory']}"
+        ))
+
+    def restore_model(self, directory, entry, batch_size, transaction_size):
+        model = apps.get_model(entry['model'])
+        update_fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+        instances = read_instances(directory, entry)
+        count = 0
+        while True:
+            chunk = list(islice(instances, transaction_size))
+            if not chunk:
+                return count
+            # Caches are told about the chunk once it has committed
+            with batch_changes(), transaction.atomic(), preserved_timestamps(model):
+                model._base_manager.bulk_create(
+                    chunk, batch_size=batch_size, update_conflicts=True,
+                    unique_fields=[model._meta.pk.name], update_fields=update_fields,
+                )
+                self.rebuild_derived(model, chunk)
+            count += len(chunk)
+
+    def rebuild_derived(self, model, chunk):
+        """
+        Update what save() and the storage would have: trigrams, caches, file references and the activity feed
+        """
+        if model is Memorial:
+            # Unknown fields, so every receiver refreshes, trigrams and name suffixes included
+            send_memorials_changed([memorial.pk for memorial in chunk])
+            recount_blobs(memorial.cover_image.name for memorial in chunk)
+        elif model is Memory:
+            # No memorial column changed, but cards show memory counts
+            send_memorials_changed({memory.memorial_id for memory in chunk}, set())
+            recount_blobs(memory.image.name for memory in chunk)
+            if self.rebuild_feed:
+                restored = Memory.objects.filter(pk__in=[memory.pk for memory in chunk])
+                add_memories(restored.select_related('memorial', 'author'))
+        elif model is Activity:
+            invalidate_feed()
@@ -0,0 +1,109 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main_app import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs stored in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=None,
+            help='Number of jobs to run at the same time (default: JOBS_CONCURRENCY)'
+        )
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='Run jobs in a thread pool or a process pool'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=1.0,
+            help='Seconds to wait between polls when the queue is empty'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Exit once no due jobs are left instead of polling forever'
+        )
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency'] or settings.JOBS_CONCURRENCY
+        self.poll_interval = options['poll_interval']
+        self.burst = options['burst']
+        self.stopping = False
+
+        signal.signal(signal.SIGTERM, self.request_stop)
+        self.stdout.write(self.style.SUCCESS(
+            f"Worker started with concurrency {concurrency} ({options['pool']} pool)"
+        ))
+
+        if concurrency == 1:
+            processed = self.run_inline()
+        else:
+            processed = self.run_pool(concurrency, options['pool'])
+
+        self.stdout.write(self.style.SUCCESS(f'Worker stopped after {processed} job(s)'))
+
+    def request_stop(self, signum, frame):
+        self.stdout.write('Finishing running jobs before stopping...')
+        self.stopping = True
+
+    def run_inline(self):
+        processed = 0
+        try:
+            while not self.stopping:
+                jobs.requeue_stale()
+                claimed = jobs.claim_jobs(limit=1)
+                if not claimed:
+                    if self.burst:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                jobs.run_job(claimed[0])
+                processed += 1
+        except KeyboardInterrupt:
+            pass
+        return processed
+
+    def run_pool(self, concurrency, pool):
+        if pool == 'process':
+            # Children are forked, so they must not inherit open connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('fork'),
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency)
+
+        processed = 0
+        inflight = set()
+        try:
+            with executor:
+                while True:
+                    if not self.stopping:
+                        jobs.requeue_stale()
+                        free = concurrency - len(inflight)
+                        claimed = jobs.claim_jobs(limit=free) if free else []
+                        for job in claimed:
+                            inflight.add(executor.submit(jobs.run_job_by_pk, job.pk))
+
+                    if not inflight:
+                        if self.stopping or self.burst:
+                            break
+                        time.sleep(self.poll_interval)
+                        continue
+
+                    done, inflight = wait(inflight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        processed += 1
+                        if future.exception() is not None:
+                            self.stderr.write(f'Worker error: {future.exception()}')
+        except KeyboardInterrupt:
+            self.stopping = True
+        return processed
@@ -0,0 +1,370 @@
+"""
+Prometheus metrics shared across worker processes.
+
+Each process keeps its counters and histograms in memory, and a background
+thread writes them every METRICS_FLUSH_INTERVAL, when they have changed, to
+the process's own JSON file in METRICS_DIR. The /metrics view adds up every file, so gunicorn workers
+report one combined set of series. Files left by workers that have exited
+are folded into an archive file, so counters never go backwards when
+workers are recycled.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+try:
+    import fcntl
+except ImportError:  # Windows: dead worker files are kept instead of compacted
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# name: (type, help)
+METRICS = {
+    'memorialbridge_requests_total': ('counter', 'HTTP requests by URL name, method and status'),
+    'memorialbridge_request_duration_seconds': ('histogram', 'Time spent handling a request'),
+    'memorialbridge_db_queries_total': ('counter', 'Database queries run while handling requests'),
+    'memorialbridge_db_query_duration_seconds_total': ('counter', 'Time spent in database queries'),
+    'memorialbridge_cache_requests_total': ('counter', 'Cache lookups by result (hit or miss)'),
+    'memorialbridge_contributions_total': ('counter', 'Donations and trees planted'),
+    'memorialbridge_memories_created_total': ('counter', 'Memories added, by type'),
+}
+
+ARCHIVE_NAME = 'archive.json'
+
+
+class Registry:
+    """
+    Metric values of the current process
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.file_name = f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+        self.dirty = False
+        self.flusher_pid = None
+
+    def _changed(self):
+        self.dirty = True
+        # Threads do not survive fork(), so each process starts its own flusher
+        if self.flusher_pid != os.getpid():
+            self.flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        pid = os.getpid()
+        while self.flusher_pid == pid:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            if self.dirty:
+                try:
+                    self.flush()
+                except OSError:
+                    pass
+
+    def inc(self, name, labels, amount=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+            self._changed()
+
+    def observe(self, name, labels, value, buckets=DEFAULT_BUCKETS):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._changed()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                                    'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), dict(histogram, counts=list(histogram['counts']))]
+                               for (name, labels), histogram in self.histograms.items()],
+            }
+
+    def flush(self):
+        """
+        Write this process's values to its file in METRICS_DIR
+        """
+        if not self.counters and not self.histograms:
+            return
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.file_name)
+        temporary = f'{path}.tmp'
+        with self.flush_lock:
+            with open(temporary, 'w') as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(temporary, path)
+
+
+registry = Registry()
+# A forked worker must not report the values, or overwrite the file, of its parent
+os.register_at_fork(after_in_child=registry.reset)
+atexit.register(lambda: registry.flush() if registry.dirty else None)
+
+
+def inc(name, amount=1, **labels):
+    if settings.METRICS_ENABLED:
+        registry.inc(name, labels, amount)
+
+
+def observe(name, value, **labels):
+    if settings.METRICS_ENABLED:
+        registry.observe(name, labels, value)
+
+
+def reset_store():
+    """
+    Remove every stored value, for a server (re)start
+    """
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, '*.json')):
+        os.remove(path)
+
+
+def _merge(totals, data):
+    counters, histograms = totals
+    for name, labels, value in data['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, histogram in data['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        merged = histograms.get(key)
+        if merged is None:
+            histograms[key] = dict(histogram, counts=list(histogram['counts']))
+        else:
+            merged['counts'] = [a + b for a, b in zip(merged['counts'], histogram['counts'])]
+            merged['sum'] += histogram['sum']
+            merged['count'] += histogram['count']
+
+
+def _as_data(totals):
+    counters, histograms = totals
+    return {
+        'counters': [[name, labels, value] for (name, labels), value in counters.items()],
+        'histograms': [[name, labels, histogram] for (name, labels), histogram in histograms.items()],
+    }
+
+
+def _read(path):
+    try:
+        with open(path) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _store_lock(directory):
+    with open(os.path.join(directory, '.lock'), 'w') as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _compact(directory):
+    """
+    Fold the files of exited processes into the archive file
+    """
+    with _store_lock(directory):
+        archive_path = os.path.join(directory, ARCHIVE_NAME)
+        dead = [
+            path for path in glob.glob(os.path.join(directory, '*-*.json'))
+            if not _is_alive(int(os.path.basename(path).split('-', 1)[0]))
+        ]
+        if not dead:
+            return
+        totals = ({}, {})
+        for path in [archive_path, *dead]:
+            data = _read(path)
+            if data:
+                _merge(totals, data)
+        temporary = f'{archive_path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(_as_data(totals), handle)
+        os.replace(temporary, archive_path)
+        for path in dead:
+            os.remove(path)
+
+
+def collect():
+    """
+    Add up the values of every process, returning (counters, histograms)
+    """
+    registry.flush()
+    directory = settings.METRICS_DIR
+    totals = ({}, {})
+    if not os.path.isdir(directory):
+        return totals
+    if fcntl is not None:
+        _compact(directory)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        data = _read(path)
+        if data:
+            _merge(totals, data)
+    return totals
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def render(totals):
+    """
+    Format aggregated values in the Prometheus text exposition format
+    """
+    counters, histograms = totals
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+        else:
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(histogram['buckets'], histogram['counts']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, [("le", repr(float(bound)))])} {cumulative}')
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+                lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+
+    # Derived here so dashboards without PromQL can still show it
+    lines.append('# HELP memorialbridge_cache_hit_ratio Share of cache lookups that were hits')
+    lines.append('# TYPE memorialbridge_cache_hit_ratio gauge')
+    lookups = {}
+    for (metric, labels), value in counters.items():
+        if metric == 'memorialbridge_cache_requests_total':
+            labels = dict(labels)
+            hits, total = lookups.get(labels['cache'], (0, 0))
+            lookups[labels['cache']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    for cache_name, (hits, total) in sorted(lookups.items()):
+        lines.append(f'memorialbridge_cache_hit_ratio{_format_labels([("cache", cache_name)])} {hits / total if total else 0}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, open to staff and to requests carrying METRICS_TOKEN
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    authorized = (token and constant_time_compare(authorization, f'Bearer {token}')) or (
+        request.user.is_authenticated and request.user.is_staff
+    )
+    if not authorized:
+        return HttpResponseForbidden('Metrics require a staff login or a bearer token')
+    return HttpResponse(render(collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class MetricsMiddleware:
+    """
+    Time every request and count the database queries it runs
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        queries = {'count': 0, 'seconds': 0.0}
+
+        def count_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries['count'] += 1
+                queries['seconds'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match is not None else 'unresolved'
+        registry.inc('memorialbridge_requests_total',
+                     {'view': view, 'method': request.method, 'status': str(response.status_code)})
+        registry.observe('memorialbridge_request_duration_seconds', {'view': view}, duration)
+        registry.inc('memorialbridge_db_queries_total', {'view': view}, queries['count'])
+        registry.inc('memorialbridge_db_query_duration_seconds_total', {'view': view}, queries['seconds'])
+        return response
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """
+    LocMemCache that counts hits and misses, labelled with its LOCATION
+
+    get_many() and get_or_set() go through get(), so they are counted too.
+    """
+    _missing = object()
+
+    def __init__(self, name, params):
+        super().__init__(name, params)
+        self.metrics_name = name or 'default'
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self._missing, version)
+        hit = value is not self._missing
+        inc('memorialbridge_cache_requests_total', cache=self.metrics_name, result='hit' if hit else 'miss')
+        return value if hit else default
+
+
+@receiver(post_save, sender='main_app.Memory')
+def count_memory(sender, instance, created, **kwargs):
+    if created:
+        inc('memorialbridge_memories_created_total', type=instance.type)
@@ -0,0 +1,55 @@
+# Generated by Django 5.2 on 2026-10-19 04:39
+
+import re
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize_name(value):
+    # Copy of main_app.search.normalize_name when this migration was written,
+    # so the backfill keeps doing the same thing if the search helper changes
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', value.lower()).strip()
+
+
+def backfill_search_name(apps, schema_editor):
+    Memorial = apps.get_model('main_app', 'Memorial')
+    batch = []
+    for memorial in Memorial.objects.only('id', 'name').iterator(chunk_size=2000):
+        memorial.search_name = normalize_name(memorial.name)
+        batch.append(memorial)
+        if len(batch) >= 2000:
+            Memorial.objects.bulk_update(batch, ['search_name'])
+            batch = []
+    if batch:
+        Memorial.objects.bulk_update(batch, ['search_name'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0002_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorial',
+            name='search_name',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='Normalized name used for indexed searches', max_length=200),
+        ),
+        migrations.RunPython(backfill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(fields=['created_at'], name='memorial_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memory',
+            index=models.Index(fields=['created_at'], name='memory_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-19 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0003_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(condition=models.Q(('visibility', 'public')), fields=['search_name'], name='memorial_public_name_idx'),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-19 04:44
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# The key and trigram helpers of main_app.search as they were when this
+# migration was written, so editing the live ones cannot change the backfill
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_REPEATED = re.compile(r'(.)\1+')
+_PHONETIC_RULES = [
+    ('ee', 'i'),
+    ('oo', 'u'),
+    ('ou', 'u'),
+    ('o', 'u'),
+    ('e', 'a'),
+    ('w', 'v'),
+    ('ph', 'f'),
+]
+
+
+def phonetic_key(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    value = _NON_ALNUM.sub(' ', value.lower()).strip()
+    for old, new in _PHONETIC_RULES:
+        value = value.replace(old, new)
+    return _REPEATED.sub(r'\1', value)
+
+
+def trigrams(value):
+    grams = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def backfill_trigrams(apps, schema_editor):
+    Memorial = apps.get_model('main_app', 'Memorial')
+    MemorialTrigram = apps.get_model('main_app', 'MemorialTrigram')
+    batch = []
+    for memorial in Memorial.objects.only('id', 'name').iterator(chunk_size=2000):
+        batch.extend(
+            MemorialTrigram(memorial_id=memorial.pk, trigram=gram)
+            for gram in trigrams(phonetic_key(memorial.name))
+        )
+        if len(batch) >= 5000:
+            MemorialTrigram.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        MemorialTrigram.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0004_memorial_public_name_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemorialTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('memorial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='main_app.memorial')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigram', 'memorial'), name='unique_memorial_trigram')],
+            },
+        ),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-19 05:09
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def make_bio_excerpt(bio):
+    # main_app.models.make_bio_excerpt (40 words) at the time of this migration
+    return Truncator(Truncator(bio or '').words(40, truncate=' …')).chars(1000)
+
+
+def backfill_bio_excerpt(apps, schema_editor):
+    Memorial = apps.get_model('main_app', 'Memorial')
+    batch = []
+    for memorial in Memorial.objects.only('id', 'bio').iterator(chunk_size=2000):
+        memorial.bio_excerpt = make_bio_excerpt(memorial.bio)
+        batch.append(memorial)
+        if len(batch) >= 2000:
+            Memorial.objects.bulk_update(batch, ['bio_excerpt'])
+            batch = []
+    if batch:
+        Memorial.objects.bulk_update(batch, ['bio_excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0005_memorial_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorial',
+            name='bio_excerpt',
+            field=models.CharField(blank=True, editable=False, help_text='Start of the bio shown on memorial cards', max_length=1000),
+        ),
+        migrations.RunPython(backfill_bio_excerpt, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2 on 2026-10-19 05:22
+
+import re
+from urllib.parse import parse_qs, urlsplit
+
+from django.db import migrations, models
+
+# main_app.video.parse_video_url as it was when this migration was written,
+# kept here so later changes to the live parser do not alter the backfill
+_YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+_YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_PATH = re.compile(r'^/(?:embed|shorts|live|v)/([^/?#]+)')
+_VIMEO_HOSTS = {'vimeo.com', 'player.vimeo.com'}
+_VIMEO_ID = re.compile(r'^/(?:video/|channels/[^/]+/|groups/[^/]+/videos/)?(\d+)(?:/|$)')
+
+
+def parse_video_url(url):
+    try:
+        parts = urlsplit((url or '').strip())
+    except ValueError:
+        return '', ''
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    if host == 'youtu.be':
+        candidate = parts.path.lstrip('/').split('/')[0]
+    elif host in _YOUTUBE_HOSTS:
+        match = _YOUTUBE_PATH.match(parts.path)
+        candidate = match.group(1) if match else parse_qs(parts.query).get('v', [''])[0]
+    elif host in _VIMEO_HOSTS:
+        match = _VIMEO_ID.match(parts.path)
+        return ('vimeo', match.group(1)) if match else ('', '')
+    else:
+        return '', ''
+    return ('youtube', candidate) if _YOUTUBE_ID.match(candidate) else ('', '')
+
+
+def backfill_video_ids(apps, schema_editor):
+    Memory = apps.get_model('main_app', 'Memory')
+    batch = []
+    for memory in Memory.objects.exclude(video_url='').only('id', 'video_url').iterator(chunk_size=2000):
+        memory.video_provider, memory.video_id = parse_video_url(memory.video_url)
+        batch.append(memory)
+        if len(batch) >= 2000:
+            Memory.objects.bulk_update(batch, ['video_provider', 'video_id'])
+            batch = []
+    if batch:
+        Memory.objects.bulk_update(batch, ['video_provider', 'video_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0007_profilerecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memory',
+            name='video_id',
+            field=models.CharField(blank=True, editable=False, help_text="Provider's id of the video, used to build the embed", max_length=64),
+        ),
+        migrations.AddField(
+            model_name='memory',
+            name='video_provider',
+            field=models.CharField(blank=True, choices=[('youtube', 'YouTube'), ('vimeo', 'Vimeo')], editable=False, help_text='Provider recognized in the video URL', max_length=20),
+        ),
+        migrations.RunPython(backfill_video_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2 on 2026-10-19 05:30
+
+from django.db import migrations, models
+
+
+def month_day(value):
+    # Same encoding as main_app.models.month_day had here: 19 October is 1019
+    return value.month * 100 + value.day if value else None
+
+
+def backfill_month_day(apps, schema_editor):
+    Memorial = apps.get_model('main_app', 'Memorial')
+    batch = []
+    memorials = Memorial.objects.filter(models.Q(dob__isnull=False) | models.Q(dod__isnull=False))
+    for memorial in memorials.only('id', 'dob', 'dod').iterator(chunk_size=2000):
+        memorial.dob_md = month_day(memorial.dob)
+        memorial.dod_md = month_day(memorial.dod)
+        batch.append(memorial)
+        if len(batch) >= 2000:
+            Memorial.objects.bulk_update(batch, ['dob_md', 'dod_md'])
+            batch = []
+    if batch:
+        Memorial.objects.bulk_update(batch, ['dob_md', 'dod_md'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0009_mediablob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorial',
+            name='dob_md',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text='Month and day of birth as MMDD, for anniversaries', null=True),
+        ),
+        migrations.AddField(
+            model_name='memorial',
+            name='dod_md',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, help_text='Month and day of passing as MMDD, for anniversaries', null=True),
+        ),
+        migrations.RunPython(backfill_month_day, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(condition=models.Q(('visibility', 'public')), fields=['dob_md'], name='memorial_public_dob_md_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memorial',
+            index=models.Index(condition=models.Q(('visibility', 'public')), fields=['dod_md'], name='memorial_public_dod_md_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2 on 2026-10-19 05:48
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_memories(apps, schema_editor):
+    # Oldest first, so ids follow creation time as they do for new entries
+    Activity = apps.get_model('main_app', 'Activity')
+    Memory = apps.get_model('main_app', 'Memory')
+    memories = Memory.objects.select_related('memorial', 'author').order_by('created_at', 'id')
+    batch = []
+    for memory in memories.iterator(chunk_size=2000):
+        batch.append(Activity(
+            kind='memory', memorial_id=memory.memorial_id, memory_id=memory.pk, actor_id=memory.author_id,
+            memorial_name=memory.memorial.name, memorial_slug=memory.memorial.slug,
+            actor_name=memory.author.username, summary=Truncator(memory.content).chars(200),
+            public=memory.memorial.visibility == 'public', created_at=memory.created_at,
+        ))
+        if len(batch) >= 2000:
+            Activity.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Activity.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0010_memorial_month_day'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Activity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('memory', 'Memory'), ('donation', 'Donation'), ('tree', 'Tree planted')], max_length=10)),
+                ('memorial_name', models.CharField(max_length=200)),
+                ('memorial_slug', models.SlugField(db_index=False)),
+                ('actor_name', models.CharField(max_length=150)),
+                ('summary', models.CharField(blank=True, help_text="Start of the memory's text", max_length=200)),
+                ('public', models.BooleanField(default=True, help_text='Whether the memorial is public')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to=settings.AUTH_USER_MODEL)),
+                ('memorial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='main_app.memorial')),
+                ('memory', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='activities', to='main_app.memory')),
+            ],
+            options={
+                'verbose_name_plural': 'Activities',
+                'ordering': ['-id'],
+                'indexes': [models.Index(condition=models.Q(('public', True)), fields=['-id'], name='activity_public_feed_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_memories, migrations.RunPython.noop),
+    ]
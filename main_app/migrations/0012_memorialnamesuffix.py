@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-19 06:45
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# main_app.search.name_suffixes and normalize_name as they were when this
+# migration was written
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def name_suffixes(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    words = _NON_ALNUM.sub(' ', value.lower()).split()
+    return [' '.join(words[index:]) for index in range(len(words))]
+
+
+def backfill_name_suffixes(apps, schema_editor):
+    Memorial = apps.get_model('main_app', 'Memorial')
+    MemorialNameSuffix = apps.get_model('main_app', 'MemorialNameSuffix')
+    batch = []
+    for memorial in Memorial.objects.only('id', 'name').iterator(chunk_size=2000):
+        batch.extend(
+            MemorialNameSuffix(memorial_id=memorial.pk, suffix=suffix)
+            for suffix in name_suffixes(memorial.name)
+        )
+        if len(batch) >= 5000:
+            MemorialNameSuffix.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        MemorialNameSuffix.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main_app', '0011_activity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemorialNameSuffix',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('suffix', models.CharField(max_length=200)),
+                ('memorial', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_suffixes', to='main_app.memorial')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['suffix'], name='memorial_name_suffix_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_name_suffixes, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,30 @@
 from django.db import models
 from django.contrib.auth.models import User
-from django.utils.text import slugify
+from django.utils.text import Truncator, slugify
 from django.urls import reverse
+from django.utils import timezone
+
+from .search import normalize_name
+from . import video
+
+
+# Listings show at most this many words of a memorial's bio
+BIO_EXCERPT_WORDS = 40
+
+
+def make_bio_excerpt(bio):
+    """
+    Shorten a bio the way ``truncatewords`` does, so listings can truncate
+    the stored excerpt further and get the same text as from the full bio
+    """
+    return Truncator(Truncator(bio or '').words(BIO_EXCERPT_WORDS, truncate=' …')).chars(1000)
+
+
+def month_day(value):
+    """
+    Month and day of a date as one number, 19 October giving 1019
+    """
+    return value.month * 100 + value.day if value else None
 
 
 class UserProfile(models.Model):
@@ -26,10 +49,18 @@ class Memorial(models.Model):
     
     owner = models.ForeignKey(UserProfile, on_delete=models.CASCADE, related_name='memorials')
     name = models.CharField(max_length=200)
+    search_name = models.CharField(max_length=200, blank=True, editable=False, db_index=True,
+                                   help_text="Normalized name used for indexed searches")
     slug = models.SlugField(unique=True, blank=True)
     dob = models.DateField(null=True, blank=True, verbose_name="Date of Birth")
     dod = models.DateField(null=True, blank=True, verbose_name="Date of Passing")
+    dob_md = models.PositiveSmallIntegerField(null=True, blank=True, editable=False,
+                                              help_text="Month and day of birth as MMDD, for anniversaries")
+    dod_md = models.PositiveSmallIntegerField(null=True, blank=True, editable=False,
+                                              help_text="Month and day of passing as MMDD, for anniversaries")
     bio = models.TextField(blank=True, help_text="Biography or description")
+    bio_excerpt = models.CharField(max_length=1000, blank=True, editable=False,
+                                   help_text="Start of the bio shown on memorial cards")
     cover_image = models.ImageField(upload_to='memorial_covers/', blank=True, null=True)
     visibility = models.CharField(max_length=10, choices=VISIBILITY_CHOICES, default='public')
     donations_count = models.IntegerField(default=0)
@@ -39,8 +70,41 @@ class Memorial(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='memorial_created_at_idx'),
+            models.Index(fields=['search_name'], condition=models.Q(visibility='public'),
+                         name='memorial_public_name_idx'),
+            models.Index(fields=['dob_md'], condition=models.Q(visibility='public'),
+                         name='memorial_public_dob_md_idx'),
+            models.Index(fields=['dod_md'], condition=models.Q(visibility='public'),
+                         name='memorial_public_dod_md_idx'),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def changed_fields(self):
+        """
+        Names of fields that differ from the values loaded from the database,
+        or None for a memorial that was not loaded from the database
+        """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and loaded[field.attname] != getattr(self, field.attname)
+        }
     
     def save(self, *args, **kwargs):
+        self.search_name = normalize_name(self.name)
+        self.bio_excerpt = make_bio_excerpt(self.bio)
+        # to_python() also accepts dates given as 'YYYY-MM-DD' strings
+        self.dob_md = month_day(self._meta.get_field('dob').to_python(self.dob))
+        self.dod_md = month_day(self._meta.get_field('dod').to_python(self.dod))
         if not self.slug:
             self.slug = slugify(self.name)
             # Ensure unique slug
@@ -50,6 +114,11 @@ class Memorial(models.Model):
                 self.slug = f"{original_slug}-{counter}"
                 counter += 1
         super().save(*args, **kwargs)
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname not in self.get_deferred_fields()
+        }
     
     def get_absolute_url(self):
         return reverse('memorial_detail', kwargs={'slug': self.slug})
@@ -61,6 +130,39 @@ class Memorial(models.Model):
         return self.name
 
 
+class MemorialTrigram(models.Model):
+    """
+    Trigram of a memorial's phonetic name key, used for fuzzy name search
+    """
+    memorial = models.ForeignKey(Memorial, on_delete=models.CASCADE, related_name='trigrams')
+    trigram = models.CharField(max_length=3)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['trigram', 'memorial'], name='unique_memorial_trigram'),
+        ]
+    
+    def __str__(self):
+        return f"{self.trigram!r} of {self.memorial_id}"
+
+
+class MemorialNameSuffix(models.Model):
+    """
+    Normalized memorial name from one of its words to the end, so typeahead
+    can match the start of any word with an index range scan
+    """
+    memorial = models.ForeignKey(Memorial, on_delete=models.CASCADE, related_name='name_suffixes')
+    suffix = models.CharField(max_length=200)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['suffix'], name='memorial_name_suffix_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.suffix!r} of {self.memorial_id}"
+
+
 class Memory(models.Model):
     """
     User-contributed memories for memorials
@@ -77,11 +179,138 @@ class Memory(models.Model):
     content = models.TextField(blank=True, help_text="Text content for text memories")
     image = models.ImageField(upload_to='memory_images/', blank=True, null=True)
     video_url = models.URLField(blank=True, help_text="YouTube or other video URL")
+    video_provider = models.CharField(max_length=20, choices=video.PROVIDER_CHOICES, blank=True, editable=False,
+                                      help_text="Provider recognized in the video URL")
+    video_id = models.CharField(max_length=64, blank=True, editable=False,
+                                help_text="Provider's id of the video, used to build the embed")
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Memories'
+        indexes = [
+            models.Index(fields=['created_at'], name='memory_created_at_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        self.video_provider, self.video_id = video.parse_video_url(self.video_url)
+        super().save(*args, **kwargs)
+    
+    @property
+    def video_embed_url(self):
+        return video.embed_url(self.video_provider, self.video_id)
+    
+    @property
+    def video_thumbnail_url(self):
+        return video.thumbnail_url(self.video_provider, self.video_id)
     
     def __str__(self):
         return f"{self.get_type_display()} by {self.author.username} for {self.memorial.name}"
+
+
+class Job(models.Model):
+    """
+    Background job stored in the database and executed by the run_worker command
+    """
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    task = models.CharField(max_length=200, help_text="Dotted path of the task function")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['run_at']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} ({self.get_status_display()})"
+
+
+class ProfileRecord(models.Model):
+    """
+    cProfile and SQL timings of one request profiled on demand by staff
+    """
+    path = models.CharField(max_length=500)
+    method = models.CharField(max_length=10)
+    view_name = models.CharField(max_length=200, blank=True)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                             help_text="Staff member the profiling token was issued to")
+    duration_ms = models.FloatField()
+    sql_count = models.PositiveIntegerField(default=0)
+    sql_time_ms = models.FloatField(default=0)
+    queries = models.JSONField(default=list, blank=True, help_text="SQL statements with their time in ms")
+    stats = models.TextField(blank=True, help_text="cProfile output sorted by cumulative time")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class MediaBlob(models.Model):
+    """
+    File in content-addressed storage, with the number of fields referring to it
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.PositiveBigIntegerField(default=0)
+    refs = models.PositiveIntegerField(default=0, help_text="Model fields currently storing this file")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refs} reference{'s' if self.refs != 1 else ''})"
+
+
+class Activity(models.Model):
+    """
+    Entry in the site-wide recent activity feed, copied from the memory or
+    contribution it records so the feed is read without joins
+    """
+    KIND_CHOICES = [
+        ('memory', 'Memory'),
+        ('donation', 'Donation'),
+        ('tree', 'Tree planted'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    memorial = models.ForeignKey(Memorial, on_delete=models.CASCADE, related_name='activities')
+    memory = models.ForeignKey(Memory, on_delete=models.CASCADE, null=True, blank=True, related_name='activities')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    memorial_name = models.CharField(max_length=200)
+    memorial_slug = models.SlugField(db_index=False)
+    actor_name = models.CharField(max_length=150)
+    summary = models.CharField(max_length=200, blank=True, help_text="Start of the memory's text")
+    public = models.BooleanField(default=True, help_text="Whether the memorial is public")
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # Rows are only ever appended, so id order is time order
+        ordering = ['-id']
+        verbose_name_plural = 'Activities'
+        indexes = [
+            models.Index(fields=['-id'], condition=models.Q(public=True), name='activity_public_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} by {self.actor_name} for {self.memorial_name}"
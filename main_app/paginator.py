@@ -0,0 +1,50 @@
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+def estimate_row_count(model, using='default'):
+    """
+    Return the database's estimate of a table's size without scanning it
+
+    Falls back to the highest primary key, which overestimates only by the
+    number of deleted rows. Returns None when no estimate is available.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+                row = cursor.fetchone()
+                if row and row[0] > 0:
+                    return row[0]
+            elif connection.vendor == 'sqlite':
+                # sqlite_stat1 only exists once ANALYZE has been run
+                cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+                row = cursor.fetchone()
+                if row and row[0]:
+                    return int(row[0].split()[0])
+    except DatabaseError:
+        pass
+    return model._default_manager.using(using).aggregate(highest=Max('pk'))['highest']
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that skips COUNT(*) on large unfiltered tables
+
+    Filtered or searched querysets still get an exact count, since those are
+    narrowed by indexes and the page links must stay accurate.
+    """
+    exact_count_threshold = 10000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_row_count(self.object_list.model, self.object_list.db)
+            if estimate and estimate > self.exact_count_threshold:
+                return estimate
+        return super().count
@@ -0,0 +1,125 @@
+"""
+On-demand profiling of single requests.
+
+Staff get a signed token from the profile_token command and send it as the
+``_profile`` query parameter or the ``X-Profile-Token`` header. The request
+then runs under cProfile with every SQL query timed, and the result is
+saved as a ProfileRecord for browsing in the admin. Requests without a
+token only pay for two string lookups.
+"""
+import cProfile
+import io
+import pstats
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.db import connections
+
+from .models import ProfileRecord
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE_TOKEN'
+SALT = 'main_app.profiling'
+MAX_QUERIES = 500
+STATS_LINES = 80
+
+
+def make_token(user):
+    """
+    Signed profiling token for a staff user, valid for PROFILING_TOKEN_MAX_AGE seconds
+    """
+    return signing.dumps({'user': user.pk}, salt=SALT, compress=True)
+
+
+def token_user(token):
+    """
+    Return the active staff user a valid token was issued to, or None
+    """
+    try:
+        data = signing.loads(token, salt=SALT, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return None
+    return User.objects.filter(pk=data.get('user'), is_staff=True, is_active=True).first()
+
+
+def _request_token(request):
+    token = request.META.get(HEADER)
+    if token is None:
+        token = request.GET.get(QUERY_PARAM)
+    return token
+
+
+class ProfilingMiddleware:
+    """
+    Profile requests that carry a valid profiling token
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Cheap checks first, so unprofiled requests never parse or verify anything
+        if HEADER not in request.META and QUERY_PARAM not in request.META.get('QUERY_STRING', ''):
+            return self.get_response(request)
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        user = token_user(_request_token(request) or '')
+        if user is None:
+            return self.get_response(request)
+        return self.profile(request, user)
+
+    def profile(self, request, user):
+        queries = []
+        totals = {'count': 0, 'ms': 0.0}
+
+        def time_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                elapsed = (time.perf_counter() - start) * 1000
+                totals['count'] += 1
+                totals['ms'] += elapsed
+                if len(queries) < MAX_QUERIES:
+                    queries.append({'sql': sql, 'ms': round(elapsed, 3)})
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Only one profiler can run at a time in a process (Python 3.12+)
+            return self.get_response(request)
+        start = time.perf_counter()
+        with connections['default'].execute_wrapper(time_query):
+            try:
+                response = self.get_response(request)
+                # Lazy responses are rendered here, so template time is included
+                if hasattr(response, 'render') and callable(response.render):
+                    response.render()
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(STATS_LINES)
+        match = getattr(request, 'resolver_match', None)
+        # Keep the token out of the stored path
+        params = request.GET.copy()
+        params.pop(QUERY_PARAM, None)
+        path = request.path + (f'?{params.urlencode()}' if params else '')
+        record = ProfileRecord.objects.create(
+            path=path[:500],
+            method=request.method,
+            view_name=match.view_name if match is not None else '',
+            status_code=response.status_code,
+            user=user,
+            duration_ms=duration * 1000,
+            sql_count=totals['count'],
+            sql_time_ms=totals['ms'],
+            queries=queries,
+            stats=output.getvalue(),
+        )
+        response['X-Profile-Id'] = str(record.pk)
+        return response
@@ -0,0 +1,112 @@
+"""
+Token-bucket rate limiting backed by Django's cache framework.
+
+Buckets are tracked with the generic cell rate algorithm (GCRA), which is
+equivalent to a token bucket but needs a single integer per client: the
+"theoretical arrival time" of the next request. It is advanced with the
+cache's atomic ``incr``, so concurrent requests in different workers cannot
+both take the last token as long as the cache is shared between them.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import HttpResponse
+
+RATE_PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+
+def parse_rate(rate):
+    """
+    Turn a rate such as '20/m' into (requests, period in seconds)
+    """
+    count, _, period = rate.partition('/')
+    return int(count), RATE_PERIODS[period[-1]] * int(period[:-1] or 1)
+
+
+def client_key(request):
+    """
+    Identify the client by user id when logged in, otherwise by IP address
+
+    The user id is read from the session rather than ``request.user``, so
+    the user row is not loaded just to decide whether the request may
+    proceed. The session itself is still loaded (a database read with the
+    default backend), but it is kept on the request for the view to reuse.
+    Keying on the raw session cookie would avoid that read, but anyone
+    could dodge the limit by sending a new cookie with every request.
+    """
+    session = getattr(request, 'session', None)
+    user_id = session.get(SESSION_KEY) if session is not None else None
+    if user_id:
+        return f'user:{user_id}'
+    address = request.META.get(settings.RATELIMIT_IP_META_KEY, '')
+    return 'ip:' + address.split(',')[0].strip()
+
+
+def consume(scope, key, rate):
+    """
+    Take one token from the bucket and return (allowed, seconds until retry)
+    """
+    count, period = parse_rate(rate)
+    period_ms = period * 1000
+    interval = max(period_ms // count, 1)
+    now = int(time.time() * 1000)
+    cache_key = f'ratelimit:{scope}:{key}'
+    timeout = period * 10
+
+    if cache.add(cache_key, now + interval, timeout):
+        return True, 0
+    try:
+        tat = cache.incr(cache_key, interval)
+    except ValueError:
+        # The bucket expired between add() and incr()
+        cache.add(cache_key, now + interval, timeout)
+        return True, 0
+
+    if tat - interval < now:
+        # The bucket refilled completely while idle, so restart it from now
+        cache.incr(cache_key, now - (tat - interval))
+        cache.touch(cache_key, timeout)
+        return True, 0
+    if tat - now > period_ms:
+        # Give back the token so rejected requests do not extend the penalty
+        cache.decr(cache_key, interval)
+        return False, (tat - now - period_ms) / 1000
+    return True, 0
+
+
+def too_many_requests(retry_after):
+    response = HttpResponse(
+        "Too many requests. Please wait a moment and try again.",
+        status=429,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Retry-After'] = str(max(math.ceil(retry_after), 1))
+    return response
+
+
+def ratelimit(scope, rate, methods=('POST',)):
+    """
+    Limit how often one client may call a view
+
+    ``rate`` is the default for the scope and can be overridden through
+    ``settings.RATELIMIT_RATES``. Only requests using one of ``methods``
+    are counted; rejected requests get a 429 before the view runs.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(request, *args, **kwargs):
+            if settings.RATELIMIT_ENABLE and request.method in methods:
+                allowed, retry_after = consume(
+                    scope,
+                    client_key(request),
+                    settings.RATELIMIT_RATES.get(scope, rate),
+                )
+                if not allowed:
+                    return too_many_requests(retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapped_view
+    return decorator
@@ -0,0 +1,79 @@
+"""
+Helpers for index-friendly name searches.
+"""
+import re
+import unicodedata
+
+from django.db.models import Q
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_REPEATED = re.compile(r'(.)\1+')
+
+# Spelling variants common in romanized South Asian names, applied in order:
+# Noor/Nur, Jehan/Jahan, Nusret/Nusrat, Mohammed/Muhammad, Rafeeq/Rafiq
+_PHONETIC_RULES = [
+    ('ee', 'i'),
+    ('oo', 'u'),
+    ('ou', 'u'),
+    ('o', 'u'),
+    ('e', 'a'),
+    ('w', 'v'),
+    ('ph', 'f'),
+]
+
+# Highest code point, used as the upper bound of a prefix range
+PREFIX_END = '\U0010ffff'
+
+
+def normalize_name(value):
+    """
+    Lowercase, strip accents and collapse punctuation to single spaces
+
+    'Ustad Nusrat Fateh-Ali Khān' becomes 'ustad nusrat fateh ali khan'.
+    """
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return _NON_ALNUM.sub(' ', value.lower()).strip()
+
+
+def name_suffixes(value):
+    """
+    The normalized name from each of its words to the end
+
+    'Ustad Nusrat Khan' gives 'ustad nusrat khan', 'nusrat khan' and 'khan'.
+    """
+    words = normalize_name(value).split()
+    return [' '.join(words[index:]) for index in range(len(words))]
+
+
+def prefix_q(field, prefix):
+    """
+    Match values starting with ``prefix`` using a range that a B-tree index can serve
+
+    Unlike ``__startswith``, which becomes a LIKE pattern, a ``>= / <`` pair
+    is answered with an index range scan on every database backend.
+    """
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_END})
+
+
+def phonetic_key(value):
+    """
+    Fold transliteration variants so differently spelled names compare equal
+
+    Both 'Noor Jehan' and 'Nur Jahan' become 'nur jahan'.
+    """
+    value = normalize_name(value)
+    for old, new in _PHONETIC_RULES:
+        value = value.replace(old, new)
+    return _REPEATED.sub(r'\1', value)
+
+
+def trigrams(value):
+    """
+    Set of trigrams of each word, padded like PostgreSQL's pg_trgm
+    """
+    grams = set()
+    for word in value.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
@@ -0,0 +1,228 @@
+"""
+Open Graph images for shared memorial links.
+
+Each memorial gets a 1200x630 card with its name, dates, cover photo and
+the MemorialBridge logo, drawn with Pillow by a background job rather
+than when a link is shared. A card is stored under the SHA-256 of what it
+shows (``share_cards/<memorial id>/<hash>.jpg``), so the page can tell
+from the memorial alone which file it needs and whether it exists yet,
+without a column to keep up to date. Until the job has run, pages fall
+back to the cover photo or the site image.
+
+Changing the name, dates or cover queues a new card once the change has
+committed; the job then removes the memorial's older cards, and every
+card of a deleted memorial.
+"""
+import hashlib
+import io
+import os
+import shutil
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import dateformat
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from .jobs import background
+from .models import Memorial
+from .signals import memorials_changed
+
+DIRECTORY = 'share_cards'
+RELEVANT_FIELDS = {'name', 'dob', 'dod', 'cover_image'}
+CARD_FIELDS = ('pk', 'name', 'dob', 'dod', 'cover_image')
+# Bump when the layout changes, so every card is drawn again
+LAYOUT_VERSION = 1
+LOGO = 'img/logo.jpeg'
+
+WIDTH, HEIGHT = 1200, 630
+MARGIN = 60
+LOGO_SIZE = 96
+BACKGROUND = (14, 104, 89)
+TEXT = (255, 255, 255)
+MUTED = (205, 228, 223)
+
+
+def share_card_storage():
+    return FileSystemStorage(
+        location=os.path.join(settings.MEDIA_ROOT, DIRECTORY),
+        base_url=f'{settings.MEDIA_URL}{DIRECTORY}/',
+    )
+
+
+@lru_cache(maxsize=None)
+def _logo_digest():
+    with open(finders.find(LOGO), 'rb') as handle:
+        return hashlib.sha256(handle.read()).hexdigest()
+
+
+def _card_name(pk, name, dob, dod, cover_image):
+    digest = hashlib.sha256('\0'.join(map(str, (
+        LAYOUT_VERSION, _logo_digest(), name, dob or '', dod or '', cover_image or '',
+    ))).encode()).hexdigest()
+    return f'{pk}/{digest}.jpg'
+
+
+def card_name(memorial):
+    """
+    Storage name of the card showing ``memorial`` as it is now
+    """
+    return _card_name(memorial.pk, memorial.name, memorial.dob, memorial.dod, memorial.cover_image.name)
+
+
+def card_drawn_at(row):
+    """
+    When the current card of a memorial was drawn, or None while it has not
+    been yet, for a ``values()`` row holding the CARD_FIELDS
+    """
+    try:
+        return share_card_storage().get_modified_time(_card_name(*(row[field] for field in CARD_FIELDS)))
+    except FileNotFoundError:
+        return None
+
+
+def card_url(memorial):
+    """
+    URL of the memorial's card, or None while it has not been drawn yet
+    """
+    storage = share_card_storage()
+    name = card_name(memorial)
+    return storage.url(name) if storage.exists(name) else None
+
+
+def _font(size):
+    if settings.SHARE_CARD_FONT:
+        return ImageFont.truetype(settings.SHARE_CARD_FONT, size)
+    return ImageFont.load_default(size)
+
+
+def _wrap(draw, text, font, width):
+    lines = []
+    for word in text.split():
+        if lines and draw.textlength(f'{lines[-1]} {word}', font=font) <= width:
+            lines[-1] = f'{lines[-1]} {word}'
+        else:
+            lines.append(word)
+    return lines
+
+
+def _fit_name(draw, name, width):
+    # The largest size at which the name fits on three lines, or the smallest size cut to three
+    for size in (72, 64, 56, 48):
+        font = _font(size)
+        lines = _wrap(draw, name, font, width)
+        if len(lines) <= 3 and all(draw.textlength(line, font=font) <= width for line in lines):
+            return font, lines
+    return font, lines[:3]
+
+
+def _dates(memorial):
+    dates = [dateformat.format(day, 'j F Y') if day else '' for day in (memorial.dob, memorial.dod)]
+    # Pillow's built-in font has no en dash
+    return ' - '.join(dates) if any(dates) else ''
+
+
+def _cover(memorial, size):
+    if not memorial.cover_image:
+        return None
+    try:
+        with memorial.cover_image.open('rb') as handle, Image.open(handle) as image:
+            image.draft('RGB', (size, size))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            return ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # A missing or unreadable cover leaves the card without a photo
+        return None
+
+
+@lru_cache(maxsize=None)
+def _logo():
+    with Image.open(finders.find(LOGO)) as image:
+        image.draft('RGB', (LOGO_SIZE, LOGO_SIZE))
+        image = image.convert('RGB')
+        image.thumbnail((LOGO_SIZE, LOGO_SIZE), Image.Resampling.LANCZOS)
+        return image
+
+
+def render_card(memorial):
+    """
+    JPEG bytes of the share card for ``memorial``
+    """
+    card = Image.new('RGB', (WIDTH, HEIGHT), BACKGROUND)
+    text_width = WIDTH - 2 * MARGIN
+    cover = _cover(memorial, HEIGHT)
+    if cover is not None:
+        card.paste(cover, (WIDTH - HEIGHT, 0))
+        text_width -= HEIGHT
+    draw = ImageDraw.Draw(card)
+
+    font, lines = _fit_name(draw, memorial.name, text_width)
+    y = MARGIN + 40
+    for line in lines:
+        draw.text((MARGIN, y), line, font=font, fill=TEXT)
+        y += int(font.size * 1.2)
+    dates = _dates(memorial)
+    if dates:
+        draw.text((MARGIN, y + 20), dates, font=_font(32), fill=MUTED)
+
+    logo = _logo()
+    card.paste(logo, (MARGIN, HEIGHT - MARGIN - logo.height))
+    draw.text((MARGIN + logo.width + 24, HEIGHT - MARGIN - logo.height // 2), 'MemorialBridge',
+              font=_font(36), fill=TEXT, anchor='lm')
+
+    output = io.BytesIO()
+    card.save(output, 'JPEG', quality=settings.IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+    return output.getvalue()
+
+
+def _write(storage, name, data):
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write under a temporary name first, so a reader never sees a partial file
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as handle:
+        handle.write(data)
+    os.replace(temporary, path)
+
+
+@background
+def render_share_cards(memorial_ids):
+    """
+    Draw the missing cards of the given memorials and remove outdated ones
+    """
+    storage = share_card_storage()
+    memorials = Memorial.objects.filter(pk__in=memorial_ids).only(*CARD_FIELDS)
+    current = {}
+    for memorial in memorials:
+        name = card_name(memorial)
+        if not storage.exists(name):
+            _write(storage, name, render_card(memorial))
+        current[memorial.pk] = os.path.basename(name)
+    for memorial_id in memorial_ids:
+        directory = storage.path(str(memorial_id))
+        if memorial_id not in current:
+            shutil.rmtree(directory, ignore_errors=True)
+            continue
+        for filename in os.listdir(directory):
+            # Temporary files may belong to a job drawing the same card
+            if filename != current[memorial_id] and not filename.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass
+
+
+@receiver(memorials_changed)
+def queue_share_cards(sender, pks, fields=None, **kwargs):
+    if fields is None or fields & RELEVANT_FIELDS:
+        memorial_ids = sorted(pks)
+        size = settings.SHARE_CARD_JOB_SIZE
+
+        def enqueue():
+            for start in range(0, len(memorial_ids), size):
+                render_share_cards.delay(memorial_ids[start:start + size])
+
+        transaction.on_commit(enqueue)
@@ -1,7 +1,54 @@
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Memorial
+
+# Sent with ``pks`` (a set of Memorial ids) whenever memorials are created,
+# edited, deleted or bulk-updated, so cached data about them can be dropped.
+# ``fields`` is the set of changed field names, or None when unknown (for
+# example after a create or delete), so receivers can skip irrelevant edits.
+memorials_changed = Signal()
+
+_batch = threading.local()
+
+
+def send_memorials_changed(pks, fields=None):
+    """
+    Announce changed memorials, or collect them while inside batch_changes()
+    """
+    pks = set(pks)
+    if not pks:
+        return
+    pending = getattr(_batch, 'pks', None)
+    if pending is not None:
+        pending.update(pks)
+        if fields is None:
+            _batch.fields = None
+        elif _batch.fields is not None:
+            _batch.fields.update(fields)
+        return
+    memorials_changed.send(sender=Memorial, pks=pks, fields=set(fields) if fields is not None else None)
+
+
+@contextmanager
+def batch_changes():
+    """
+    Coalesce memorials_changed notifications into one send on exit
+    """
+    if getattr(_batch, 'pks', None) is not None:
+        yield
+        return
+    _batch.pks = set()
+    _batch.fields = set()
+    try:
+        yield
+    finally:
+        pks, fields = _batch.pks, _batch.fields
+        _batch.pks = _batch.fields = None
+        send_memorials_changed(pks, fields)
 
 
 @receiver(post_save, sender=User)
@@ -11,3 +58,21 @@ def create_user_profile(sender, instance, created, **kwargs):
     """
     if created:
         UserProfile.objects.create(user=instance)
+
+
+@receiver(post_save, sender=Memorial)
+def memorial_saved(sender, instance, created, **kwargs):
+    """
+    Invalidate cached data for a memorial when it is saved
+    """
+    fields = None if created else instance.changed_fields()
+    if fields is None or fields:
+        send_memorials_changed([instance.pk], fields)
+
+
+@receiver(post_delete, sender=Memorial)
+def memorial_deleted(sender, instance, **kwargs):
+    """
+    Invalidate cached data for a memorial when it is deleted
+    """
+    send_memorials_changed([instance.pk])
@@ -0,0 +1,209 @@
+"""
+Sharded sitemap for public memorials.
+
+Memorials are split into shards by primary key range, so a memorial always
+stays in the same shard and an edit only invalidates that one shard. Each
+shard is generated by streaming slugs in chunks into a gzip buffer, and the
+compressed body is cached until a memorial in its range changes.
+
+A shard's Last-Modified is the newest ``updated_at`` among its rows, or
+the time the shard last changed if that is later: a memorial that is
+made private or deleted leaves the shard, and its removal must still
+count as a modification. The index gives the same time as each shard's
+``<lastmod>``, so crawlers can skip shards that have not changed.
+
+Shards above the one holding the newest public memorial are 404s, so
+made-up shard numbers cannot fill the cache with empty sitemaps. The
+highest shard is cached and only looked up again once a memorial beyond
+it changes.
+"""
+import gzip
+import io
+import time
+from datetime import datetime, timezone as dt_timezone
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Memorial
+from .signals import memorials_changed
+
+SLUG_PLACEHOLDER = 'sitemap-slug'
+CHUNK_SIZE = 2000
+HIGHEST_SHARD_KEY = 'sitemap:highest_shard'
+
+
+def shard_for(pk):
+    return pk // settings.SITEMAP_SHARD_SIZE
+
+
+def _version_key(shard):
+    return f'sitemap:shard:{shard}:version'
+
+
+def _changed_key(shard):
+    return f'sitemap:shard:{shard}:changed'
+
+
+def shard_changed_at(shard):
+    """
+    When a memorial in the shard last changed, as a Unix timestamp
+
+    A missing timestamp starts at the current time, so a cache restart can
+    only cause extra 200s, never a stale 304.
+    """
+    changed_at = cache.get(_changed_key(shard))
+    if changed_at is None:
+        cache.add(_changed_key(shard), int(time.time()), None)
+        changed_at = cache.get(_changed_key(shard), int(time.time()))
+    return changed_at
+
+
+def highest_shard():
+    """
+    Shard of the newest public memorial, or -1 when there is none
+    """
+    highest = cache.get(HIGHEST_SHARD_KEY)
+    if highest is None:
+        pk = Memorial.objects.filter(visibility='public').aggregate(highest=Max('pk'))['highest']
+        highest = shard_for(pk) if pk is not None else -1
+        cache.set(HIGHEST_SHARD_KEY, highest, None)
+    return highest
+
+
+def shard_version(shard):
+    version = cache.get(_version_key(shard))
+    if version is None:
+        cache.add(_version_key(shard), 1, None)
+        version = cache.get(_version_key(shard), 1)
+    return version
+
+
+@receiver(memorials_changed)
+def invalidate_shards(sender, pks, **kwargs):
+    """
+    Bump the version of every shard holding one of the changed memorials
+    """
+    now = int(time.time())
+    shards = {shard_for(pk) for pk in pks if pk is not None}
+    for shard in shards:
+        cache.set(_changed_key(shard), now, None)
+        try:
+            cache.incr(_version_key(shard))
+        except ValueError:
+            cache.add(_version_key(shard), 2, None)
+    # Only a memorial beyond the highest shard can add one; hiding or
+    # deleting the newest just leaves an empty shard until the next lookup
+    highest = cache.get(HIGHEST_SHARD_KEY)
+    if shards and highest is not None and max(shards) > highest:
+        cache.delete(HIGHEST_SHARD_KEY)
+
+
+def build_shard(shard, base_url):
+    """
+    Render one shard as gzip-compressed XML and return (body, last_modified)
+    """
+    size = settings.SITEMAP_SHARD_SIZE
+    url_template = base_url + reverse('memorial_detail', kwargs={'slug': SLUG_PLACEHOLDER})
+    rows = Memorial.objects.filter(
+        visibility='public',
+        pk__gte=shard * size,
+        pk__lt=(shard + 1) * size,
+    ).order_by('pk').values_list('slug', 'updated_at')
+
+    buffer = io.BytesIO()
+    last_modified = None
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as body:
+        body.write(b'<?xml version="1.0" encoding="UTF-8"?>\n'
+                   b'<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        lines = []
+        for slug, updated_at in rows.iterator(chunk_size=CHUNK_SIZE):
+            if last_modified is None or updated_at > last_modified:
+                last_modified = updated_at
+            loc = escape(url_template.replace(SLUG_PLACEHOLDER, slug))
+            lines.append(f'<url><loc>{loc}</loc><lastmod>{updated_at.date().isoformat()}</lastmod></url>\n')
+            if len(lines) >= CHUNK_SIZE:
+                body.write(''.join(lines).encode())
+                lines = []
+        body.write(''.join(lines).encode())
+        body.write(b'</urlset>\n')
+    return buffer.getvalue(), last_modified
+
+
+def get_shard(shard, base_url):
+    """
+    Return the cached (body, last_modified timestamp) for a shard, building it if needed
+    """
+    key = f'sitemap:shard:{shard}:{shard_version(shard)}:{base_url}'
+    cached = cache.get(key)
+    if cached is None:
+        body, last_modified = build_shard(shard, base_url)
+        cached = (body, int(last_modified.timestamp()) if last_modified else None)
+        cache.set(key, cached, settings.SITEMAP_CACHE_TIMEOUT)
+    body, last_modified = cached
+    # Rows that left the shard are not in the body, but still moved it on
+    return body, max(last_modified or 0, shard_changed_at(shard))
+
+
+def _gzip_response(request, body):
+    """
+    Send the compressed body as-is when the client accepts gzip
+    """
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(body, content_type='application/xml')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        stream = gzip.GzipFile(fileobj=io.BytesIO(body), mode='rb')
+        response = StreamingHttpResponse(iter(lambda: stream.read(64 * 1024), b''), content_type='application/xml')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+def sitemap_index(request):
+    """
+    Sitemap index listing one shard per primary key range
+    """
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    # Newest updated_at of each shard, in one grouped query
+    newest = dict(
+        Memorial.objects.filter(visibility='public')
+        .annotate(shard=F('pk') / settings.SITEMAP_SHARD_SIZE)
+        .values('shard').annotate(newest=Max('updated_at'))
+        .order_by().values_list('shard', 'newest')
+    )
+
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>\n',
+             '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n']
+    for shard in range(max(newest, default=-1) + 1):
+        loc = escape(base_url + reverse('sitemap_shard', kwargs={'shard': shard}))
+        # The same time as the shard's Last-Modified
+        last_modified = max(int(newest[shard].timestamp()) if shard in newest else 0, shard_changed_at(shard))
+        lastmod = datetime.fromtimestamp(last_modified, dt_timezone.utc).isoformat()
+        lines.append(f'<sitemap><loc>{loc}</loc><lastmod>{lastmod}</lastmod></sitemap>\n')
+    lines.append('</sitemapindex>\n')
+    return HttpResponse(''.join(lines), content_type='application/xml')
+
+
+def sitemap_shard(request, shard):
+    """
+    One sitemap shard with at most SITEMAP_SHARD_SIZE memorial URLs
+    """
+    if shard > highest_shard():
+        raise Http404('No such sitemap.')
+    base_url = request.build_absolute_uri('/').rstrip('/')
+    body, last_modified = get_shard(shard, base_url)
+
+    not_modified = get_conditional_response(request, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    response = _gzip_response(request, body)
+    response['Last-Modified'] = http_date(last_modified)
+    return response
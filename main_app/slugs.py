@@ -0,0 +1,102 @@
+"""
+Cached slug to memorial resolution.
+
+Most views only need a memorial's id, visibility and owner to decide what
+to do with a slug. Those are cached in two levels: an LRU in each worker
+process in front of the shared cache, in front of the database. Both are
+keyed by a version stamp that moves whenever a memorial is created,
+deleted, or changes slug, visibility or owner, so a change retires every cached
+slug at once, in every process, at the cost of one shared-cache read per
+lookup. The stamp starts from the current time, so a cache flush can
+never bring back a version that workers still hold entries for.
+
+Views load the memorial itself by id together with the slug and the
+visibility or owner they were given, so an entry that is out of date
+(with a per-process cache, until the stamp expires) leads to a 404 and
+never to the wrong memorial.
+"""
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.http import Http404
+
+from .models import Memorial
+from .signals import memorials_changed
+
+VERSION_KEY = 'slugs:version'
+# Every field a ResolvedSlug carries
+RELEVANT_FIELDS = {'slug', 'visibility', 'owner'}
+
+ResolvedSlug = namedtuple('ResolvedSlug', ['pk', 'visibility', 'owner_id'])
+
+
+def _now_us():
+    return time.time_ns() // 1000
+
+
+@receiver(memorials_changed)
+def invalidate_slugs(sender, pks, fields=None, **kwargs):
+    if fields is None or fields & RELEVANT_FIELDS:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, _now_us(), settings.SLUG_VERSION_TIMEOUT)
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, _now_us, settings.SLUG_VERSION_TIMEOUT)
+
+
+def _key(version, slug):
+    return f'slug:{version}:{slug}'
+
+
+@lru_cache(maxsize=settings.SLUG_CACHE_LOCAL_SIZE)
+def _resolve(version, slug):
+    resolved = cache.get(_key(version, slug))
+    if resolved is None:
+        row = Memorial.objects.filter(slug=slug).values_list('pk', 'visibility', 'owner_id').first()
+        # Unknown slugs are cached as () so they do not reach the database every time
+        resolved = tuple(row) if row else ()
+        cache.set(_key(version, slug), resolved, settings.SLUG_CACHE_TIMEOUT)
+    return ResolvedSlug(*resolved) if resolved else None
+
+
+def resolve(slug):
+    """
+    ResolvedSlug(pk, visibility, owner_id) for ``slug``, or None if no memorial has it
+    """
+    return _resolve(_version(), slug)
+
+
+def resolve_or_404(slug):
+    resolved = resolve(slug)
+    if resolved is None:
+        raise Http404('No memorial matches the given query.')
+    return resolved
+
+
+def resolve_many(slugs):
+    """
+    Dict of slug to ResolvedSlug for the slugs that exist, with one
+    cache read and at most one query
+    """
+    version = _version()
+    slugs = set(slugs)
+    keys = {_key(version, slug): slug for slug in slugs}
+    cached = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = slugs - cached.keys()
+    if missing:
+        found = {
+            slug: (pk, visibility, owner_id)
+            for slug, pk, visibility, owner_id in Memorial.objects.filter(slug__in=missing)
+            .values_list('slug', 'pk', 'visibility', 'owner_id')
+        }
+        fetched = {slug: found.get(slug, ()) for slug in missing}
+        cache.set_many({_key(version, slug): value for slug, value in fetched.items()}, settings.SLUG_CACHE_TIMEOUT)
+        cached.update(fetched)
+    return {slug: ResolvedSlug(*value) for slug, value in cached.items() if value}
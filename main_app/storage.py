@@ -0,0 +1,200 @@
+"""
+Content-addressed storage for uploaded media.
+
+Files are named after the SHA-256 of their contents and sharded into two
+levels of prefix directories (``blobs/3f/a2/3fa2….jpg``), so no directory
+grows past a few thousand entries and identical photos uploaded by many
+relatives are stored once. The ``upload_to`` of a field is ignored.
+
+Each stored file has a MediaBlob row counting the references to it.
+Saving a file adds a reference and deleting one only drops a reference;
+the file itself is removed once the last reference is gone and the
+transaction has committed. Both sides lock the MediaBlob row, and a row
+at zero references is only deleted, along with its file, after checking
+the count again under that lock, so an upload of the same content that
+races the last release either revives the row or writes the file anew.
+Model rows release their files through the
+signal receivers at the bottom of this module. Inside batch_releases()
+the references are dropped together on exit, a few queries for any
+number of rows.
+"""
+import hashlib
+import os
+import threading
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import MediaBlob, Memorial, Memory
+
+PREFIX = 'blobs/'
+
+_batch = threading.local()
+
+
+def content_name(content, original_name):
+    """
+    Storage name for ``content``, keeping the lowercased extension of ``original_name``
+    """
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that deduplicates files by content and counts references
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The real name is only known once the content is hashed in _save()
+        return name
+
+    def _save(self, name, content):
+        name = content_name(content, name)
+        with transaction.atomic():
+            blob, created = MediaBlob.objects.select_for_update().get_or_create(
+                name=name, defaults={'size': content.size},
+            )
+            # A row left at zero references may already have lost its file
+            if created or not self.exists(name):
+                # Write under a temporary name first, so a reader never sees a partial file
+                temporary = super()._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+                os.replace(self.path(temporary), self.path(name))
+            MediaBlob.objects.filter(pk=blob.pk).update(refs=F('refs') + 1)
+        return name
+
+    def delete(self, name):
+        """
+        Drop one reference to ``name``, removing the file after the last one
+        """
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        pending = getattr(_batch, 'releases', None)
+        if pending is not None:
+            pending.append((self, name))
+            return
+        if not name.startswith(PREFIX):
+            # Files stored before this storage was introduced are not shared
+            transaction.on_commit(lambda: super(ContentAddressedStorage, self).delete(name))
+            return
+        with transaction.atomic():
+            blob = MediaBlob.objects.select_for_update().filter(name=name).first()
+            if blob is None or blob.refs == 0:
+                return
+            MediaBlob.objects.filter(pk=blob.pk).update(refs=F('refs') - 1)
+        if blob.refs == 1:
+            transaction.on_commit(lambda: self._remove_unreferenced(name))
+
+    def release(self, names):
+        """
+        Drop one reference per occurrence of each name in ``names``
+        """
+        counts = Counter()
+        for name in names:
+            if name.startswith(PREFIX):
+                counts[name] += 1
+            else:
+                transaction.on_commit(lambda name=name: super(ContentAddressedStorage, self).delete(name))
+        if not counts:
+            return
+        # Names dropped the same number of times share one UPDATE
+        by_count = defaultdict(list)
+        for name, count in counts.items():
+            by_count[count].append(name)
+        with transaction.atomic():
+            # Lock the rows in name order first, so two batches cannot deadlock
+            list(MediaBlob.objects.select_for_update().filter(name__in=counts).order_by('name').values_list('pk'))
+            for count, group in by_count.items():
+                MediaBlob.objects.filter(name__in=group).update(refs=Greatest(F('refs') - count, 0))
+            released = list(MediaBlob.objects.filter(name__in=counts, refs=0).values_list('name', flat=True))
+        for name in released:
+            transaction.on_commit(lambda name=name: self._remove_unreferenced(name))
+
+    def _remove_unreferenced(self, name):
+        with transaction.atomic():
+            # The same content may have been uploaded again since it was released
+            blob = MediaBlob.objects.select_for_update().filter(name=name, refs=0).first()
+            if blob is not None:
+                super().delete(name)
+                blob.delete()
+
+
+@contextmanager
+def batch_releases():
+    """
+    Collect the files dropped by deletes and release them together on exit,
+    unless the block raises
+    """
+    if getattr(_batch, 'releases', None) is not None:
+        yield
+        return
+    _batch.releases = []
+    try:
+        yield
+        releases = _batch.releases
+    finally:
+        _batch.releases = None
+    by_storage = defaultdict(list)
+    for storage, name in releases:
+        by_storage[storage].append(name)
+    for storage, names in by_storage.items():
+        storage.release(names)
+
+
+def _file_fields(instance):
+    # Other storages keep their files when rows go away, as Django does by default
+    return [field for field in instance._meta.concrete_fields
+            if isinstance(getattr(field, 'storage', None), ContentAddressedStorage)]
+
+
+@receiver(pre_save, sender=Memorial)
+@receiver(pre_save, sender=Memory)
+def remember_replaced_files(sender, instance, **kwargs):
+    """
+    Note the stored files that a save is about to replace or clear
+    """
+    if instance.pk is None:
+        return
+    # Unchanged fields hold a committed file with a name; only uploads and
+    # cleared fields can drop the previous file
+    fields = [field for field in _file_fields(instance)
+              if not getattr(instance, field.attname) or not getattr(instance, field.attname)._committed]
+    if not fields:
+        return
+    # Memorials remember the values they were loaded with, which saves a query
+    previous = getattr(instance, '_loaded_values', None)
+    if previous is None or any(field.attname not in previous for field in fields):
+        previous = sender._base_manager.filter(pk=instance.pk).values(*[field.attname for field in fields]).first()
+    if previous:
+        # Loaded values may be names or, after a save, FieldFiles
+        names = [(field, getattr(previous[field.attname], 'name', previous[field.attname])) for field in fields]
+        instance._replaced_files = [(field, name) for field, name in names if name]
+
+
+@receiver(post_save, sender=Memorial)
+@receiver(post_save, sender=Memory)
+def release_replaced_files(sender, instance, **kwargs):
+    for field, name in getattr(instance, '_replaced_files', ()):
+        if getattr(instance, field.attname).name != name:
+            field.storage.delete(name)
+    instance._replaced_files = ()
+
+
+@receiver(post_delete, sender=Memorial)
+@receiver(post_delete, sender=Memory)
+def release_deleted_files(sender, instance, **kwargs):
+    for field in _file_fields(instance):
+        name = getattr(instance, field.attname).name
+        if name:
+            field.storage.delete(name)
@@ -0,0 +1,14 @@
+from django import template
+
+from main_app.cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def memorial_cards(memorials, layout='grid', eager_first=False):
+    """
+    Rendered cards for ``memorials``, mostly from the cache:
+    ``{% memorial_cards memorials 'compact' as cards %}``
+    """
+    return render_cards(memorials, layout, eager_first)
@@ -1,7 +1,117 @@
-from django.test import TestCase
+import gzip
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import re
+import struct
+import tempfile
+import unittest
+import zlib
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.template import Context, Template, engines
+from django.template.loader import get_template
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.urls import reverse
-from .models import UserProfile, Memorial, Memory
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from . import activity, metrics, share_cards, slugs
+from .models import UserProfile, Memorial, Memory, Job, MemorialTrigram, ProfileRecord, MediaBlob, Activity
+from .forms import MemorialForm
+from .images import process_image
+from .jobs import background
+from .anniversaries import anniversary_ids, describe, month_days, seconds_until_midnight, todays_anniversary_ids
+from .assets import flatten_css, minify_css, minify_js
+from .cards import card_key, render_cards
+from .paginator import EstimatedCountPaginator
+from .signals import memorials_changed
+from .profiling import make_token
+from .video import parse_video_url
+from .views import memorial_cards
+from .warmup import warm_up
+
+
+JOB_CALLS = []
+
+
+@background
+def record_call(value):
+    JOB_CALLS.append(value)
+
+
+@background(max_attempts=2)
+def always_fails():
+    raise RuntimeError("boom")
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def write_blank_png(path, width, height):
+    """
+    Write a valid all-black grayscale PNG without building it in memory
+    """
+    row = b'\x00' * (width + 1)
+    compressor = zlib.compressobj(9)
+    with open(path, 'wb') as out:
+        out.write(b'\x89PNG\r\n\x1a\n')
+        out.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)))
+        data = b''.join(compressor.compress(row) for _ in range(height)) + compressor.flush()
+        out.write(_png_chunk(b'IDAT', data))
+        out.write(_png_chunk(b'IEND', b''))
+
+
+def _measure_processing(path, conn):
+    import resource
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    try:
+        with open(path, 'rb') as handle:
+            processed = process_image(File(handle, name=os.path.basename(path)))
+        outcome = processed.image.size
+    except ValidationError as error:
+        outcome = error.code
+    growth_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    conn.send((outcome, growth_kb * 1024))
+    conn.close()
+
+
+def write_large_jpeg(path, size):
+    """
+    Encode a solid JPEG in a child process so the parent's heap stays small
+    """
+    context = multiprocessing.get_context('fork')
+    process = context.Process(target=lambda: Image.new('RGB', size, (120, 80, 40)).save(path, quality=90))
+    process.start()
+    process.join()
+
+
+def peak_memory_of_processing(path):
+    """
+    Process an image file in a forked child and return (result, peak RSS growth in bytes)
+    """
+    context = multiprocessing.get_context('fork')
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=_measure_processing, args=(path, child_conn))
+    process.start()
+    result = parent_conn.recv()
+    process.join()
+    return result
 
 
 class UserProfileModelTest(TestCase):
@@ -255,7 +365,7 @@ class ContributionTest(TestCase):
         
         self.memorial.refresh_from_db()
         self.assertEqual(self.memorial.trees_planted_count, initial_count + 1)
-        self.assertRedirects(response, reverse('memorial_detail', kwargs={'slug': self.memorial.slug'}))
+        self.assertRedirects(response, reverse('memorial_detail', kwargs={'slug': self.memorial.slug}))
 
 
 class MemorySubmissionTest(TestCase):
@@ -289,3 +399,1708 @@ class MemorySubmissionTest(TestCase):
             memorial=self.memorial,
             content='This is a fond memory'
         ).exists())
+
+
+class JobQueueTest(TestCase):
+    def setUp(self):
+        JOB_CALLS.clear()
+
+    def test_delay_enqueues_job(self):
+        """Test that calling delay stores a job instead of running the task"""
+        job = record_call.delay('hello')
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(job.task, 'main_app.tests.record_call')
+        self.assertEqual(job.args, ['hello'])
+        self.assertEqual(JOB_CALLS, [])
+
+    def test_worker_runs_due_jobs(self):
+        """Test that the worker runs queued jobs and marks them done"""
+        job = record_call.delay('hello')
+        call_command('run_worker', burst=True, concurrency=1, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(JOB_CALLS, ['hello'])
+
+    def test_worker_skips_future_jobs(self):
+        """Test that jobs scheduled in the future are left alone"""
+        job = record_call.delay('later')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now() + timedelta(hours=1))
+        call_command('run_worker', burst=True, concurrency=1, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(JOB_CALLS, [])
+
+    def test_failed_job_retries_with_backoff(self):
+        """Test that a failing job is requeued later and then marked failed"""
+        job = always_fails.delay()
+        call_command('run_worker', burst=True, concurrency=1, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_QUEUED)
+        self.assertEqual(job.attempts, 1)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('boom', job.last_error)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        call_command('run_worker', burst=True, concurrency=1, stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+        self.assertEqual(job.attempts, 2)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        """Test that JOBS_EAGER runs the task as soon as it is enqueued"""
+        job = record_call.delay('now')
+        self.assertEqual(job.status, Job.STATUS_DONE)
+        self.assertEqual(JOB_CALLS, ['now'])
+
+
+@override_settings(RATELIMIT_RATES={'memorial_post': '2/m', 'copy_link': '1/m'})
+class RateLimitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.memorial = Memorial.objects.create(
+            owner=self.user.userprofile,
+            name='Test Person',
+            visibility='public'
+        )
+        self.url = reverse('memorial_detail', kwargs={'slug': self.memorial.slug})
+
+    def test_contributions_are_throttled(self):
+        """Test that POSTs beyond the rate get a 429 without touching the memorial"""
+        self.client.login(username='testuser', password='testpass123')
+        for _ in range(2):
+            response = self.client.post(self.url, {'donate': ''})
+            self.assertEqual(response.status_code, 302)
+
+        response = self.client.post(self.url, {'donate': ''})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+        self.memorial.refresh_from_db()
+        self.assertEqual(self.memorial.donations_count, 2)
+
+    def test_page_views_are_not_throttled(self):
+        """Test that GET requests do not use up the POST budget"""
+        for _ in range(5):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_copy_link_is_throttled_per_client(self):
+        """Test that the copy link API is limited per IP address"""
+        payload = json.dumps({'slug': self.memorial.slug})
+        response = self.client.post(reverse('copy_link'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('copy_link'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 429)
+
+        response = self.client.post(
+            reverse('copy_link'), payload, content_type='application/json', REMOTE_ADDR='10.0.0.2'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class AdminScalingTest(TestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username='admin',
+            email='admin@example.com',
+            password='adminpass123'
+        )
+        self.client.force_login(self.admin_user)
+        self.owner = User.objects.create_user(username='owner', password='testpass123')
+
+    def create_memorials(self, count, start=0):
+        for i in range(start, start + count):
+            memorial = Memorial.objects.create(
+                owner=self.owner.userprofile,
+                name=f'Person {i}',
+                visibility='public'
+            )
+            Memory.objects.create(memorial=memorial, author=self.owner, type='text', content='Memory')
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Test that owner, memorial and author columns are joined, not queried per row"""
+        self.create_memorials(2)
+        memorial_queries = self.changelist_queries(reverse('admin:main_app_memorial_changelist'))
+        memory_queries = self.changelist_queries(reverse('admin:main_app_memory_changelist'))
+
+        self.create_memorials(8, start=2)
+        self.assertEqual(self.changelist_queries(reverse('admin:main_app_memorial_changelist')), memorial_queries)
+        self.assertEqual(self.changelist_queries(reverse('admin:main_app_memory_changelist')), memory_queries)
+
+    def test_memorial_search_uses_name_prefix(self):
+        """Test that admin search matches the start of the normalized name"""
+        Memorial.objects.create(owner=self.owner.userprofile, name='Ustad Nusrat Fateh Ali Khan')
+        Memorial.objects.create(owner=self.owner.userprofile, name='Abdul Sattar Edhi')
+        response = self.client.get(reverse('admin:main_app_memorial_changelist') + '?q=USTAD+nus')
+        self.assertContains(response, 'Ustad Nusrat Fateh Ali Khan')
+        self.assertNotContains(response, 'Abdul Sattar Edhi')
+
+    def test_bulk_visibility_action(self):
+        """Test that the bulk actions change visibility for all selected memorials"""
+        self.create_memorials(3)
+        ids = list(Memorial.objects.values_list('pk', flat=True))
+        response = self.client.post(reverse('admin:main_app_memorial_changelist'), {
+            'action': 'make_private',
+            '_selected_action': ids,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Memorial.objects.filter(visibility='private').count(), 3)
+
+    def test_estimated_count_for_unfiltered_tables(self):
+        """Test that the paginator estimates large unfiltered tables and counts filtered ones"""
+        self.create_memorials(3)
+        Memorial.objects.order_by('pk').first().delete()
+        highest_pk = Memorial.objects.order_by('-pk').first().pk
+
+        paginator = EstimatedCountPaginator(Memorial.objects.all(), 10)
+        paginator.exact_count_threshold = 0
+        self.assertEqual(paginator.count, highest_pk)
+
+        filtered = EstimatedCountPaginator(Memorial.objects.filter(visibility='public'), 10)
+        filtered.exact_count_threshold = 0
+        self.assertEqual(filtered.count, 2)
+
+
+@override_settings(SITEMAP_SHARD_SIZE=2)
+class SitemapTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorials = [
+            Memorial.objects.create(owner=self.user.userprofile, name=f'Person {i}', visibility='public')
+            for i in range(3)
+        ]
+
+    def get_shard(self, memorial, **extra):
+        shard = memorial.pk // 2
+        return self.client.get(reverse('sitemap_shard', kwargs={'shard': shard}), **extra)
+
+    def test_index_lists_every_shard(self):
+        """Test that the index links to the shard of every public memorial"""
+        response = self.client.get(reverse('sitemap_index'))
+        self.assertEqual(response.status_code, 200)
+        for memorial in self.memorials:
+            self.assertContains(response, f'/sitemap-{memorial.pk // 2}.xml')
+
+    def test_index_gives_each_shard_its_last_modified(self):
+        """Test that index entries carry the time their shard answers with in Last-Modified"""
+        content = self.client.get(reverse('sitemap_index')).content.decode()
+        for memorial in self.memorials:
+            response = self.get_shard(memorial)
+            last_modified = parse_http_date(response['Last-Modified'])
+            lastmod = datetime.fromtimestamp(last_modified, dt_timezone.utc).isoformat()
+            self.assertIn(f'/sitemap-{memorial.pk // 2}.xml</loc><lastmod>{lastmod}</lastmod>', content)
+
+    def test_shards_beyond_newest_memorial_are_not_found(self):
+        """Test that made-up shard numbers get a 404 and nothing is cached for them"""
+        highest = self.memorials[-1].pk // 2
+        beyond = reverse('sitemap_shard', kwargs={'shard': highest + 1})
+        with mock.patch('main_app.sitemaps.build_shard') as build_shard:
+            self.assertEqual(self.client.get(beyond).status_code, 404)
+            self.assertEqual(self.client.get(reverse('sitemap_shard', kwargs={'shard': 10 ** 9})).status_code, 404)
+        build_shard.assert_not_called()
+
+        # A memorial in a new shard makes it available at once
+        Memorial.objects.bulk_create([Memorial(owner=self.user.userprofile, name='Filler', slug=f'filler-{i}',
+                                               visibility='private') for i in range(2)])
+        newest = Memorial.objects.create(owner=self.user.userprofile, name='Newest Person')
+        shard = reverse('sitemap_shard', kwargs={'shard': newest.pk // 2})
+        response = self.client.get(shard)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(newest.get_absolute_url(), b''.join(response.streaming_content).decode())
+
+    def test_shard_lists_only_public_memorials(self):
+        """Test that shards include public memorials and skip private ones"""
+        memorial = self.memorials[0]
+        response = self.get_shard(memorial)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(memorial.get_absolute_url(), b''.join(response.streaming_content).decode())
+
+        memorial.visibility = 'private'
+        memorial.save()
+        response = self.get_shard(memorial)
+        self.assertNotIn(memorial.get_absolute_url(), b''.join(response.streaming_content).decode())
+
+    def test_shard_served_gzipped_with_last_modified(self):
+        """Test that gzip clients get the cached body and a Last-Modified header"""
+        response = self.get_shard(self.memorials[0], HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Last-Modified', response)
+        self.assertIn(b'<urlset', gzip.decompress(response.content))
+
+        response = self.get_shard(self.memorials[0], HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(SITEMAP_SHARD_SIZE=50000)
+    def test_hiding_newest_memorial_moves_last_modified_on(self):
+        """Test that a shard is modified when its most recently updated memorial leaves it"""
+        older, _, newest = self.memorials
+        Memorial.objects.exclude(pk=newest.pk).update(updated_at=timezone.now() - timedelta(days=1))
+        cache.clear()
+        url = reverse('sitemap_shard', kwargs={'shard': 0})
+        response = self.client.get(url)
+        last_modified = response['Last-Modified']
+
+        # A minute later, so the change does not fall in the same second
+        with mock.patch('main_app.sitemaps.time.time', return_value=timezone.now().timestamp() + 60):
+            newest.visibility = 'private'
+            newest.save()
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        content = b''.join(response.streaming_content).decode()
+        self.assertNotIn(newest.get_absolute_url(), content)
+        self.assertIn(older.get_absolute_url(), content)
+
+    def test_shard_cached_until_memorial_changes(self):
+        """Test that a cached shard is reused until one of its memorials is saved"""
+        memorial = self.memorials[0]
+        self.get_shard(memorial)
+        with self.assertNumQueries(0):
+            self.get_shard(memorial)
+
+        memorial.save()
+        with CaptureQueriesContext(connection) as ctx:
+            self.get_shard(memorial)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+
+class AutocompleteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        profile = self.user.userprofile
+        Memorial.objects.create(owner=profile, name='Noor Jehan', donations_count=5)
+        Memorial.objects.create(owner=profile, name='Nusrat Fateh Ali Khan', donations_count=50)
+        Memorial.objects.create(owner=profile, name='Nur Jahan', trees_planted_count=1)
+        Memorial.objects.create(owner=profile, name='Nusrat Private', donations_count=99, visibility='private')
+
+    def suggest(self, query, **params):
+        response = self.client.get(reverse('memorial_autocomplete'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [result['name'] for result in response.json()['results']]
+
+    def test_prefix_matches_ordered_by_popularity(self):
+        """Test that suggestions match the name prefix, most popular first"""
+        self.assertEqual(self.suggest('n'), [])
+        self.assertEqual(self.suggest('NU'), ['Nusrat Fateh Ali Khan', 'Nur Jahan'])
+        self.assertEqual(self.suggest('no'), ['Noor Jehan'])
+        self.assertEqual(self.suggest('nu', limit=1), ['Nusrat Fateh Ali Khan'])
+
+    def test_later_words_match_after_name_starts(self):
+        """Test that a query matches the start of any word, after names starting with it"""
+        Memorial.objects.create(owner=self.user.userprofile, name='Ustad Nusrat Fateh Ali Khan', donations_count=500)
+        self.assertEqual(self.suggest('nusrat'), ['Nusrat Fateh Ali Khan', 'Ustad Nusrat Fateh Ali Khan'])
+        self.assertEqual(self.suggest('fateh ali'), ['Ustad Nusrat Fateh Ali Khan', 'Nusrat Fateh Ali Khan'])
+        self.assertEqual(self.suggest('jah'), ['Nur Jahan'])
+        self.assertEqual(self.suggest('atrat'), [])
+
+        memorial = Memorial.objects.get(name='Noor Jehan')
+        memorial.name = 'Malika Noor Jehan'
+        memorial.save()
+        self.assertEqual(self.suggest('jeh'), ['Malika Noor Jehan'])
+        self.assertEqual(self.suggest('mal'), ['Malika Noor Jehan'])
+
+    def test_private_memorials_are_not_suggested(self):
+        """Test that private memorials never appear in suggestions"""
+        self.assertNotIn('Nusrat Private', self.suggest('nusrat'))
+
+    def test_suggestions_are_cached_until_names_change(self):
+        """Test that repeated prefixes skip the database until a memorial is renamed"""
+        self.suggest('nur')
+        with self.assertNumQueries(0):
+            self.suggest('nur')
+
+        memorial = Memorial.objects.get(name='Noor Jehan')
+        memorial.name = 'Nur Jehan'
+        memorial.save()
+        self.assertEqual(self.suggest('nur'), ['Nur Jehan', 'Nur Jahan'])
+
+
+class FuzzySearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        profile = self.user.userprofile
+        self.noor = Memorial.objects.create(owner=profile, name='Noor Jehan')
+        self.nusrat = Memorial.objects.create(owner=profile, name='Nusrat Fateh Ali Khan', donations_count=50)
+        Memorial.objects.create(owner=profile, name='Abdul Sattar Edhi')
+        Memorial.objects.create(owner=profile, name='Nusrat Private', visibility='private')
+
+    def search(self, query):
+        response = self.client.get(reverse('explore'), {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [memorial.name for memorial in response.context['memorials']]
+
+    def test_spelling_variants_match(self):
+        """Test that transliteration variants find the same memorial"""
+        self.assertEqual(self.search('Nur Jahan'), ['Noor Jehan'])
+        self.assertEqual(self.search('nusret'), ['Nusrat Fateh Ali Khan'])
+        self.assertEqual(self.search('Edhi'), ['Abdul Sattar Edhi'])
+        self.assertEqual(self.search('Zxqv'), [])
+
+    @override_settings(FUZZY_SEARCH_LIMIT=1)
+    def test_capped_results_say_so(self):
+        """Test that the results header tells when only the best matches are shown"""
+        response = self.client.get(reverse('explore'), {'search': 'Edhi'})
+        self.assertNotContains(response, 'Showing the top')
+        Memorial.objects.create(owner=self.user.userprofile, name='Bilquis Edhi')
+        response = self.client.get(reverse('explore'), {'search': 'Edhi'})
+        self.assertEqual(len(response.context['memorials']), 1)
+        self.assertContains(response, 'Showing the top <strong>1</strong> matches for')
+
+    def test_private_memorials_are_not_matched(self):
+        """Test that fuzzy search only returns public memorials"""
+        self.assertNotIn('Nusrat Private', self.search('Nusrat'))
+
+    @override_settings(FUZZY_SEARCH_CANDIDATES=2)
+    def test_private_memorials_do_not_take_candidate_slots(self):
+        """Test that private memorials sharing the query's trigrams leave room for public ones"""
+        for index in range(3):
+            Memorial.objects.create(owner=self.user.userprofile, name='Nusrat Fateh Ali Khan', visibility='private')
+        self.assertEqual(self.search('Nusrat Fateh'), ['Nusrat Fateh Ali Khan'])
+
+    def test_index_follows_renames_and_deletes(self):
+        """Test that the trigram index is kept current on save and delete"""
+        self.noor.name = 'Malika Pukhraj'
+        self.noor.save()
+        self.assertEqual(self.search('Noor Jehan'), [])
+        self.assertEqual(self.search('Malka Pukhraj'), ['Malika Pukhraj'])
+
+        pk = self.nusrat.pk
+        self.nusrat.delete()
+        self.assertFalse(MemorialTrigram.objects.filter(memorial_id=pk).exists())
+
+    def test_rebuild_trigrams_command(self):
+        """Test that rebuild_trigrams restores a cleared index"""
+        MemorialTrigram.objects.all().delete()
+        call_command('rebuild_trigrams', stdout=StringIO())
+        self.assertEqual(self.search('Nur Jahan'), ['Noor Jehan'])
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'memory is measured in forked processes')
+@override_settings(IMAGE_MAX_PIXELS=50_000_000, IMAGE_MAX_FULL_DECODE_PIXELS=16_000_000, IMAGE_MAX_DIMENSION=2048)
+class ImageUploadTest(TestCase):
+    MB = 1024 * 1024
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        # 25 megapixels, over IMAGE_MAX_FULL_DECODE_PIXELS for a PNG
+        cls.too_many_pixels = os.path.join(cls.tmpdir.name, 'too-many-pixels.png')
+        write_blank_png(cls.too_many_pixels, 5000, 5000)
+        # 10 gigapixels declared in a file of a few kilobytes
+        cls.bomb = os.path.join(cls.tmpdir.name, 'bomb.png')
+        with open(cls.bomb, 'wb') as out:
+            out.write(b'\x89PNG\r\n\x1a\n')
+            out.write(_png_chunk(b'IHDR', struct.pack('>IIBBBBB', 100000, 100000, 8, 2, 0, 0, 0)))
+            out.write(_png_chunk(b'IDAT', zlib.compress(b'\x00' * 4096)))
+            out.write(_png_chunk(b'IEND', b''))
+        # 36 megapixels, about 144 MB once decoded in full
+        cls.large_jpeg = os.path.join(cls.tmpdir.name, 'large.jpg')
+        write_large_jpeg(cls.large_jpeg, (6000, 6000))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmpdir.cleanup()
+        super().tearDownClass()
+
+    def upload(self, image, name='photo.jpg', **save_options):
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', **save_options)
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+    def test_rejects_oversized_header_without_decoding(self):
+        """Test that declared dimensions are checked before any pixels are decoded"""
+        outcome, growth = peak_memory_of_processing(self.too_many_pixels)
+        self.assertEqual(outcome, 'too_many_pixels')
+        self.assertLess(growth, 10 * self.MB)
+
+        outcome, growth = peak_memory_of_processing(self.bomb)
+        self.assertEqual(outcome, 'too_many_pixels')
+        self.assertLess(growth, 10 * self.MB)
+
+    def test_large_jpeg_is_decoded_at_reduced_scale(self):
+        """Test that a large JPEG is shrunk while decoding instead of decoded in full"""
+        outcome, growth = peak_memory_of_processing(self.large_jpeg)
+        self.assertEqual(outcome, (2048, 2048))
+        # Decoding at half scale peaks around 80 MB, a full decode needs over 144 MB
+        self.assertLess(growth, 110 * self.MB)
+
+    def test_exif_is_applied_and_stripped(self):
+        """Test that the stored image is upright, bounded and has no metadata"""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees clockwise
+        exif[0x010F] = 'Camera'
+        upload = self.upload(Image.new('RGB', (3000, 1000), 'white'), exif=exif.tobytes())
+
+        processed = process_image(upload)
+        with Image.open(processed) as stored:
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertEqual(stored.size, (683, 2048))
+            self.assertFalse(stored.getexif())
+
+    def test_memorial_form_uses_processed_image(self):
+        """Test that MemorialForm validates and re-encodes cover images"""
+        data = {'name': 'Test Person', 'visibility': 'public'}
+        form = MemorialForm(data, {'cover_image': self.upload(Image.new('RGB', (4000, 3000)), name='cover.jpeg')})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['cover_image'].name, 'cover.jpg')
+        self.assertEqual(form.cleaned_data['cover_image'].image.size, (2048, 1536))
+
+        with open(self.too_many_pixels, 'rb') as handle:
+            oversized = SimpleUploadedFile('big.png', handle.read(), content_type='image/png')
+        form = MemorialForm(data, {'cover_image': oversized})
+        self.assertFalse(form.is_valid())
+        self.assertIn('cover_image', form.errors)
+
+        form = MemorialForm(data, {'cover_image': SimpleUploadedFile('fake.jpg', b'not an image')})
+        self.assertFalse(form.is_valid())
+        self.assertIn('cover_image', form.errors)
+
+
+@override_settings(TEMPLATES=[{
+    'BACKEND': 'django.template.backends.django.DjangoTemplates',
+    'DIRS': [settings.BASE_DIR / 'templates'],
+    'OPTIONS': {
+        'context_processors': settings.TEMPLATES[0]['OPTIONS']['context_processors'],
+        'loaders': [('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)],
+    },
+}])
+class WarmUpTest(TestCase):
+    def test_warm_up_compiles_templates_and_resolves_urls(self):
+        """Test that warm-up fills the cached loader with every project template"""
+        summary = warm_up()
+        expected = {
+            os.path.relpath(os.path.join(root, name), settings.BASE_DIR / 'templates').replace(os.sep, '/')
+            for root, _dirs, files in os.walk(settings.BASE_DIR / 'templates')
+            for name in files if not name.startswith('.')
+        }
+        self.assertEqual(summary['templates'], len(expected))
+        self.assertGreater(summary['urls'], 0)
+
+        cached_loader = engines['django'].engine.template_loaders[0]
+        self.assertTrue(expected <= set(cached_loader.get_template_cache))
+
+
+@override_settings(RATELIMIT_ENABLE=False)
+class LoadTestCommandTest(LiveServerTestCase):
+    def test_loadtest_reports_every_endpoint(self):
+        """Test that loadtest logs in, drives the mix and reports each endpoint"""
+        user = User.objects.create_user(username='owner', password='testpass123')
+        Memorial.objects.create(owner=user.userprofile, name='Noor Jehan')
+
+        out = StringIO()
+        call_command(
+            'loadtest', base_url=self.live_server_url, concurrency='2', duration=1, users=2,
+            seed=1, no_histogram=True, allow_persistent_accounts=True, stdout=out,
+        )
+        output = out.getvalue()
+        self.assertIn('Concurrency 2:', output)
+        self.assertIn('0.0% errors', output)
+        for endpoint in ('home', 'explore', 'detail'):
+            self.assertIn(f'  {endpoint} ', output)
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+
+    def test_loadtest_refuses_to_run_without_debug(self):
+        """Test that loadtest does not create accounts in a production database by accident"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', base_url=self.live_server_url, stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='loadtest-').exists())
+
+
+class BioExcerptTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.long_bio = ' '.join(f'word{number}' for number in range(5000))
+        for number in range(3):
+            Memorial.objects.create(owner=self.user.userprofile, name=f'Person {number}', bio=self.long_bio)
+
+    def test_excerpt_matches_truncated_bio(self):
+        """Test that truncating the stored excerpt gives the same text as truncating the bio"""
+        memorial = Memorial.objects.first()
+        self.assertLess(len(memorial.bio_excerpt), 1000)
+        for length in (12, 20, 40):
+            self.assertEqual(
+                Template(f'{{{{ memorial.bio_excerpt|truncatewords:{length} }}}}').render(Context({'memorial': memorial})),
+                Template(f'{{{{ memorial.bio|truncatewords:{length} }}}}').render(Context({'memorial': memorial})),
+            )
+
+        memorial.bio = 'A short story.'
+        memorial.save()
+        self.assertEqual(memorial.bio_excerpt, 'A short story.')
+
+    def test_listings_do_not_load_full_bio(self):
+        """Test that listing pages skip the bio column and run a fixed number of queries"""
+        self.client.login(username='testuser', password='testpass123')
+        for url in (reverse('home'), reverse('explore'), reverse('dashboard')):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(self.long_bio, response.content.decode())
+            self.assertContains(response, 'word0 word1')
+            memorial_queries = [query['sql'] for query in queries if 'main_app_memorial' in query['sql']]
+            self.assertTrue(memorial_queries)
+            for sql in memorial_queries:
+                self.assertNotIn('"main_app_memorial"."bio",', sql)
+            self.assertLessEqual(len(memorial_queries), 2, memorial_queries)
+
+    def test_backfill_command(self):
+        """Test that backfill_bio_excerpts fills excerpts written without save()"""
+        Memorial.objects.update(bio_excerpt='')
+        out = StringIO()
+        call_command('backfill_bio_excerpts', missing=True, stdout=out)
+        self.assertIn('Updated 3 of 3', out.getvalue())
+        self.assertFalse(Memorial.objects.filter(bio_excerpt='').exists())
+
+
+def _record_in_child(directory):
+    from django.conf import settings as child_settings
+    child_settings.METRICS_DIR = directory
+    metrics.inc('memorialbridge_contributions_total', kind='donation')
+    metrics.observe('memorialbridge_request_duration_seconds', 0.2, view='home')
+    metrics.registry.flush()
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.run_metrics_dir = settings.METRICS_DIR
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        override = override_settings(METRICS_DIR=self.tmpdir.name, METRICS_TOKEN='scrape-token')
+        override.enable()
+        self.addCleanup(override.disable)
+        metrics.registry.reset()
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_test_runs_keep_their_own_metrics_dir(self):
+        """Test that requests made by other tests do not write to a development server's METRICS_DIR"""
+        self.assertIn('memorialbridge-test-metrics-', self.run_metrics_dir)
+        self.assertTrue(os.path.isdir(self.run_metrics_dir))
+
+    def test_metrics_require_token_or_staff(self):
+        """Test that /metrics is closed to anonymous and non-staff users"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.client.login(username='testuser', password='testpass123')
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_requests_queries_and_writes_are_recorded(self):
+        """Test that views, queries, caches and contributions show up in the scrape"""
+        self.client.get(reverse('home'))
+        self.client.get(reverse('memorial_autocomplete'), {'q': 'te'})
+        self.client.get(reverse('memorial_autocomplete'), {'q': 'te'})
+        self.client.login(username='testuser', password='testpass123')
+        url = reverse('memorial_detail', kwargs={'slug': self.memorial.slug})
+        self.client.post(url, {'donate': '1'})
+        self.client.post(url, {'memory_submit': '1', 'type': 'text', 'content': 'A memory'})
+
+        output = self.scrape()
+        self.assertIn('memorialbridge_requests_total{method="GET",status="200",view="home"} 1', output)
+        self.assertIn('memorialbridge_request_duration_seconds_count{view="home"} 1', output)
+        self.assertIn('memorialbridge_request_duration_seconds_bucket{view="home",le="+Inf"} 1', output)
+        self.assertRegex(output, r'memorialbridge_db_queries_total\{view="home"\} [1-9]')
+        self.assertIn('memorialbridge_cache_requests_total{cache="memorialbridge",result="hit"}', output)
+        self.assertIn('memorialbridge_contributions_total{kind="donation"} 1', output)
+        self.assertIn('memorialbridge_memories_created_total{type="text"} 1', output)
+        self.assertIn('memorialbridge_cache_hit_ratio{cache="memorialbridge"}', output)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'worker processes are forked')
+    def test_values_are_summed_across_processes(self):
+        """Test that values from other worker processes, live or exited, are added up"""
+        metrics.inc('memorialbridge_contributions_total', kind='donation')
+        context = multiprocessing.get_context('fork')
+        for _ in range(2):
+            process = context.Process(target=_record_in_child, args=(self.tmpdir.name,))
+            process.start()
+            process.join()
+
+        output = self.scrape()
+        self.assertIn('memorialbridge_contributions_total{kind="donation"} 3', output)
+        self.assertIn('memorialbridge_request_duration_seconds_bucket{view="home",le="0.25"} 2', output)
+        # Files of exited children were folded into the archive
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.tmpdir.name) if name.endswith('.json')),
+            sorted(['archive.json', metrics.registry.file_name]),
+        )
+        self.assertIn('memorialbridge_contributions_total{kind="donation"} 3', self.scrape())
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.memorial = Memorial.objects.create(owner=self.staff.userprofile, name='Test Person')
+        self.url = reverse('memorial_detail', kwargs={'slug': self.memorial.slug})
+
+    def test_unprofiled_requests_are_not_recorded(self):
+        """Test that requests without a valid token are served normally"""
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url, {'_profile': 'forged'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+
+        visitor = User.objects.create_user(username='visitor', password='testpass123')
+        self.client.get(self.url, HTTP_X_PROFILE_TOKEN=make_token(visitor))
+        self.assertFalse(ProfileRecord.objects.exists())
+
+    def test_signed_token_profiles_request(self):
+        """Test that a staff token stores a profile with SQL timings"""
+        token = make_token(self.staff)
+        response = self.client.get(self.url, {'_profile': token, 'tab': 'memories'})
+        self.assertEqual(response.status_code, 200)
+
+        record = ProfileRecord.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual(record.view_name, 'memorial_detail')
+        self.assertEqual(record.path, self.url + '?tab=memories')
+        self.assertEqual(record.user, self.staff)
+        self.assertGreater(record.sql_count, 0)
+        self.assertEqual(len(record.queries), record.sql_count)
+        self.assertIn('memorial_detail', record.stats)
+
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN=token)
+        self.assertIn('X-Profile-Id', response)
+
+    def test_profiles_are_browsable_in_admin(self):
+        """Test that staff can open a stored profile in the admin"""
+        response = self.client.get(self.url, HTTP_X_PROFILE_TOKEN=make_token(self.staff))
+        self.staff.is_superuser = True
+        self.staff.save()
+        self.client.login(username='staff', password='testpass123')
+        response = self.client.get(reverse('admin:main_app_profilerecord_change', args=[response['X-Profile-Id']]))
+        self.assertContains(response, 'Slowest queries')
+        self.assertContains(response, 'main_app_memorial')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+        self.url = reverse('memorial_detail', kwargs={'slug': self.memorial.slug})
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_memorial_page_answers_304_without_rendering(self):
+        """Test that a repeat visit is answered from the validators alone"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.revalidate(self.url, response)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(repeat.content, b'')
+
+        repeat = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(repeat.status_code, 304)
+
+    def test_share_card_changes_the_etag(self):
+        """Test that a page cached before its share card was drawn is sent again afterwards"""
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        with override_settings(MEDIA_ROOT=media_root.name):
+            response = self.client.get(self.url)
+            self.assertEqual(self.revalidate(self.url, response).status_code, 304)
+            share_cards.render_share_cards([self.memorial.pk])
+            repeat = self.revalidate(self.url, response)
+            self.assertEqual(repeat.status_code, 200)
+            self.assertContains(repeat, f'/media/share_cards/{self.memorial.pk}/')
+            self.assertEqual(self.revalidate(self.url, repeat).status_code, 304)
+
+    def test_posts_skip_validator_query(self):
+        """Test that contributions do not pay for the validator aggregate"""
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {'donate': '1'})
+        self.assertRedirects(response, self.url, fetch_redirect_response=False)
+        self.assertFalse([query for query in queries if 'MAX(' in query['sql'].upper()])
+
+    @override_settings(LISTING_VERSION_TIMEOUT=None)
+    def test_listing_etag_kept_without_writes(self):
+        """Test that with no expiry the listing ETag only moves on when something changes"""
+        response = self.client.get(reverse('explore'))
+        with mock.patch('main_app.conditional._now_us', return_value=(timezone.now().timestamp() + 3600) * 1e6):
+            self.assertEqual(self.revalidate(reverse('explore'), response).status_code, 304)
+            self.memorial.name = 'Renamed Person'
+            self.memorial.save()
+            self.assertEqual(self.revalidate(reverse('explore'), response).status_code, 200)
+
+    def test_memorial_changes_invalidate_the_etag(self):
+        """Test that edits and new memories change the memorial page ETag"""
+        response = self.client.get(self.url)
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='text', content='Remembered')
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+        response = self.client.get(self.url)
+        self.memorial.bio = 'Updated'
+        self.memorial.save()
+        self.assertEqual(self.revalidate(self.url, response).status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        """Test that logging in or pending messages always render the page"""
+        response = self.client.get(self.url)
+        self.client.login(username='owner', password='testpass123')
+        logged_in = self.revalidate(self.url, response)
+        self.assertEqual(logged_in.status_code, 200)
+        self.assertNotIn('Last-Modified', logged_in)
+        # Rendering the page's forms set the CSRF cookie, which is part of the ETag
+        logged_in = self.revalidate(self.url, logged_in)
+        self.assertEqual(logged_in.status_code, 200)
+        self.assertEqual(self.revalidate(self.url, logged_in).status_code, 304)
+
+        self.client.post(self.url, {'donate': '1'})
+        # The donation changed the memorial and a success message is waiting
+        self.assertContains(self.revalidate(self.url, logged_in), 'Thank you for your donation!')
+
+    def test_private_memorial_is_never_validated(self):
+        """Test that private memorials still redirect visitors"""
+        self.memorial.visibility = 'private'
+        self.memorial.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='*')
+        self.assertRedirects(response, reverse('explore'), fetch_redirect_response=False)
+
+    def test_listings_use_version_stamp(self):
+        """Test that home and explore revalidate against the listing version"""
+        for url in (reverse('home'), reverse('explore')):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.revalidate(url, response).status_code, 304)
+            self.assertEqual(len(queries), 0)
+
+        response = self.client.get(reverse('explore'))
+        Memorial.objects.create(owner=self.user.userprofile, name='Another Person')
+        self.assertEqual(self.revalidate(reverse('explore'), response).status_code, 200)
+
+        response = self.client.get(reverse('home'))
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='text', content='Remembered')
+        self.assertEqual(self.revalidate(reverse('home'), response).status_code, 200)
+
+    def test_autocomplete_etag(self):
+        """Test that unchanged autocomplete results are answered with 304"""
+        url = reverse('memorial_autocomplete') + '?q=test'
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+
+
+class VideoEmbedTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+
+    def test_parse_video_url(self):
+        """Test that YouTube and Vimeo links are recognized"""
+        cases = {
+            'https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s': ('youtube', 'dQw4w9WgXcQ'),
+            'https://youtu.be/dQw4w9WgXcQ?si=abc': ('youtube', 'dQw4w9WgXcQ'),
+            'https://m.youtube.com/shorts/dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+            'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ': ('youtube', 'dQw4w9WgXcQ'),
+            'https://vimeo.com/76979871': ('vimeo', '76979871'),
+            'https://player.vimeo.com/video/76979871?h=1': ('vimeo', '76979871'),
+            'https://vimeo.com/channels/staffpicks/76979871': ('vimeo', '76979871'),
+            'https://www.youtube.com/watch?v=short': ('', ''),
+            'https://example.com/video.mp4': ('', ''),
+            '': ('', ''),
+        }
+        for url, expected in cases.items():
+            self.assertEqual(parse_video_url(url), expected, url)
+
+    def test_video_id_stored_on_save(self):
+        """Test that saving a memory stores the parsed video"""
+        memory = Memory.objects.create(memorial=self.memorial, author=self.user, type='video',
+                                       video_url='https://youtu.be/dQw4w9WgXcQ')
+        self.assertEqual((memory.video_provider, memory.video_id), ('youtube', 'dQw4w9WgXcQ'))
+        self.assertEqual(memory.video_embed_url, 'https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ?autoplay=1')
+
+        memory.video_url = 'https://example.com/clip'
+        memory.save()
+        self.assertEqual((memory.video_provider, memory.video_id), ('', ''))
+
+    def test_page_renders_facades_without_iframes(self):
+        """Test that video memories render click-to-load previews"""
+        for _ in range(3):
+            Memory.objects.create(memorial=self.memorial, author=self.user, type='video',
+                                  video_url='https://www.youtube.com/watch?v=dQw4w9WgXcQ')
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='video',
+                              video_url='https://example.com/clip')
+        response = self.client.get(reverse('memorial_detail', kwargs={'slug': self.memorial.slug}))
+        self.assertContains(response, 'data-embed-src="https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ', count=3)
+        self.assertContains(response, 'https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg', count=3)
+        self.assertContains(response, 'href="https://example.com/clip"')
+        self.assertNotContains(response, '<iframe')
+
+    def test_backfill_command(self):
+        """Test that the backfill command fills memories saved without parsing"""
+        memory = Memory.objects.create(memorial=self.memorial, author=self.user, type='video',
+                                       video_url='https://vimeo.com/76979871')
+        Memory.objects.filter(pk=memory.pk).update(video_provider='', video_id='')
+        out = StringIO()
+        call_command('backfill_video_ids', '--missing', stdout=out)
+        self.assertIn('Updated 1 of 1', out.getvalue())
+        memory.refresh_from_db()
+        self.assertEqual((memory.video_provider, memory.video_id), ('vimeo', '76979871'))
+
+
+class ContentAddressedStorageTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def photo(self, color=(200, 30, 30)):
+        output = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(output, 'JPEG')
+        return SimpleUploadedFile('Family Photo.JPG', output.getvalue(), content_type='image/jpeg')
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root.name).replace(os.sep, '/')
+            for root, _dirs, files in os.walk(self.media_root.name) for name in files
+        )
+
+    def test_identical_uploads_share_one_file(self):
+        """Test that files are named by content hash and stored once"""
+        first = Memorial.objects.create(owner=self.user.userprofile, name='First', cover_image=self.photo())
+        second = Memorial.objects.create(owner=self.user.userprofile, name='Second', cover_image=self.photo())
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertRegex(first.cover_image.name, r'^blobs/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.jpg$')
+        self.assertEqual(self.stored_files(), [first.cover_image.name])
+        self.assertEqual(MediaBlob.objects.get(name=first.cover_image.name).refs, 2)
+
+    def test_file_removed_after_last_reference(self):
+        """Test that deleting rows only removes the file once it is unused"""
+        first = Memorial.objects.create(owner=self.user.userprofile, name='First', cover_image=self.photo())
+        memory = Memory.objects.create(memorial=first, author=self.user, type='image', image=self.photo())
+        name = first.cover_image.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            memory.delete()
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+        self.assertEqual(self.stored_files(), [name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertFalse(MediaBlob.objects.exists())
+        self.assertEqual(self.stored_files(), [])
+
+    def test_upload_racing_last_release_keeps_file(self):
+        """Test that the same content uploaded before a release commits keeps its file"""
+        first = Memorial.objects.create(owner=self.user.userprofile, name='First', cover_image=self.photo())
+        name = first.cover_image.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            first.delete()
+        # The row stays, at no references, until the release has committed
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 0)
+        second = Memorial.objects.create(owner=self.user.userprofile, name='Second', cover_image=self.photo())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(second.cover_image.name, name)
+        self.assertEqual(MediaBlob.objects.get(name=name).refs, 1)
+        self.assertEqual(self.stored_files(), [name])
+
+        # A release that removed the file first leaves the next upload to write it again
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        third = Memorial.objects.create(owner=self.user.userprofile, name='Third', cover_image=self.photo())
+        self.assertEqual(self.stored_files(), [third.cover_image.name])
+
+    def test_replaced_file_is_released(self):
+        """Test that replacing or clearing an image drops its reference"""
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='First', cover_image=self.photo())
+        old_name = memorial.cover_image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            memorial.cover_image = self.photo(color=(30, 30, 200))
+            memorial.save()
+        self.assertNotEqual(memorial.cover_image.name, old_name)
+        self.assertEqual(self.stored_files(), [memorial.cover_image.name])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            memorial.cover_image = None
+            memorial.save()
+        self.assertEqual(self.stored_files(), [])
+
+        # Saves that leave the image alone do not look it up again
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='Second', cover_image=self.photo())
+        memorial = Memorial.objects.get(pk=memorial.pk)
+        with CaptureQueriesContext(connection) as queries:
+            memorial.donations_count += 1
+            memorial.save()
+        self.assertEqual(len(queries), 1)
+
+    def test_migrate_media_command(self):
+        """Test that existing uploads are moved into content-addressed storage"""
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='Legacy')
+        os.makedirs(os.path.join(self.media_root.name, 'memorial_covers'))
+        with open(os.path.join(self.media_root.name, 'memorial_covers', 'legacy.jpg'), 'wb') as handle:
+            handle.write(self.photo().read())
+        Memorial.objects.filter(pk=memorial.pk).update(cover_image='memorial_covers/legacy.jpg')
+        Memorial.objects.create(owner=self.user.userprofile, name='Missing')
+        Memorial.objects.filter(name='Missing').update(cover_image='memorial_covers/gone.jpg')
+
+        out, err = StringIO(), StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('migrate_media_to_cas', stdout=out, stderr=err)
+        self.assertIn('Moved 1 Memorial.cover_image file(s), 1 missing', out.getvalue())
+        self.assertIn('memorial_covers/gone.jpg', err.getvalue())
+
+        memorial.refresh_from_db()
+        self.assertTrue(memorial.cover_image.name.startswith('blobs/'))
+        self.assertEqual(self.stored_files(), [memorial.cover_image.name])
+        self.assertEqual(MediaBlob.objects.get(name=memorial.cover_image.name).refs, 1)
+
+
+class StaticBundleTest(TestCase):
+    def test_flatten_css_inlines_imports_and_rebases_urls(self):
+        """Test that local @imports are inlined with their url()s rebased"""
+        files = {
+            'css/main.css': "@import url('base/a.css');\n@import 'https://example.com/x.css';\nbody { color: red; }\n",
+            'css/base/a.css': "@import \"b.css\";\n.a { background: url('../../img/logo.jpeg'); }\n",
+            'css/base/b.css': ".b { background: url(data:image/png;base64,AAAA); }\n",
+        }
+        css = flatten_css(files.__getitem__, 'css/main.css')
+        self.assertNotIn("@import url('base/a.css')", css)
+        self.assertIn('@import \'https://example.com/x.css\';', css)
+        self.assertIn('url("../img/logo.jpeg")', css)
+        self.assertIn('url(data:image/png;base64,AAAA)', css)
+        self.assertLess(css.index('.b {'), css.index('.a {'))
+        self.assertEqual(minify_css('/* note */\na  >  b ,\nc {\n  content: "a  ;  b";\n}\n'),
+                         'a>b,c{content: "a  ;  b"}\n')
+
+    def test_minify_css_keeps_comment_markers_in_strings(self):
+        """Test that comment markers inside strings survive and quotes inside comments do not start strings"""
+        css = 'a { content: "/* x */"; }\n/* it\'s */ b { content: \'*/\'; }\n/*! kept */\n'
+        self.assertEqual(minify_css(css), 'a{content: "/* x */"}b{content: \'*/\'}/*! kept */\n')
+
+    def test_minify_js_keeps_semantics(self):
+        """Test that strings, regexes, division and line breaks survive minification"""
+        source = (
+            "// comment\n"
+            "const url = 'http://example.com'; /* block */\n"
+            "let ratio = total / count / 2;\n"
+            "const pattern = /\\/\\*[a-z/]+$/gi;\n"
+            "let a = b\n"
+            "++c\n"
+            "return /x/.test(s) ? a - -b : `tpl // ${a}`;\n"
+        )
+        self.assertEqual(minify_js(source), (
+            # Spaces around '/' stay, so a division can never turn into a comment
+            "const url='http://example.com';let ratio=total / count / 2;"
+            "const pattern=/\\/\\*[a-z/]+$/gi;let a=b\n"
+            "++c\n"
+            "return /x/.test(s)?a - -b:`tpl // ${a}`;\n"
+        ))
+
+    def test_collectstatic_builds_fingerprinted_bundles(self):
+        """Test that collectstatic bundles, minifies, hashes and compresses"""
+        with tempfile.TemporaryDirectory() as static_root, \
+                override_settings(STATIC_ROOT=static_root, DEBUG=False):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            from django.contrib.staticfiles.storage import staticfiles_storage
+            bundle_url = staticfiles_storage.url('css/main.css')
+            self.assertRegex(bundle_url, r'^/static/css/main\.[0-9a-f]{12}\.css$')
+            bundle_path = os.path.join(static_root, bundle_url[len('/static/'):])
+            with open(bundle_path) as handle:
+                bundle = handle.read()
+            self.assertNotIn('@import', bundle)
+            self.assertIn('--color-primary:', bundle)
+            self.assertIn('.btn', bundle)
+            self.assertTrue(os.path.exists(bundle_path + '.gz'))
+
+            script_url = staticfiles_storage.url('js/main-enhanced.js')
+            with open(os.path.join(static_root, script_url[len('/static/'):])) as handle:
+                script = handle.read()
+            self.assertNotIn('// ', script.split('`')[0])
+            self.assertLess(len(script), os.path.getsize(os.path.join(settings.BASE_DIR, 'static/js/main-enhanced.js')))
+
+            html = Template("{% load static %}{% static 'css/main.css' %} {% static 'js/main-enhanced.js' %}").render(Context())
+            self.assertEqual(html, f'{bundle_url} {script_url}')
+
+    def test_static_urls_without_manifest(self):
+        """Test that templates still render before collectstatic has run"""
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '/static/css/main.css')
+        self.assertContains(response, '/static/js/main-enhanced.js"')
+
+
+class AnniversaryTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.today = timezone.localdate()
+
+    def years_ago(self, years, day=None):
+        # Multiples of four keep 29 February valid
+        day = day or self.today
+        return day.replace(year=day.year - years)
+
+    def test_month_day_stored_on_save(self):
+        """Test that month-day columns are kept in step with the dates"""
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person', dob='1950-10-19')
+        self.assertEqual((memorial.dob_md, memorial.dod_md), (1019, None))
+        memorial.dod = date(2001, 3, 4)
+        memorial.save()
+        memorial.refresh_from_db()
+        self.assertEqual((memorial.dob_md, memorial.dod_md), (1019, 304))
+
+    def test_home_lists_todays_anniversaries(self):
+        """Test that public memorials with an anniversary today are featured"""
+        profile = self.user.userprofile
+        born = Memorial.objects.create(owner=profile, name='Born Today', dob=self.years_ago(80))
+        passed = Memorial.objects.create(owner=profile, name='Passed Today', dob=date(1930, 1, 1), dod=self.years_ago(4))
+        Memorial.objects.create(owner=profile, name='Private Today', dob=self.years_ago(72), visibility='private')
+        Memorial.objects.create(owner=profile, name='Another Day', dob=self.years_ago(60, self.today + timedelta(days=3)))
+
+        response = self.client.get(reverse('home'))
+        content = response.content.decode()
+        section = content[content.index('id="on-this-day-heading"'):content.index('<!-- Featured Memorials')]
+        self.assertIn('Born Today', section)
+        self.assertIn('Born\n                                80 years ago today', section)
+        self.assertIn('Passed away\n                                4 years ago today', section)
+        self.assertNotIn('Private Today', section)
+        self.assertNotIn('Another Day', section)
+        self.assertEqual(anniversary_ids(self.today), sorted([born.pk, passed.pk]))
+
+    def test_anniversary_ids_are_cached_until_changed(self):
+        """Test that the lookup is cached and dropped when dates change"""
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person', dob=self.years_ago(48))
+        self.assertEqual(todays_anniversary_ids(), [memorial.pk])
+        with self.assertNumQueries(0):
+            todays_anniversary_ids()
+
+        memorial.donations_count += 1
+        memorial.save()
+        with self.assertNumQueries(0):
+            todays_anniversary_ids()
+
+        memorial.dob = self.years_ago(48, self.today + timedelta(days=1))
+        memorial.save()
+        self.assertEqual(todays_anniversary_ids(), [])
+
+    def test_home_rechecks_cached_ids(self):
+        """Test that ids cached before a memorial was hidden or its dates cleared are not featured"""
+        profile = self.user.userprofile
+        hidden = Memorial.objects.create(owner=profile, name='Hidden Later', dob=self.years_ago(40))
+        cleared = Memorial.objects.create(owner=profile, name='Cleared Later', dob=self.years_ago(44))
+        self.assertEqual(sorted(todays_anniversary_ids()), sorted([hidden.pk, cleared.pk]))
+        # As another worker would see it: the rows change but its cached ids do not
+        Memorial.objects.filter(pk=hidden.pk).update(visibility='private')
+        Memorial.objects.filter(pk=cleared.pk).update(dob=None, dob_md=None)
+
+        response = self.client.get(reverse('home'))
+        self.assertEqual(response.status_code, 200)
+        # The section is left out when nothing is featured
+        self.assertNotContains(response, 'id="on-this-day-heading"')
+        self.assertIsNone(describe(Memorial(name='No Dates'), self.today))
+
+    def test_leap_day_and_midnight(self):
+        """Test leap-day handling and the cache lifetime"""
+        self.assertEqual(month_days(date(2025, 2, 28)), [228, 229])
+        self.assertEqual(month_days(date(2024, 2, 28)), [228])
+        now = timezone.make_aware(datetime(2026, 10, 19, 23, 59, 30))
+        self.assertEqual(seconds_until_midnight(now), 30)
+
+    def test_lookup_uses_index(self):
+        """Test that the anniversary query reads the month-day indexes"""
+        with CaptureQueriesContext(connection) as queries:
+            anniversary_ids(self.today)
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('memorial_public_dob_md_idx', plan)
+        self.assertIn('memorial_public_dod_md_idx', plan)
+
+
+class BackupRestoreTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Noor Jehan',
+                                                dob='1926-09-21', bio='Singer and actress')
+        Memorial.objects.filter(pk=self.memorial.pk).update(cover_image='blobs/ab/cd/abcd.jpg')
+        self.memory = Memory.objects.create(memorial=self.memorial, author=self.user, type='text',
+                                            content='Her songs filled our home')
+
+    def backup(self, name='full', *args):
+        path = os.path.join(self.directory.name, name)
+        call_command('backup', path, *args, stdout=StringIO())
+        return path
+
+    def read_rows(self, path, label):
+        with gzip.open(os.path.join(path, f'{label}.jsonl.gz'), 'rt') as handle:
+            return [json.loads(line) for line in handle]
+
+    def test_backup_writes_manifest_and_rows(self):
+        """Test that each model is written as JSON lines described by the manifest"""
+        path = self.backup()
+        with open(os.path.join(path, 'manifest.json')) as handle:
+            manifest = json.load(handle)
+        entries = {entry['model']: entry for entry in manifest['models']}
+        self.assertEqual(list(entries), ['auth.user', 'main_app.userprofile', 'main_app.memorial', 'main_app.memory',
+                                         'main_app.activity'])
+        self.assertEqual(entries['main_app.memorial']['rows'], 1)
+        row = dict(zip(entries['main_app.memorial']['columns'], self.read_rows(path, 'main_app.memorial')[0]))
+        self.assertEqual((row['name'], row['owner_id'], row['dob']), ('Noor Jehan', self.user.userprofile.pk, '1926-09-21'))
+
+    def test_restore_round_trip(self):
+        """Test that a restore brings back rows, timestamps, trigrams and file references"""
+        path = self.backup()
+        created_at = Memorial.objects.get().created_at
+        User.objects.all().delete()
+        self.assertFalse(Memorial.objects.exists())
+
+        output = StringIO()
+        call_command('restore', path, '--batch-size', '1', stdout=output)
+        self.assertIn('rows/s', output.getvalue())
+        memorial = Memorial.objects.get()
+        self.assertEqual((memorial.pk, memorial.name, memorial.search_name), (self.memorial.pk, 'Noor Jehan', 'noor jehan'))
+        self.assertEqual(memorial.created_at, created_at)
+        self.assertEqual(memorial.dob, date(1926, 9, 21))
+        self.assertEqual(Memory.objects.get().content, 'Her songs filled our home')
+        self.assertTrue(User.objects.get().check_password('testpass123'))
+        self.assertTrue(MemorialTrigram.objects.filter(memorial=memorial).exists())
+        self.assertEqual(MediaBlob.objects.get(name='blobs/ab/cd/abcd.jpg').refs, 1)
+        self.assertEqual(Activity.objects.get().memory_id, self.memory.pk)
+
+    def test_restore_keeps_feed_order_and_contributions(self):
+        """Test that feed entries come back with their ids and times, contributions included"""
+        activity.record_contribution(self.memorial, self.user, 'donation')
+        activity.record_contribution(self.memorial, self.user, 'tree')
+        before = list(Activity.objects.values_list('pk', 'kind', 'memory_id', 'created_at'))
+        path = self.backup()
+        User.objects.all().delete()
+        self.assertFalse(Activity.objects.exists())
+
+        call_command('restore', path, stdout=StringIO())
+        self.assertEqual(list(Activity.objects.values_list('pk', 'kind', 'memory_id', 'created_at')), before)
+        self.assertEqual([entry['kind'] for entry in activity.feed()], ['tree', 'donation', 'memory'])
+
+    def test_incremental_backup_applies_over_full(self):
+        """Test that an incremental backup holds only newer rows and overwrites on restore"""
+        full = self.backup()
+        since = timezone.now()
+        other = Memorial.objects.create(owner=self.user.userprofile, name='Old Memorial')
+        Memorial.objects.filter(pk=other.pk).update(updated_at=since - timedelta(days=1))
+        self.memorial.name = 'Noor Jahan'
+        self.memorial.save()
+        incremental = self.backup('incremental', '--since', since.isoformat())
+        self.assertEqual([row[0] for row in self.read_rows(incremental, 'main_app.memorial')], [self.memorial.pk])
+        self.assertEqual(self.read_rows(incremental, 'main_app.memory'), [])
+
+        Memorial.objects.filter(pk=self.memorial.pk).update(name='Changed Locally')
+        call_command('restore', full, stdout=StringIO())
+        self.assertEqual(Memorial.objects.get(pk=self.memorial.pk).name, 'Noor Jehan')
+        call_command('restore', incremental, stdout=StringIO())
+        self.assertEqual(Memorial.objects.get(pk=self.memorial.pk).name, 'Noor Jahan')
+        self.assertEqual(Memorial.objects.count(), 2)
+
+    def test_backup_refuses_non_empty_directory(self):
+        """Test that a backup never mixes its files with existing ones"""
+        path = self.backup()
+        with self.assertRaises(CommandError):
+            call_command('backup', path, stdout=StringIO())
+
+
+@unittest.skipUnless(importlib.util.find_spec('jinja2'), 'Jinja2 is not installed')
+class JinjaTemplatesTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Noor <Jehan>', dob='1926-09-21',
+                                                dod='2000-12-23', bio='A voice\n\nfor & of the people')
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='text', content='First line\nsecond')
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='video',
+                              video_url='https://youtu.be/dQw4w9WgXcQ')
+
+    def render_both(self, url):
+        pages = []
+        for engine in ('django', 'jinja2'):
+            with override_settings(PAGE_TEMPLATE_ENGINE=engine):
+                content = self.client.get(url).content.decode()
+            # Tokens are masked differently on every render
+            content = re.sub(r'name="csrfmiddlewaretoken" value="[^"]+"', '', content)
+            pages.append(re.sub(r'\s+', ' ', content).strip())
+        return pages
+
+    def test_jinja_pages_match_django(self):
+        """Test that the Jinja2 ports render the same markup as the Django templates"""
+        self.client.login(username='testuser', password='testpass123')
+        for url in (reverse('explore'), reverse('explore') + '?search=noor', self.memorial.get_absolute_url()):
+            django_page, jinja_page = self.render_both(url)
+            self.assertIn('Noor &lt;Jehan&gt;', jinja_page)
+            self.assertEqual(django_page, jinja_page, url)
+
+    def test_jinja_pages_render_jinja_cards(self):
+        """Test that Jinja2 pages render and cache their cards with the Jinja2 card template"""
+        memorial = memorial_cards(Memorial.objects.filter(pk=self.memorial.pk)).get()
+        with mock.patch('main_app.cards.get_template', wraps=get_template) as loader:
+            with override_settings(PAGE_TEMPLATE_ENGINE='jinja2'):
+                self.client.get(reverse('explore'))
+        loader.assert_called_once_with('main_app/includes/memorial_card.html', using='jinja2')
+        self.assertIsNotNone(cache.get(card_key(memorial, using='jinja2')))
+        self.assertIsNone(cache.get(card_key(memorial)))
+
+    def test_benchmark_command(self):
+        """Test that the benchmark renders with both engines"""
+        output = StringIO()
+        call_command('benchmark_templates', '--cards', '3,5', '--repeat', '1', stdout=output)
+        self.assertEqual(len(output.getvalue().splitlines()), 3)
+
+
+class ActivityFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Noor Jehan')
+
+    def share(self, content, memorial=None):
+        return Memory.objects.create(memorial=memorial or self.memorial, author=self.user, type='text', content=content)
+
+    def test_memories_and_contributions_enter_feed(self):
+        """Test that memories and contributions are recorded, newest first"""
+        self.share('Her songs filled our home')
+        self.client.login(username='testuser', password='testpass123')
+        self.client.post(self.memorial.get_absolute_url(), {'donate': '1'})
+        private = Memorial.objects.create(owner=self.user.userprofile, name='Private One', visibility='private')
+        self.share('Not for everyone', private)
+
+        entries = activity.feed()
+        self.assertEqual([(entry['kind'], entry['memorial_name']) for entry in entries],
+                         [('donation', 'Noor Jehan'), ('memory', 'Noor Jehan')])
+        self.assertEqual(entries[1]['summary'], 'Her songs filled our home')
+        self.assertEqual(entries[1]['actor_name'], 'testuser')
+
+    def test_memorial_changes_update_feed(self):
+        """Test that renames, visibility changes and deletes reach the cached feed"""
+        memory = self.share('First')
+        self.assertEqual(len(activity.feed()), 1)
+
+        self.memorial.name = 'Noor Jahan'
+        self.memorial.save()
+        self.assertEqual(activity.feed()[0]['memorial_name'], 'Noor Jahan')
+
+        self.memorial.visibility = 'private'
+        self.memorial.save()
+        self.assertEqual(activity.feed(), [])
+        self.memorial.visibility = 'public'
+        self.memorial.save()
+        self.assertEqual(len(activity.feed()), 1)
+
+        memory.delete()
+        self.assertEqual(activity.feed(), [])
+        self.share('Second')
+        self.memorial.delete()
+        self.assertEqual(activity.feed(), [])
+
+    @override_settings(ACTIVITY_HEAD_SIZE=3)
+    def test_keyset_pagination_past_cached_head(self):
+        """Test that the API pages through the head and then the table without gaps"""
+        for i in range(7):
+            self.share(f'Memory {i}')
+        url = reverse('activity_feed') + '?limit=2'
+        summaries = []
+        while url:
+            data = self.client.get(url).json()
+            summaries += [entry['summary'] for entry in data['results']]
+            url = data['next']
+        self.assertEqual(summaries, [f'Memory {i}' for i in reversed(range(7))])
+        self.assertEqual(self.client.get(reverse('activity_feed') + '?before=x').status_code, 400)
+
+    def test_first_page_served_from_cache_with_index(self):
+        """Test that the head is cached and read through the partial index"""
+        self.share('First')
+        with CaptureQueriesContext(connection) as queries:
+            activity.feed()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[-1]['sql'])
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertIn('activity_public_feed_idx', plan)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(activity.feed()), 1)
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Recent Tributes')
+
+
+class MemorialCardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Noor Jehan', bio='Singer')
+
+    def card(self):
+        return memorial_cards(Memorial.objects.filter(pk=self.memorial.pk)).get()
+
+    def test_cards_cached_under_versioned_key(self):
+        """Test that a rendered card is reused until the memorial changes"""
+        render_cards([self.card()])
+        key = card_key(self.card())
+        self.assertIn('Noor Jehan', cache.get(key))
+        cache.set(key, 'cached card')
+        self.assertEqual(render_cards([self.card()]), ['cached card'])
+
+        self.memorial.donations_count += 1
+        self.memorial.save()
+        self.assertNotEqual(card_key(self.card()), key)
+        key = card_key(self.card())
+        Memory.objects.create(memorial=self.memorial, author=self.user, type='text', content='Hello')
+        self.assertNotEqual(card_key(self.card()), key)
+
+    def test_listings_fetch_cards_in_one_call(self):
+        """Test that each listing reads all of its cards with a single get_many"""
+        Memorial.objects.create(owner=self.user.userprofile, name='Second Person')
+        self.client.login(username='testuser', password='testpass123')
+        for url, layout in ((reverse('explore'), 'grid'), (reverse('dashboard'), 'compact'), (reverse('home'), 'featured')):
+            with mock.patch('main_app.cards.cache') as cards_cache:
+                cards_cache.get_many.return_value = {}
+                response = self.client.get(url)
+            self.assertContains(response, 'Second Person')
+            cards_cache.get_many.assert_called_once()
+            keys = cards_cache.get_many.call_args.args[0]
+            self.assertEqual(len(keys), 2)
+            self.assertTrue(all(f':{layout}' in key for key in keys))
+            self.assertEqual(set(cards_cache.set_many.call_args.args[0]), set(keys))
+
+    def test_featured_card_loads_first_image_eagerly(self):
+        """Test that the carousel keeps loading only its first image eagerly"""
+        Memorial.objects.filter(pk=self.memorial.pk).update(cover_image='blobs/ab/cd/abcd.jpg')
+        other = Memorial.objects.create(owner=self.user.userprofile, name='Second Person')
+        Memorial.objects.filter(pk=other.pk).update(cover_image='blobs/ef/gh/efgh.jpg')
+        first, second = render_cards(memorial_cards(Memorial.objects.order_by('pk')), 'featured', eager_first=True)
+        self.assertIn('loading="eager"', first)
+        self.assertIn('loading="lazy"', second)
+        self.assertIn('data-src=', second)
+
+
+class RequestProfileTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+
+    def profile_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        # Queries reading users or profiles directly, rather than joined to memorials
+        return response, [query['sql'] for query in queries
+                          if 'FROM "auth_user"' in query['sql'] or 'FROM "main_app_userprofile"' in query['sql']]
+
+    def test_user_and_profile_loaded_in_one_query(self):
+        """Test that the profile comes joined to the user and is reused by views and templates"""
+        response, queries = self.profile_queries(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertIn('main_app_userprofile', queries[0])
+
+    def test_owner_checks_use_owner_id(self):
+        """Test that ownership is decided without loading the owner"""
+        self.memorial.visibility = 'private'
+        self.memorial.save()
+        for url in (self.memorial.get_absolute_url(), reverse('edit_memorial', args=[self.memorial.slug])):
+            response, queries = self.profile_queries(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(queries), 1, url)
+
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_login(other)
+        response = self.client.get(reverse('edit_memorial', args=[self.memorial.slug]))
+        self.assertRedirects(response, self.memorial.get_absolute_url(), fetch_redirect_response=False)
+        response = self.client.get(self.memorial.get_absolute_url())
+        self.assertRedirects(response, reverse('explore'), fetch_redirect_response=False)
+
+    def test_missing_profile_and_legacy_sessions(self):
+        """Test that missing profiles are created and older sessions stay signed in"""
+        UserProfile.objects.filter(user=self.user).delete()
+        self.client.force_login(self.user, backend='django.contrib.auth.backends.ModelBackend')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(UserProfile.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.session['_auth_user_backend'], 'main_app.auth.ProfileBackend')
+
+
+class SlugResolverTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+        self.hidden = Memorial.objects.create(owner=self.user.userprofile, name='Hidden Person', visibility='private')
+
+    def test_resolve_is_cached_and_follows_changes(self):
+        """Test that lookups are served from the cache until the slug or visibility changes"""
+        resolved = slugs.resolve(self.memorial.slug)
+        self.assertEqual(resolved, (self.memorial.pk, 'public', self.user.userprofile.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(slugs.resolve(self.memorial.slug), resolved)
+        self.assertIsNone(slugs.resolve('nobody'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(slugs.resolve('nobody'))
+
+        self.memorial.visibility = 'private'
+        self.memorial.save(update_fields=['visibility'])
+        self.assertEqual(slugs.resolve(self.memorial.slug).visibility, 'private')
+
+        old_slug = self.memorial.slug
+        self.memorial.slug = 'renamed-person'
+        self.memorial.save(update_fields=['slug'])
+        self.assertIsNone(slugs.resolve(old_slug))
+        self.assertEqual(slugs.resolve('renamed-person').pk, self.memorial.pk)
+
+        self.memorial.delete()
+        self.assertIsNone(slugs.resolve('renamed-person'))
+
+    def test_owner_change_moves_private_access(self):
+        """Test that a private memorial follows its new owner once it is handed over"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(self.hidden.get_absolute_url()).status_code, 200)
+
+        self.hidden.owner = other.userprofile
+        self.hidden.save()
+        response = self.client.get(self.hidden.get_absolute_url())
+        self.assertRedirects(response, reverse('explore'), fetch_redirect_response=False)
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.hidden.get_absolute_url()).status_code, 200)
+
+    def test_pages_resolve_slugs_from_cache(self):
+        """Test that turning visitors away needs no query for the memorial"""
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_login(other)
+        for name in ('edit_memorial', 'delete_memorial'):
+            url = reverse(name, args=[self.memorial.slug])
+            self.client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertRedirects(response, self.memorial.get_absolute_url(), fetch_redirect_response=False)
+            self.assertFalse([query for query in queries if 'FROM "main_app_memorial"' in query['sql']])
+        self.assertEqual(self.client.get(reverse('edit_memorial', args=['nobody'])).status_code, 404)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('edit_memorial', args=[self.memorial.slug]))
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.hidden.get_absolute_url())
+        self.assertEqual(response.status_code, 200)
+
+    def test_copy_link_reads_no_memorial_row(self):
+        """Test that copying a cached link runs no queries"""
+        payload = json.dumps({'slug': self.memorial.slug})
+        self.client.post(reverse('copy_link'), payload, content_type='application/json')
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('copy_link'), payload, content_type='application/json')
+        self.assertEqual(response.json()['link'], 'http://testserver' + self.memorial.get_absolute_url())
+        payload = json.dumps({'slug': 'nobody'})
+        self.assertEqual(self.client.post(reverse('copy_link'), payload, content_type='application/json').status_code, 404)
+
+    def test_copy_links_resolves_many_slugs_in_one_query(self):
+        """Test that the batch endpoint looks up all slugs at once and hides private memorials"""
+        for index in range(5):
+            Memorial.objects.create(owner=self.user.userprofile, name=f'Person {index}')
+        requested = list(Memorial.objects.values_list('slug', flat=True)) + ['nobody']
+        payload = json.dumps({'slugs': requested})
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('copy_links'), payload, content_type='application/json')
+        links = response.json()['links']
+        self.assertEqual(list(links), requested)
+        self.assertEqual(links[self.memorial.slug], 'http://testserver' + self.memorial.get_absolute_url())
+        self.assertIsNone(links[self.hidden.slug])
+        self.assertIsNone(links['nobody'])
+        with self.assertNumQueries(0):
+            self.client.post(reverse('copy_links'), payload, content_type='application/json')
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('copy_links'), payload, content_type='application/json')
+        self.assertIsNotNone(response.json()['links'][self.hidden.slug])
+
+        for body in ({'slugs': 'not-a-list'}, {'slugs': [1]}, {'slugs': ['a'] * (settings.COPY_LINKS_MAX_SLUGS + 1)}):
+            response = self.client.post(reverse('copy_links'), json.dumps(body), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(JOBS_EAGER=True)
+class ShareCardTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def cards(self, memorial):
+        directory = os.path.join(self.media_root.name, 'share_cards', str(memorial.pk))
+        return sorted(os.listdir(directory)) if os.path.isdir(directory) else []
+
+    def test_card_is_composed_from_memorial(self):
+        """Test that cards are 1200x630 JPEGs with and without a cover photo"""
+        output = io.BytesIO()
+        Image.new('RGB', (800, 400), (200, 30, 30)).save(output, 'JPEG')
+        cover = SimpleUploadedFile('cover.jpg', output.getvalue(), content_type='image/jpeg')
+        memorial = Memorial.objects.create(
+            owner=self.user.userprofile, name='A Person With A Rather Long Name To Wrap',
+            dob=date(1940, 1, 1), dod=date(2020, 5, 5), cover_image=cover,
+        )
+        for shown in (memorial, Memorial(pk=memorial.pk, name='No Cover')):
+            with Image.open(io.BytesIO(share_cards.render_card(shown))) as card:
+                self.assertEqual((card.format, card.size), ('JPEG', (1200, 630)))
+        self.assertNotEqual(share_cards.card_name(memorial), share_cards.card_name(Memorial(pk=memorial.pk, name='No Cover')))
+
+    def test_cards_follow_memorial_changes(self):
+        """Test that cards are drawn after commit, replaced on edits and removed with the memorial"""
+        with self.captureOnCommitCallbacks(execute=True):
+            memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+        first = self.cards(memorial)
+        self.assertEqual(len(first), 1)
+        response = self.client.get(memorial.get_absolute_url())
+        url = f'http://testserver/media/share_cards/{memorial.pk}/{first[0]}'
+        self.assertContains(response, f'<meta property="og:image" content="{url}">', html=True)
+        self.assertContains(response, f'<meta name="twitter:image" content="{url}">', html=True)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            memorial.donations_count += 1
+            memorial.save(update_fields=['donations_count'])
+        self.assertEqual(callbacks, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            memorial.name = 'Renamed Person'
+            memorial.save()
+        second = self.cards(memorial)
+        self.assertEqual(len(second), 1)
+        self.assertNotEqual(first, second)
+
+        pk = memorial.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            memorial.delete()
+        self.assertFalse(os.path.exists(os.path.join(self.media_root.name, 'share_cards', str(pk))))
+
+    def test_backfill_command(self):
+        """Test that backfill_share_cards draws cards for existing memorials"""
+        memorial = Memorial.objects.create(owner=self.user.userprofile, name='Test Person')
+        self.assertEqual(self.cards(memorial), [])
+        out = StringIO()
+        call_command('backfill_share_cards', stdout=out)
+        self.assertIn('Queued share cards for 1 memorials', out.getvalue())
+        self.assertEqual(self.cards(memorial), [os.path.basename(share_cards.card_name(memorial))])
+
+
+class DashboardBulkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        self.memorials = [Memorial.objects.create(owner=self.user.userprofile, name=f'Person {index}')
+                          for index in range(4)]
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.others = Memorial.objects.create(owner=other.userprofile, name='Not Mine')
+
+    def bulk(self, operation, memorials):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(reverse('dashboard_bulk'), {
+                    'operation': operation, 'memorials': [memorial.pk for memorial in memorials],
+                })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+        return [query['sql'] for query in queries]
+
+    def photo(self, color):
+        output = io.BytesIO()
+        Image.new('RGB', (40, 30), color).save(output, 'JPEG')
+        return SimpleUploadedFile('photo.jpg', output.getvalue(), content_type='image/jpeg')
+
+    def test_visibility_changed_in_one_update(self):
+        """Test that only the owner's memorials change, in a single UPDATE"""
+        self.assertEqual(slugs.resolve(self.memorials[0].slug).visibility, 'public')
+        queries = self.bulk('private', self.memorials + [self.others])
+        updates = [sql for sql in queries if sql.startswith('UPDATE "main_app_memorial"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(
+            set(Memorial.objects.filter(visibility='private').values_list('pk', flat=True)),
+            {memorial.pk for memorial in self.memorials},
+        )
+        # Caches keyed on visibility were invalidated together
+        self.assertEqual(slugs.resolve(self.memorials[0].slug).visibility, 'private')
+        self.assertContains(self.client.get(reverse('dashboard')), 'memorials made private', status_code=200)
+
+    def test_delete_releases_files_together(self):
+        """Test that deleting many memorials drops their file references in a few queries"""
+        for index, memorial in enumerate(self.memorials):
+            for shade in range(3):
+                Memory.objects.create(memorial=memorial, author=self.user, type='image',
+                                      image=self.photo((index * 40, shade * 40, 0)))
+        shared = self.photo((1, 2, 3))
+        Memory.objects.create(memorial=self.others, author=self.user, type='image', image=shared)
+        Memory.objects.create(memorial=self.memorials[0], author=self.user, type='image', image=self.photo((1, 2, 3)))
+        self.assertEqual(MediaBlob.objects.count(), 13)
+
+        queries = self.bulk('delete', self.memorials + [self.others])
+        self.assertEqual(len([sql for sql in queries if sql.startswith('UPDATE "main_app_mediablob"')]), 1)
+        self.assertEqual(list(Memorial.objects.all()), [self.others])
+        self.assertFalse(Activity.objects.exclude(memorial=self.others).exists())
+        # The photo also used by another user's memorial keeps its file
+        blob = MediaBlob.objects.get()
+        self.assertEqual(blob.refs, 1)
+        self.assertEqual(
+            [os.path.relpath(os.path.join(root, name), self.media_root.name).replace(os.sep, '/')
+             for root, _dirs, files in os.walk(os.path.join(self.media_root.name, 'blobs')) for name in files],
+            [blob.name],
+        )
+        self.assertIsNone(slugs.resolve(self.memorials[0].slug))
+
+    def test_changes_announced_after_commit(self):
+        """Test that caches are invalidated outside the transaction that made the change"""
+        depths = []
+
+        def record(sender, **kwargs):
+            depths.append(len(connection.atomic_blocks))
+
+        memorials_changed.connect(record)
+        self.addCleanup(memorials_changed.disconnect, record)
+        # The test case's own transactions
+        outside = len(connection.atomic_blocks)
+        self.bulk('private', self.memorials)
+        self.bulk('delete', self.memorials)
+        self.assertEqual(depths, [outside, outside])
+
+    def test_invalid_requests_change_nothing(self):
+        """Test that bulk actions need POST, a known action and a selection"""
+        self.assertEqual(self.client.get(reverse('dashboard_bulk')).status_code, 405)
+        self.bulk('archive', self.memorials)
+        self.bulk('delete', [])
+        self.assertEqual(Memorial.objects.count(), 5)
+        self.client.logout()
+        response = self.client.post(reverse('dashboard_bulk'), {'operation': 'delete', 'memorials': [self.others.pk]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Memorial.objects.count(), 5)
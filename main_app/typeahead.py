@@ -0,0 +1,78 @@
+"""
+Prefix autocomplete over normalized public memorial names.
+
+A query matches the start of any word of a name, so 'nusrat' suggests
+'Ustad Nusrat Fateh Ali Khan'. Each memorial stores its normalized name
+from every word to the end in MemorialNameSuffix, and a lookup is a range
+scan on the index over those suffixes. Names starting with the query come
+first, then the rest, each ordered by popularity. Results are cached per
+prefix and the whole cache is retired when a memorial is added, renamed,
+deleted or changes visibility; counter changes only reorder results, so
+those are picked up when the entries expire.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.dispatch import receiver
+
+from .models import Memorial, MemorialNameSuffix
+from .search import name_suffixes, normalize_name, prefix_q
+from .signals import memorials_changed
+
+VERSION_KEY = 'typeahead:version'
+RELEVANT_FIELDS = {'name', 'visibility'}
+
+
+def index_names(memorials):
+    """
+    Replace the stored name suffixes for the given memorials
+    """
+    memorials = list(memorials)
+    rows = [
+        MemorialNameSuffix(memorial_id=memorial.pk, suffix=suffix)
+        for memorial in memorials
+        for suffix in name_suffixes(memorial.name)
+    ]
+    with transaction.atomic():
+        MemorialNameSuffix.objects.filter(memorial__in=[memorial.pk for memorial in memorials]).delete()
+        MemorialNameSuffix.objects.bulk_create(rows, batch_size=5000)
+    return len(rows)
+
+
+@receiver(memorials_changed)
+def invalidate_suggestions(sender, pks, fields=None, **kwargs):
+    if fields is None or 'name' in fields:
+        index_names(Memorial.objects.filter(pk__in=pks).only('pk', 'name'))
+    if fields is None or fields & RELEVANT_FIELDS:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, 2, None)
+
+
+def suggest(query, limit=None):
+    """
+    Return up to ``limit`` public memorials with a word starting with ``query``
+    """
+    limit = min(limit or settings.TYPEAHEAD_DEFAULT_LIMIT, settings.TYPEAHEAD_MAX_LIMIT)
+    prefix = normalize_name(query)
+    if len(prefix) < settings.TYPEAHEAD_MIN_CHARS:
+        return []
+
+    version = cache.get_or_set(VERSION_KEY, 1, None)
+    key = f'typeahead:{version}:{limit}:{prefix}'
+    results = cache.get(key)
+    if results is None:
+        matches = MemorialNameSuffix.objects.filter(prefix_q('suffix', prefix)).values('memorial_id')
+        results = list(
+            Memorial.objects.filter(pk__in=matches, visibility='public')
+            .annotate(
+                starts=Case(When(prefix_q('search_name', prefix), then=Value(1)), default=Value(0)),
+                popularity=F('donations_count') + F('trees_planted_count'),
+            )
+            .order_by('-starts', '-popularity', 'search_name')
+            .values('name', 'slug')[:limit]
+        )
+        cache.set(key, results, settings.TYPEAHEAD_CACHE_TIMEOUT)
+    return results
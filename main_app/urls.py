@@ -1,12 +1,13 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import metrics, sitemaps, views
 
 urlpatterns = [
     # Main pages
     path('', views.home, name='home'),
     path('explore/', views.explore, name='explore'),
     path('dashboard/', views.user_dashboard, name='dashboard'),
+    path('dashboard/bulk/', views.dashboard_bulk, name='dashboard_bulk'),
     
     # Memorial pages
     path('memorial/new/', views.create_memorial, name='create_memorial'),
@@ -20,6 +21,16 @@ urlpatterns = [
     path('logout/', auth_views.LogoutView.as_view(), name='logout'),
     path('verify/', views.verify_email, name='verify_email'),
     
+    # Sitemaps
+    path('sitemap.xml', sitemaps.sitemap_index, name='sitemap_index'),
+    path('sitemap-<int:shard>.xml', sitemaps.sitemap_shard, name='sitemap_shard'),
+    
+    # Monitoring
+    path('metrics', metrics.metrics_view, name='metrics'),
+    
     # API endpoints
     path('api/copy-link/', views.copy_link, name='copy_link'),
+    path('api/copy-links/', views.copy_links, name='copy_links'),
+    path('api/autocomplete/', views.memorial_autocomplete, name='memorial_autocomplete'),
+    path('api/activity/', views.activity_feed, name='activity_feed'),
 ]
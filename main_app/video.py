@@ -0,0 +1,70 @@
+"""
+Recognize video links so memory pages can show a lightweight preview.
+
+``parse_video_url`` is run when a memory is saved and its result is stored
+on the memory, so pages never parse URLs. Known providers are rendered as
+a thumbnail with a play button, and the provider's player iframe is only
+inserted once the visitor clicks it (see main-enhanced.js).
+"""
+import re
+from urllib.parse import parse_qs, urlsplit
+
+YOUTUBE = 'youtube'
+VIMEO = 'vimeo'
+PROVIDER_CHOICES = [
+    (YOUTUBE, 'YouTube'),
+    (VIMEO, 'Vimeo'),
+]
+
+_YOUTUBE_HOSTS = {'youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtube-nocookie.com'}
+_YOUTUBE_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+_YOUTUBE_PATH = re.compile(r'^/(?:embed|shorts|live|v)/([^/?#]+)')
+_VIMEO_HOSTS = {'vimeo.com', 'player.vimeo.com'}
+_VIMEO_ID = re.compile(r'^/(?:video/|channels/[^/]+/|groups/[^/]+/videos/)?(\d+)(?:/|$)')
+
+
+def parse_video_url(url):
+    """
+    Return (provider, video id) for a YouTube or Vimeo URL, or ('', '')
+
+    'https://youtu.be/dQw4w9WgXcQ?t=42' gives ('youtube', 'dQw4w9WgXcQ').
+    """
+    try:
+        parts = urlsplit((url or '').strip())
+    except ValueError:
+        return '', ''
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+
+    if host == 'youtu.be':
+        candidate = parts.path.lstrip('/').split('/')[0]
+    elif host in _YOUTUBE_HOSTS:
+        match = _YOUTUBE_PATH.match(parts.path)
+        candidate = match.group(1) if match else parse_qs(parts.query).get('v', [''])[0]
+    elif host in _VIMEO_HOSTS:
+        match = _VIMEO_ID.match(parts.path)
+        return (VIMEO, match.group(1)) if match else ('', '')
+    else:
+        return '', ''
+    return (YOUTUBE, candidate) if _YOUTUBE_ID.match(candidate) else ('', '')
+
+
+def embed_url(provider, video_id):
+    """
+    Player URL loaded into the iframe once the visitor presses play
+    """
+    if provider == YOUTUBE:
+        return f'https://www.youtube-nocookie.com/embed/{video_id}?autoplay=1'
+    if provider == VIMEO:
+        return f'https://player.vimeo.com/video/{video_id}?autoplay=1'
+    return ''
+
+
+def thumbnail_url(provider, video_id):
+    """
+    Static preview image, or '' when the provider needs an API call for one
+    """
+    if provider == YOUTUBE:
+        return f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'
+    return ''
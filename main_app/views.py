@@ -1,67 +1,125 @@
 from django.shortcuts import render, get_object_or_404, redirect
+from django.conf import settings
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, F
+from django.db import transaction
+from django.db.models import Case, Count, F, When
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import conditional_page, require_GET, require_POST
 from django.views.decorators.csrf import csrf_exempt
 import json
 
-from .models import Memorial, Memory, UserProfile
+from .models import Memorial, Memory
 from .forms import CustomUserCreationForm, MemorialForm, MemoryForm
+from .auth import owns
+from .ratelimit import ratelimit
+from .signals import batch_changes, send_memorials_changed
+from .storage import batch_releases
+from . import activity, anniversaries, fuzzy, metrics, share_cards, slugs, typeahead
+from .conditional import conditional_listing, conditional_memorial
 
+# Columns rendered by memorial cards; the full bio is never needed for a listing
+CARD_FIELDS = (
+    'name', 'slug', 'dob', 'dod', 'bio_excerpt', 'cover_image', 'visibility',
+    'donations_count', 'trees_planted_count', 'created_at', 'updated_at',
+)
 
+
+def memorial_cards(queryset):
+    """
+    Load only what memorial cards show, with owner names and memory counts joined in
+    """
+    return queryset.select_related('owner__user').only(*CARD_FIELDS, 'owner__user__username').annotate(
+        memory_count=Count('memories')
+    )
+
+
+@conditional_listing
 def home(request):
     """
     Landing page with featured memorials carousel
     """
     # Get top 3 memorials by total contributions
-    featured_memorials = Memorial.objects.filter(
+    featured_memorials = memorial_cards(Memorial.objects.filter(
         visibility='public'
-    ).annotate(
+    )).annotate(
         total_contributions=F('donations_count') + F('trees_planted_count')
     ).order_by('-total_contributions')[:3]
     
+    # Birth and passing anniversaries falling today
+    today = timezone.localdate()
+    anniversary_ids = anniversaries.todays_anniversary_ids()
+    on_this_day = []
+    if anniversary_ids:
+        # The ids may have been cached before a memorial was hidden or its dates edited
+        cards = anniversaries.matching(memorial_cards(Memorial.objects.filter(pk__in=anniversary_ids)), today).in_bulk()
+        described = (anniversaries.describe(cards[pk], today) for pk in anniversary_ids if pk in cards)
+        on_this_day = [memorial for memorial in described if memorial is not None]
+    
     context = {
-        'featured_memorials': featured_memorials
+        'featured_memorials': featured_memorials,
+        'on_this_day': on_this_day,
+        'recent_activity': activity.feed(limit=settings.ACTIVITY_HOME_ITEMS),
     }
     return render(request, 'main_app/home.html', context)
 
 
+@conditional_listing
 def explore(request):
     """
     Browse and search public memorials
     """
     search_query = request.GET.get('search', '')
-    memorials = Memorial.objects.filter(visibility='public')
+    memorials = memorial_cards(Memorial.objects.filter(visibility='public'))
+    results_capped = False
     
     if search_query:
-        memorials = memorials.filter(
-            Q(name__icontains=search_query) | Q(bio__icontains=search_query)
-        )
+        # Trigram search tolerates spelling variants like Nusret/Nusrat. One
+        # match past the limit tells the page that it only shows the best ones.
+        limit = settings.FUZZY_SEARCH_LIMIT
+        matched_ids = fuzzy.fuzzy_search(search_query, limit=limit + 1)
+        results_capped = len(matched_ids) > limit
+        matched_ids = matched_ids[:limit]
+        if matched_ids:
+            memorials = memorials.filter(pk__in=matched_ids).order_by(
+                Case(*[When(pk=pk, then=position) for position, pk in enumerate(matched_ids)])
+            )
+        else:
+            memorials = memorials.none()
     
     context = {
         'memorials': memorials,
-        'search_query': search_query
+        'search_query': search_query,
+        'results_capped': results_capped,
     }
-    return render(request, 'main_app/explore.html', context)
+    return render(request, 'main_app/explore.html', context, using=settings.PAGE_TEMPLATE_ENGINE)
 
 
+@ratelimit('memorial_post', rate='20/m')
+@conditional_memorial
 def memorial_detail(request, slug):
     """
     Memorial detail page with memories and contribution functionality
     """
-    memorial = get_object_or_404(Memorial, slug=slug)
+    resolved = slugs.resolve_or_404(slug)
     
     # Check if user can view this memorial
-    if memorial.visibility == 'private' and (
-        not request.user.is_authenticated or 
-        memorial.owner.user != request.user
-    ):
+    if resolved.visibility == 'private' and not owns(request, resolved.owner_id):
         messages.error(request, "This memorial is private.")
         return redirect('explore')
     
+    # The page shows the owner's name
+    memorial = get_object_or_404(
+        Memorial.objects.select_related('owner__user'),
+        pk=resolved.pk, slug=slug, visibility=resolved.visibility,
+    )
+    can_edit = owns(request, memorial.owner_id)
+    
     memories = memorial.memories.all()
     memory_form = MemoryForm()
     
@@ -85,22 +143,28 @@ def memorial_detail(request, slug):
         elif 'donate' in request.POST:
             memorial.donations_count += 1
             memorial.save()
+            activity.record_contribution(memorial, request.user, 'donation')
+            metrics.inc('memorialbridge_contributions_total', kind='donation')
             messages.success(request, "Thank you for your donation!")
             return redirect('memorial_detail', slug=slug)
         
         elif 'plant_tree' in request.POST:
             memorial.trees_planted_count += 1
             memorial.save()
+            activity.record_contribution(memorial, request.user, 'tree')
+            metrics.inc('memorialbridge_contributions_total', kind='tree')
             messages.success(request, "Thank you for planting a tree!")
             return redirect('memorial_detail', slug=slug)
     
+    share_card = share_cards.card_url(memorial)
     context = {
         'memorial': memorial,
         'memories': memories,
         'memory_form': memory_form,
-        'can_edit': request.user.is_authenticated and memorial.owner.user == request.user
+        'can_edit': can_edit,
+        'share_card': request.build_absolute_uri(share_card) if share_card else None,
     }
-    return render(request, 'main_app/memorial_detail.html', context)
+    return render(request, 'main_app/memorial_detail.html', context, using=settings.PAGE_TEMPLATE_ENGINE)
 
 
 @login_required
@@ -109,13 +173,8 @@ def create_memorial(request):
     Create a new memorial (protected view)
     """
     # Check if user is verified
-    try:
-        user_profile = request.user.userprofile
-        if not user_profile.verified:
-            messages.error(request, "Please verify your email address before creating memorials.")
-            return redirect('verify_email')
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=request.user)
+    user_profile = request.profile
+    if not user_profile.verified:
         messages.error(request, "Please verify your email address before creating memorials.")
         return redirect('verify_email')
     
@@ -123,7 +182,7 @@ def create_memorial(request):
         form = MemorialForm(request.POST, request.FILES)
         if form.is_valid():
             memorial = form.save(commit=False)
-            memorial.owner = user_profile
+            memorial.owner_id = user_profile.pk
             memorial.save()
             messages.success(request, f"Memorial for {memorial.name} created successfully!")
             return redirect('memorial_detail', slug=memorial.slug)
@@ -139,12 +198,8 @@ def user_dashboard(request):
     """
     User's personal dashboard showing their memorials
     """
-    try:
-        user_profile = request.user.userprofile
-        memorials = user_profile.memorials.all()
-    except UserProfile.DoesNotExist:
-        UserProfile.objects.create(user=request.user)
-        memorials = []
+    user_profile = request.profile
+    memorials = memorial_cards(user_profile.memorials.all())
     
     context = {
         'memorials': memorials,
@@ -153,18 +208,52 @@ def user_dashboard(request):
     return render(request, 'main_app/dashboard.html', context)
 
 
+@login_required
+@require_POST
+def dashboard_bulk(request):
+    """
+    Make the memorials selected on the dashboard public or private, or delete them
+    """
+    operation = request.POST.get('operation')
+    try:
+        pks = {int(pk) for pk in request.POST.getlist('memorials')}
+    except ValueError:
+        pks = set()
+    if operation not in ('public', 'private', 'delete') or not pks:
+        messages.error(request, "Select one or more memorials and an action.")
+        return redirect('dashboard')
+    
+    # Only ever the signed-in user's own memorials
+    memorials = Memorial.objects.filter(owner_id=request.profile.pk, pk__in=pks)
+    if operation == 'delete':
+        # Caches, feed entries and stored files are dealt with once for the
+        # whole set, after the deletes have committed
+        with batch_changes(), batch_releases(), transaction.atomic():
+            deleted = memorials.delete()[1].get(Memorial._meta.label, 0)
+        messages.success(request, f"{deleted} memorial{'s' if deleted != 1 else ''} deleted.")
+    else:
+        with transaction.atomic():
+            changed = list(memorials.exclude(visibility=operation).values_list('pk', flat=True))
+            updated = Memorial.objects.filter(pk__in=changed).update(visibility=operation, updated_at=timezone.now())
+        send_memorials_changed(changed, {'visibility', 'updated_at'})
+        messages.success(request, f"{updated} memorial{'s' if updated != 1 else ''} made {operation}.")
+    return redirect('dashboard')
+
+
 @login_required
 def edit_memorial(request, slug):
     """
     Edit an existing memorial
     """
-    memorial = get_object_or_404(Memorial, slug=slug)
+    resolved = slugs.resolve_or_404(slug)
     
     # Check if user owns this memorial
-    if memorial.owner.user != request.user:
+    if not owns(request, resolved.owner_id):
         messages.error(request, "You don't have permission to edit this memorial.")
         return redirect('memorial_detail', slug=slug)
     
+    memorial = get_object_or_404(Memorial, pk=resolved.pk, slug=slug, owner_id=resolved.owner_id)
+    
     if request.method == 'POST':
         form = MemorialForm(request.POST, request.FILES, instance=memorial)
         if form.is_valid():
@@ -187,13 +276,15 @@ def delete_memorial(request, slug):
     """
     Delete a memorial
     """
-    memorial = get_object_or_404(Memorial, slug=slug)
+    resolved = slugs.resolve_or_404(slug)
     
     # Check if user owns this memorial
-    if memorial.owner.user != request.user:
+    if not owns(request, resolved.owner_id):
         messages.error(request, "You don't have permission to delete this memorial.")
         return redirect('memorial_detail', slug=slug)
     
+    memorial = get_object_or_404(Memorial, pk=resolved.pk, slug=slug, owner_id=resolved.owner_id)
+    
     if request.method == 'POST':
         memorial_name = memorial.name
         memorial.delete()
@@ -227,7 +318,7 @@ def verify_email(request):
     """
     Simulated email verification
     """
-    user_profile, created = UserProfile.objects.get_or_create(user=request.user)
+    user_profile = request.profile
     
     if request.method == 'POST':
         user_profile.verified = True
@@ -243,6 +334,7 @@ def verify_email(request):
 
 @require_POST
 @csrf_exempt
+@ratelimit('copy_link', rate='60/m')
 def copy_link(request):
     """
     API endpoint for copying memorial link
@@ -251,8 +343,90 @@ def copy_link(request):
     slug = data.get('slug')
     
     if slug:
-        memorial = get_object_or_404(Memorial, slug=slug)
-        link = request.build_absolute_uri(memorial.get_absolute_url())
+        slugs.resolve_or_404(slug)
+        link = request.build_absolute_uri(reverse('memorial_detail', kwargs={'slug': slug}))
         return JsonResponse({'success': True, 'link': link})
     
     return JsonResponse({'success': False})
+
+
+@require_POST
+@csrf_exempt
+@ratelimit('copy_link', rate='60/m')
+def copy_links(request):
+    """
+    API endpoint for copying the links of several memorials at once;
+    slugs that are unknown or private to the requester map to null
+    """
+    try:
+        requested = json.loads(request.body).get('slugs')
+    except (ValueError, AttributeError):
+        requested = None
+    if (not isinstance(requested, list) or len(requested) > settings.COPY_LINKS_MAX_SLUGS
+            or not all(isinstance(slug, str) for slug in requested)):
+        return JsonResponse(
+            {'success': False, 'error': f'slugs must be a list of at most {settings.COPY_LINKS_MAX_SLUGS} strings'},
+            status=400,
+        )
+    
+    resolved = slugs.resolve_many(requested)
+    links = {}
+    for slug in requested:
+        memorial = resolved.get(slug)
+        if memorial is None or (memorial.visibility == 'private' and not owns(request, memorial.owner_id)):
+            links[slug] = None
+        else:
+            links[slug] = request.build_absolute_uri(reverse('memorial_detail', kwargs={'slug': slug}))
+    return JsonResponse({'success': True, 'links': links})
+
+
+
+@require_GET
+@cache_control(public=True, max_age=60)
+@conditional_page
+def memorial_autocomplete(request):
+    """
+    API endpoint suggesting public memorial names for the explore search box
+    """
+    try:
+        limit = int(request.GET.get('limit', 0))
+    except ValueError:
+        limit = 0
+    suggestions = typeahead.suggest(request.GET.get('q', ''), limit)
+    results = [
+        {'name': memorial['name'], 'url': reverse('memorial_detail', kwargs={'slug': memorial['slug']})}
+        for memorial in suggestions
+    ]
+    return JsonResponse({'results': results})
+
+
+@require_GET
+@conditional_page
+def activity_feed(request):
+    """
+    API endpoint listing recent tributes on public memorials, newest first
+
+    Each page links to the next one, which continues below its last entry.
+    """
+    try:
+        before = int(request.GET['before']) if 'before' in request.GET else None
+        limit = int(request.GET.get('limit', 0))
+    except ValueError:
+        return JsonResponse({'error': 'before and limit must be integers'}, status=400)
+    limit = min(max(limit, 0) or settings.ACTIVITY_PAGE_SIZE, settings.ACTIVITY_MAX_PAGE_SIZE)
+    entries = activity.feed(before, limit)
+    results = [
+        {
+            'kind': entry['kind'],
+            'memorial': entry['memorial_name'],
+            'url': reverse('memorial_detail', kwargs={'slug': entry['memorial_slug']}),
+            'actor': entry['actor_name'],
+            'summary': entry['summary'],
+            'created_at': entry['created_at'].isoformat(),
+        }
+        for entry in entries
+    ]
+    next_url = None
+    if len(entries) == limit:
+        next_url = f"{reverse('activity_feed')}?{urlencode({'before': entries[-1]['id'], 'limit': limit})}"
+    return JsonResponse({'results': results, 'next': next_url})
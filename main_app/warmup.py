@@ -0,0 +1,78 @@
+"""
+Pay a worker's one-off startup costs before it serves traffic.
+
+Without this, the first requests a new worker handles also compile their
+templates, build the URL resolver and load translation catalogs. Under
+gunicorn with preload_app this runs once in the master process, and every
+forked worker inherits the warm caches (see gunicorn.conf.py).
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.template import TemplateSyntaxError, engines
+from django.urls import NoReverseMatch, URLResolver, get_resolver, resolve, reverse
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+
+def compile_templates():
+    """
+    Load every template under the project template directories
+
+    With the cached loader each compiled template stays in memory, so
+    later renders skip reading and parsing the file.
+    """
+    compiled = 0
+    for backend in engines.all():
+        for directory in backend.dirs:
+            for root, _dirs, files in os.walk(directory):
+                for filename in files:
+                    if filename.startswith('.'):
+                        continue
+                    name = os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+                    try:
+                        backend.get_template(name)
+                    except (TemplateSyntaxError, UnicodeDecodeError):
+                        logger.exception('Could not compile template %s', name)
+                    else:
+                        compiled += 1
+    return compiled
+
+
+def _named_patterns(patterns, namespace=''):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+            yield from _named_patterns(pattern.url_patterns, prefix)
+        elif pattern.name:
+            yield namespace + pattern.name
+
+
+def resolve_urls():
+    """
+    Build the URL resolver and round-trip every URL name that takes no arguments
+    """
+    resolver = get_resolver()
+    resolved = 0
+    for name in _named_patterns(resolver.url_patterns):
+        try:
+            resolve(reverse(name))
+        except NoReverseMatch:
+            # Needs arguments; reversing it still populated the lookup tables
+            continue
+        resolved += 1
+    return resolved
+
+
+def warm_up():
+    """
+    Compile templates, resolve URLs and load translations, returning a summary
+    """
+    start = time.perf_counter()
+    with translation.override(settings.LANGUAGE_CODE):
+        templates = compile_templates()
+        urls = resolve_urls()
+    return {'templates': templates, 'urls': urls, 'seconds': time.perf_counter() - start}
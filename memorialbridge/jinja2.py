@@ -0,0 +1,41 @@
+"""
+Jinja2 environment for the templates under ``jinja2/``.
+
+Provides the Django tags and filters those templates use, so a ported
+page renders the same markup as its Django counterpart.
+"""
+from django.template import defaultfilters
+from django.templatetags.static import static
+from django.urls import reverse
+from jinja2 import Environment
+
+from main_app.cards import render_cards
+
+
+def url(viewname, *args, **kwargs):
+    return reverse(viewname, args=args or None, kwargs=kwargs or None)
+
+
+def memorial_cards(memorials, layout='grid', eager_first=False):
+    # Cards on Jinja2 pages are rendered from the Jinja2 port of the card
+    return render_cards(memorials, layout, eager_first, using='jinja2')
+
+
+def linebreaks(value):
+    return defaultfilters.linebreaks_filter(value, autoescape=True)
+
+
+def environment(**options):
+    env = Environment(**options)
+    env.globals.update({
+        'memorial_cards': memorial_cards,
+        'static': static,
+        'url': url,
+    })
+    env.filters.update({
+        'date': defaultfilters.date,
+        'linebreaks': linebreaks,
+        'pluralize': defaultfilters.pluralize,
+        'truncatewords': defaultfilters.truncatewords,
+    })
+    return env
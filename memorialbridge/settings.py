@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
 from pathlib import Path
+import importlib.util
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,11 +44,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'main_app.metrics.MetricsMiddleware',
+    'main_app.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main_app.auth.RequestProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -54,21 +59,49 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'memorialbridge.urls'
 
+# Loads the signed-in user together with their profile (see main_app/auth.py)
+AUTHENTICATION_BACKENDS = ['main_app.auth.ProfileBackend']
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if not DEBUG:
+    # Compile each template once per worker instead of on every render
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
+TEMPLATE_CONTEXT_PROCESSORS = [
+    'django.template.context_processors.debug',
+    'django.template.context_processors.request',
+    'django.contrib.auth.context_processors.auth',
+    'django.contrib.messages.context_processors.messages',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
+            'context_processors': TEMPLATE_CONTEXT_PROCESSORS,
+            'loaders': TEMPLATE_LOADERS,
         },
     },
 ]
+if importlib.util.find_spec('jinja2'):
+    # Ports of the busiest pages, used when PAGE_TEMPLATE_ENGINE is 'jinja2'.
+    # Listed after Django's engine, so every other template resolves as before.
+    TEMPLATES.append({
+        'BACKEND': 'django.template.backends.jinja2.Jinja2',
+        'DIRS': [BASE_DIR / 'jinja2'],
+        'OPTIONS': {
+            'environment': 'memorialbridge.jinja2.environment',
+            'context_processors': TEMPLATE_CONTEXT_PROCESSORS,
+        },
+    })
+
+# Engine rendering the explore and memorial pages: 'django', or 'jinja2'
+# when Jinja2 is installed (compare them with the benchmark_templates command)
+PAGE_TEMPLATE_ENGINE = 'django'
 
 WSGI_APPLICATION = 'memorialbridge.wsgi.application'
 
@@ -84,6 +117,21 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Point this at Redis or Memcached in production so that rate limits and
+# cached data are shared between gunicorn workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'main_app.metrics.InstrumentedLocMemCache',
+        'LOCATION': 'memorialbridge',
+        # The default of 300 entries would keep evicting rendered memorial cards
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -128,6 +176,30 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    # Uploads are named by content hash and shared between identical files (see main_app/storage.py)
+    'default': {
+        'BACKEND': 'main_app.storage.ContentAddressedStorage',
+    },
+    # collectstatic bundles, minifies, fingerprints and compresses (see main_app/assets.py)
+    'staticfiles': {
+        'BACKEND': 'main_app.assets.BundledStaticFilesStorage',
+    },
+}
+
+# Stylesheets whose @imports are inlined by collectstatic
+STATIC_CSS_BUNDLES = ['css/main.css']
+
+# Stream every upload to a temporary file instead of holding it in memory
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# Uploaded images (see main_app/images.py)
+IMAGE_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+IMAGE_MAX_PIXELS = 50_000_000  # JPEGs, checked against the header and decoded at reduced scale
+IMAGE_MAX_FULL_DECODE_PIXELS = 16_000_000  # PNG, GIF and WebP, which are decoded in full
+IMAGE_MAX_DIMENSION = 2048  # Longest side of the stored image
+IMAGE_JPEG_QUALITY = 85
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -137,4 +209,80 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Background jobs (see main_app/jobs.py and the run_worker command)
+JOBS_EAGER = False  # Run jobs inline when they are enqueued, without a worker
+JOBS_CONCURRENCY = 4
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 10  # Seconds before the first retry, doubled after each failure
+JOBS_MAX_BACKOFF = 60 * 60
+JOBS_LOCK_TIMEOUT = 10 * 60  # Running jobs older than this are assumed lost and requeued
+
+# Rate limiting (see main_app/ratelimit.py)
+RATELIMIT_ENABLE = True
+RATELIMIT_IP_META_KEY = 'REMOTE_ADDR'  # Use 'HTTP_X_FORWARDED_FOR' behind a trusted proxy
+RATELIMIT_RATES = {
+    'memorial_post': '20/m',  # Memories, donations and tree planting
+    'copy_link': '60/m',
+}
+
+# Sitemaps (see main_app/sitemaps.py)
+SITEMAP_SHARD_SIZE = 50000  # The sitemaps protocol allows at most 50,000 URLs per file
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24  # Shards are also invalidated whenever one of their memorials changes
+
+# Memorial name autocomplete (see main_app/typeahead.py)
+TYPEAHEAD_MIN_CHARS = 2
+TYPEAHEAD_DEFAULT_LIMIT = 8
+TYPEAHEAD_MAX_LIMIT = 20
+TYPEAHEAD_CACHE_TIMEOUT = 5 * 60
+
+# "On this day" anniversaries on the home page (see main_app/anniversaries.py)
+ANNIVERSARIES_LIMIT = 6
+
+# Rendered memorial cards (see main_app/cards.py); edits change the cache key,
+# so this only bounds how long unused cards stay around
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Recent activity feed (see main_app/activity.py)
+ACTIVITY_PAGE_SIZE = 20
+ACTIVITY_MAX_PAGE_SIZE = 50
+ACTIVITY_HEAD_SIZE = 100  # Newest entries kept in the cache
+ACTIVITY_HEAD_TIMEOUT = 60 * 60  # The head is also replaced whenever the feed changes
+ACTIVITY_HOME_ITEMS = 5
+
+# Slug lookups (see main_app/slugs.py). As with listings, other workers only
+# see a change once the version stamp expires if the cache is per-process.
+SLUG_CACHE_LOCAL_SIZE = 4096  # Slugs kept in each process
+SLUG_CACHE_TIMEOUT = 60 * 60
+SLUG_VERSION_TIMEOUT = 60
+COPY_LINKS_MAX_SLUGS = 100  # Slugs per request to the batch copy-links API
+
+# Open Graph share cards (see main_app/share_cards.py), drawn by the run_worker command
+SHARE_CARD_FONT = None  # Path to a TrueType font; Pillow's built-in font by default
+SHARE_CARD_JOB_SIZE = 100  # Memorials per background job
+
+# Conditional GET for memorial pages and listings (see main_app/conditional.py)
+# Listings are validated by a version stamp in the cache. With a per-process
+# cache such as LocMemCache, other workers only see a change once their stamp
+# expires, so it is kept for a minute and listing ETags roll over that often
+# even without writes. With a shared cache (Redis, Memcached) set this to None,
+# so 304s are answered until a memorial or memory actually changes.
+LISTING_VERSION_TIMEOUT = 60
+
+# Fuzzy name search (see main_app/fuzzy.py)
+FUZZY_SEARCH_THRESHOLD = 0.5  # Share of the query's trigrams a name must contain
+FUZZY_SEARCH_CANDIDATES = 200  # Memorials scored per query, taken from the trigram index
+FUZZY_SEARCH_LIMIT = 50
+FUZZY_SEARCH_FREQUENCY_TIMEOUT = 60 * 60
+
+# Metrics (see main_app/metrics.py), scraped from /metrics
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'memorialbridge-metrics'))
+METRICS_FLUSH_INTERVAL = 1  # Seconds between writes of each process's values to METRICS_DIR
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # Bearer token for scrapers; staff can always view
+
+# Gives each test run its own METRICS_DIR
+TEST_RUNNER = 'memorialbridge.test_runner.TestRunner'
+
+# On-demand request profiling (see main_app/profiling.py and the profile_token command)
+PROFILING_ENABLED = True
+PROFILING_TOKEN_MAX_AGE = 60 * 60 * 24
@@ -0,0 +1,26 @@
+"""
+Test runner that keeps test runs away from the files of a development server.
+"""
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Metrics of test requests go to a directory of their own instead of
+        # the METRICS_DIR that a local server reads (see main_app/metrics.py)
+        self.metrics_dir = tempfile.TemporaryDirectory(prefix='memorialbridge-test-metrics-')
+        self.metrics_settings = override_settings(METRICS_DIR=self.metrics_dir.name)
+        self.metrics_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        from main_app import metrics
+
+        # Drop what the tests recorded, so nothing is flushed to METRICS_DIR at exit
+        metrics.registry.reset()
+        self.metrics_settings.disable()
+        self.metrics_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
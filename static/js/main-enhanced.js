@@ -25,6 +25,7 @@
             
             initializeTooltips();
             initializeCopyLinks();
+            initializeVideoFacades();
             initializeRealTimeFormValidation();
             initializeMemoryTypeToggle();
             initializeImagePreviews();
@@ -34,6 +35,7 @@
             initializeAutoDismissAlerts();
             initializeSmoothScrolling();
             initializeFormLoadingStates();
+            initializeBulkActions();
             
             addPageAnimations();
             
@@ -57,6 +59,30 @@
         }
     }
 
+    /**
+     * Replace video previews with the provider's player only when clicked,
+     * so pages with many video memories load no third-party iframes
+     */
+    function initializeVideoFacades() {
+        try {
+            document.addEventListener('click', function(event) {
+                const facade = event.target.closest('.video-facade[data-embed-src]');
+                if (!facade) return;
+                event.preventDefault();
+
+                const iframe = document.createElement('iframe');
+                iframe.src = facade.dataset.embedSrc;
+                iframe.title = facade.getAttribute('aria-label') || 'Video';
+                iframe.allow = 'accelerometer; autoplay; encrypted-media; gyroscope; picture-in-picture; fullscreen';
+                iframe.allowFullscreen = true;
+                facade.replaceWith(iframe);
+                iframe.focus();
+            });
+        } catch (error) {
+            console.error('Error initializing video previews:', error);
+        }
+    }
+
     /**
      * Initialize copy link functionality with improved error handling
      */
@@ -502,11 +528,104 @@
                     }
                 });
             }
+            
+            initializeSearchSuggestions(searchInput);
         } catch (error) {
             console.error('Error initializing search enhancements:', error);
         }
     }
 
+    /**
+     * Typeahead suggestions for memorial names, queried on every keystroke
+     */
+    function initializeSearchSuggestions(searchInput) {
+        const url = searchInput.dataset.autocompleteUrl;
+        const menu = document.getElementById('searchSuggestions');
+        if (!url || !menu) return;
+        
+        let controller = null;
+        let activeIndex = -1;
+        
+        function hideSuggestions() {
+            menu.classList.add('d-none');
+            menu.innerHTML = '';
+            searchInput.setAttribute('aria-expanded', 'false');
+            activeIndex = -1;
+        }
+        
+        function showSuggestions(results) {
+            if (!results.length) {
+                hideSuggestions();
+                return;
+            }
+            menu.innerHTML = '';
+            results.forEach(function(result, index) {
+                const item = document.createElement('a');
+                item.className = 'list-group-item list-group-item-action';
+                item.href = result.url;
+                item.id = 'searchSuggestion' + index;
+                item.setAttribute('role', 'option');
+                item.textContent = result.name;
+                menu.appendChild(item);
+            });
+            menu.classList.remove('d-none');
+            searchInput.setAttribute('aria-expanded', 'true');
+            activeIndex = -1;
+        }
+        
+        function highlight(index) {
+            const items = menu.querySelectorAll('.list-group-item');
+            if (!items.length) return;
+            activeIndex = (index + items.length) % items.length;
+            items.forEach(function(item, i) {
+                item.classList.toggle('active', i === activeIndex);
+            });
+            searchInput.setAttribute('aria-activedescendant', items[activeIndex].id);
+        }
+        
+        searchInput.addEventListener('input', function() {
+            const query = this.value.trim();
+            if (controller) {
+                controller.abort();
+            }
+            if (query.length < 2) {
+                hideSuggestions();
+                return;
+            }
+            controller = new AbortController();
+            fetch(url + '?q=' + encodeURIComponent(query), { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => showSuggestions(data.results || []))
+                .catch(function(error) {
+                    if (error.name !== 'AbortError') {
+                        console.error('Error loading search suggestions:', error);
+                    }
+                });
+        });
+        
+        searchInput.addEventListener('keydown', function(e) {
+            if (menu.classList.contains('d-none')) return;
+            if (e.key === 'ArrowDown') {
+                e.preventDefault();
+                highlight(activeIndex + 1);
+            } else if (e.key === 'ArrowUp') {
+                e.preventDefault();
+                highlight(activeIndex - 1);
+            } else if (e.key === 'Enter' && activeIndex >= 0) {
+                e.preventDefault();
+                window.location.href = menu.querySelectorAll('.list-group-item')[activeIndex].href;
+            } else if (e.key === 'Escape') {
+                hideSuggestions();
+            }
+        });
+        
+        document.addEventListener('click', function(e) {
+            if (!menu.contains(e.target) && e.target !== searchInput) {
+                hideSuggestions();
+            }
+        });
+    }
+
     /**
      * Auto-dismiss alerts after delay
      */
@@ -584,6 +703,33 @@
         }
     }
 
+    /**
+     * Require a selection for dashboard bulk actions and confirm deletes
+     */
+    function initializeBulkActions() {
+        try {
+            const form = document.getElementById('bulkForm');
+            if (!form) return;
+
+            form.addEventListener('submit', function(e) {
+                const selected = document.querySelectorAll('input[name="memorials"][form="bulkForm"]:checked').length;
+                if (!selected) {
+                    e.preventDefault();
+                    alert('Select one or more memorials first.');
+                    return;
+                }
+                if (form.elements.operation.value === 'delete' &&
+                        !confirm(`Delete ${selected} memorial${selected === 1 ? '' : 's'}? This cannot be undone.`)) {
+                    e.preventDefault();
+                    return;
+                }
+                setFormLoading(form, true);
+            });
+        } catch (error) {
+            console.error('Error initializing bulk actions:', error);
+        }
+    }
+
     /**
      * Set form loading state
      * Note: We only disable the submit button and add visual loading states.